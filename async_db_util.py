@@ -0,0 +1,176 @@
+"""
+Asyncio variants of the db_util functions, built on FalkorDB's asyncio client.
+Queries, lookup keys and result shapes are shared with db_util,
+so both modules always answer the same way.
+"""
+import asyncio
+import json
+from weakref import WeakKeyDictionary
+from typing import Any, Dict, List, Optional
+from falkordb.asyncio import FalkorDB as AsyncFalkorDB
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+import db_util
+from db_util import RecipeDBClient
+from normalization import name_key
+from result_cache import MISSING, cache_key
+from metrics import metrics
+
+
+class AsyncRecipeDBClient(RecipeDBClient):
+    """Same settings as RecipeDBClient, but with an asyncio connection pool."""
+
+    @property
+    def db(self) -> AsyncFalkorDB:
+        """The asyncio FalkorDB connection, created on first access."""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    pool = AsyncBlockingConnectionPool(
+                        host=self.host, port=self.port,
+                        max_connections=self.pool_size, timeout=self.timeout,
+                        socket_timeout=self.timeout, socket_connect_timeout=self.timeout,
+                        decode_responses=True,
+                    )
+                    self._db = AsyncFalkorDB(connection_pool=pool)
+        return self._db
+
+    async def aclose(self):
+        """Closes every pooled connection, the next use reconnects."""
+        if self._db is not None:
+            await self._db.aclose()
+        self._db = None
+        self._graph = None
+
+
+client = AsyncRecipeDBClient()
+# Several lookups started together must not all reload the vocabulary.
+# An asyncio.Lock belongs to one event loop, so every loop gets its own.
+_vocabulary_locks: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = WeakKeyDictionary()
+
+
+def _vocabulary_lock() -> asyncio.Lock:
+    loop = asyncio.get_running_loop()
+    lock = _vocabulary_locks.get(loop)
+    if lock is None:
+        lock = _vocabulary_locks[loop] = asyncio.Lock()
+    return lock
+
+
+async def run_query(name: str, query: str, params: Optional[Dict[str, Any]] = None):
+    """See db_util.run_query, the same metric names are used."""
+    with metrics.span('db_query', query=name):
+        results = await client.graph.query(query, params)
+    metrics.record('db_query_server', results.run_time_ms / 1000, query=name)
+    return results
+
+
+async def _refresh_vocabulary():
+    """Brings db_util's shared vocabulary up to date without blocking the loop."""
+    vocabulary = db_util.vocabulary
+    if not vocabulary.needs_check():
+        return
+    async with _vocabulary_lock():
+        if not vocabulary.needs_check():
+            return
+        results = await run_query('graph_version', db_util.GRAPH_VERSION_QUERY)
+        version = results.result_set[0][0] if results.result_set else None
+        if vocabulary.needs_reload(version):
+            results = await run_query('ingredient_names', db_util.INGREDIENT_NAMES_QUERY)
+            vocabulary.load((record[0] for record in results.result_set), version)
+        else:
+            vocabulary.mark_checked()
+
+
+async def _cached_search(operation: str, keys: List[str], params: tuple, execute):
+    """
+    Same as db_util._cached_search and the same cache, but the
+    shared tier is read and written through the asyncio connection.
+    """
+    await _refresh_vocabulary()
+    cache = db_util.result_cache
+    version = db_util.vocabulary.version
+    cache.observe_version(version)
+    key = cache_key(operation, version, keys, *params)
+    result = cache.get_local(key)
+    if result is not MISSING:
+        cache.count('hits')
+        return result
+    if cache.shared_enabled:
+        raw = await client.db.connection.get(cache.shared_key(key))
+        if raw is not None:
+            result = json.loads(raw)
+            cache.put_local(key, result)
+            cache.count('shared_hits')
+            return result
+    cache.count('misses')
+    result = await execute()
+    cache.put_local(key, result)
+    if cache.shared_enabled:
+        await client.db.connection.set(cache.shared_key(key), json.dumps(result),
+                                       ex=max(1, int(cache.ttl)))
+    return result
+
+
+async def warm_up():
+    """Loads the ingredient vocabulary before the first lookup needs it."""
+    await _refresh_vocabulary()
+
+
+async def is_ingredient(temp_ingredient: str) -> bool:
+    """Checks if the given ingredient exists in the database."""
+    await _refresh_vocabulary()
+    return db_util.is_ingredient(temp_ingredient)
+
+
+async def find_similar_ingredients(temp_ingredient: str, top_k: int = 10) -> Optional[List[str]]:
+    """See db_util.find_similar_ingredients."""
+    await _refresh_vocabulary()
+    return db_util.find_similar_ingredients(temp_ingredient, top_k=top_k)
+
+
+async def find_similar_ingredients_many(ingredients: List[str], top_k: int = 10) -> List[Optional[List[str]]]:
+    """Looks up every ingredient concurrently, results keep the input order."""
+    return await asyncio.gather(*(find_similar_ingredients(ing, top_k) for ing in ingredients))
+
+
+async def list_recipies(input_ing_list: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """See db_util.list_recipies."""
+    keys = db_util.search_keys(input_ing_list)
+
+    async def execute():
+        results = await run_query('search', db_util.SEARCH_RECIPE_QUERY, {'input_ingredients': keys})
+        return db_util.to_recipe_list(results.result_set)
+
+    return await _cached_search('list', keys, (), execute)
+
+
+async def rank_recipes(input_ing_list: List[str], max_missing: int = 2,
+                       limit: int = 20) -> List[Dict[str, Any]]:
+    """See db_util.rank_recipes."""
+    keys = db_util.search_keys(input_ing_list)
+
+    async def execute():
+        results = await run_query('ranked_search', db_util.RANKED_RECIPE_QUERY,
+                                  {'input_ingredients': keys, 'max_missing': max_missing, 'limit': limit})
+        return db_util.to_ranked_recipe_list(results.result_set)
+
+    return await _cached_search('ranked', keys, (max_missing, limit), execute)
+
+
+async def recipe_details(recipe_name: str) -> Optional[Dict[str, Any]]:
+    """See db_util.recipe_details."""
+    results = await run_query('details', db_util.RECIPE_DETAILS_QUERY, {'r_name': name_key(recipe_name)})
+    return db_util.to_recipe_details(results.result_set)
+
+
+async def recipe_details_by_id(recipe_id: int) -> Optional[Dict[str, Any]]:
+    """See db_util.recipe_details_by_id."""
+    results = await run_query('details_by_id', db_util.RECIPE_DETAILS_BY_ID_QUERY, {'r_id': recipe_id})
+    return db_util.to_recipe_details(results.result_set)
+
+
+async def recipe_details_many(recipe_names: List[str]) -> List[Dict[str, Any]]:
+    """See db_util.recipe_details_many."""
+    keys = list(dict.fromkeys(name_key(name) for name in recipe_names))
+    results = await run_query('details_many', db_util.RECIPE_DETAILS_MANY_QUERY, {'r_names': keys})
+    return db_util.to_recipe_details_many(results.result_set, keys)
@@ -0,0 +1,166 @@
+"""
+This module sends the UNWIND ingestion queries to FalkorDB in chunks.
+Chunks are pipelined over the redis connection when one is given,
+and only the chunks that failed are sent again.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List
+from falkordb.helpers import stringify_param_value
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+from metrics import metrics
+
+# Errors that are worth sending the same chunk again for. A ResponseError is not:
+# the query or its data is wrong and would fail the same way every time.
+RETRYABLE_ERRORS = (RedisConnectionError, RedisTimeoutError)
+
+
+def chunked(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yields lists of at most `size` rows without materializing the input."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def execution_ms(reply) -> float:
+    """FalkorDB's 'Query internal execution time' of a raw GRAPH.QUERY reply (0 if absent)."""
+    if not reply:
+        return 0.0
+    for line in reply[-1]:
+        if isinstance(line, bytes):
+            line = line.decode()
+        if isinstance(line, str) and line.startswith("Query internal execution time"):
+            return float(line.split(":")[1].split()[0])
+    return 0.0
+
+
+def params_header(params: Dict[str, Any]) -> str:
+    """Builds the 'CYPHER name=value ...' prefix that GRAPH.QUERY expects."""
+    return "CYPHER " + " ".join(
+        f"`{k}`={stringify_param_value(v)}" for k, v in params.items()) + " "
+
+
+@dataclass
+class LoadStats:
+    """Throughput summary of one batched load."""
+    rows: int = 0
+    chunks: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+class BatchLoader:
+    """
+    Runs an UNWIND query over rows in chunks of `chunk_size`.
+    `graph` only needs a query(q, params) method, so an in-process fake works too.
+    When `connection` (the redis client of FalkorDB) is given,
+    `pipeline_depth` chunks are sent per round trip.
+    """
+
+    def __init__(self, graph, chunk_size: int = 500, pipeline_depth: int = 4,
+                 max_retries: int = 3, backoff: float = 0.5, connection=None):
+        if chunk_size < 1 or pipeline_depth < 1:
+            raise ValueError("chunk_size and pipeline_depth must be positive.")
+        self.graph = graph
+        self.chunk_size = chunk_size
+        self.pipeline_depth = pipeline_depth
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.connection = connection
+        # Throughput per label, summed over every load() call
+        self.totals: Dict[str, LoadStats] = {}
+
+    @property
+    def window_size(self) -> int:
+        """Rows sent per round trip."""
+        return self.chunk_size * self.pipeline_depth
+
+    def load(self, query: str, param_name: str, rows: Iterable[Any], label: str = "") -> LoadStats:
+        """Sends every chunk and retries the failed ones."""
+        label = label or param_name
+        stats = LoadStats()
+        started = time.perf_counter()
+        window = []
+        for chunk in chunked(rows, self.chunk_size):
+            window.append(chunk)
+            if len(window) >= self.pipeline_depth:
+                self._send_window(query, param_name, window, stats, label)
+                window = []
+        if window:
+            self._send_window(query, param_name, window, stats, label)
+        stats.seconds = time.perf_counter() - started
+
+        total = self.totals.setdefault(label, LoadStats())
+        total.rows += stats.rows
+        total.chunks += stats.chunks
+        total.retries += stats.retries
+        total.seconds += stats.seconds
+        return stats
+
+    def report(self):
+        """Prints rows/sec of everything loaded so far."""
+        for label, stats in self.totals.items():
+            print(f"   ↳ {label}: {stats.rows} rows in {stats.chunks} chunk(s), "
+                  f"{stats.rows_per_sec:.0f} rows/sec ({stats.retries} retried)")
+
+    def _send_window(self, query: str, param_name: str, window: List[List[Any]],
+                     stats: LoadStats, label: str):
+        # One ingest_batch sample per round trip, server time per chunk
+        with metrics.span('ingest_batch', label=label):
+            if self.connection is None:
+                for chunk in window:
+                    self._query_with_retry(query, param_name, chunk, stats, label)
+            else:
+                for chunk in self._pipeline(query, param_name, window, label):
+                    stats.retries += 1
+                    self._query_with_retry(query, param_name, chunk, stats, label)
+        stats.rows += sum(len(chunk) for chunk in window)
+        stats.chunks += len(window)
+
+    def _pipeline(self, query: str, param_name: str, window: List[List[Any]],
+                  label: str) -> List[List[Any]]:
+        """Sends the whole window in one round trip and returns the chunks that failed."""
+        pipe = self.connection.pipeline(transaction=False)
+        for chunk in window:
+            pipe.execute_command("GRAPH.QUERY", self.graph.name,
+                                 params_header({param_name: chunk}) + query, "--compact")
+        try:
+            results = pipe.execute(raise_on_error=False)
+        except (RedisConnectionError, RedisTimeoutError):
+            # Nothing tells which chunks made it, MERGE makes resending them harmless
+            return window
+        failed = []
+        for chunk, result in zip(window, results):
+            if isinstance(result, RETRYABLE_ERRORS):
+                failed.append(chunk)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                metrics.record('ingest_batch_server', execution_ms(result) / 1000, label=label)
+        return failed
+
+    def _query_with_retry(self, query: str, param_name: str, chunk: List[Any],
+                          stats: LoadStats, label: str):
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self.graph.query(query, {param_name: chunk})
+                server_ms = getattr(result, 'run_time_ms', None)
+                if server_ms is not None:
+                    metrics.record('ingest_batch_server', server_ms / 1000, label=label)
+                return
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                stats.retries += 1
+                time.sleep(self.backoff * (2 ** attempt))
+
@@ -0,0 +1,194 @@
+"""
+Synthetic feed generator for the benchmarks.
+Writes MEAL and INGREDIENT blocks shaped like the ones SpiderMeals emits,
+at any scale, with portion strings the way TheMealDB writes them
+("1/2 tsp ground Cumin", "2 cloves Garlic, minced", "Salt to taste").
+The output only depends on the arguments, so two runs with the same
+--seed produce the same feed and their benchmark results can be compared.
+
+    python benchmarks/generate_feed.py --recipes 100000 --format jsonl --output bench_feed.jsonl
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from bisect import bisect
+from itertools import accumulate
+from typing import Dict, Iterator, List
+
+# Real TheMealDB ingredients, the rest of the vocabulary is derived from them
+BASE_INGREDIENTS = [
+    "Chicken", "Chicken Breast", "Chicken Thighs", "Beef", "Minced Beef", "Lamb", "Pork",
+    "Bacon", "Sausages", "Salmon", "Cod", "Prawns", "Tuna", "Egg", "Eggs", "Milk", "Butter",
+    "Double Cream", "Yogurt", "Cheddar Cheese", "Parmesan", "Mozzarella", "Feta", "Flour",
+    "Plain Flour", "Self-raising Flour", "Sugar", "Caster Sugar", "Brown Sugar", "Honey",
+    "Rice", "Basmati Rice", "Pasta", "Spaghetti", "Noodles", "Bread", "Potatoes", "Onion",
+    "Red Onions", "Spring Onions", "Garlic", "Ginger", "Carrots", "Celery", "Tomatoes",
+    "Cherry Tomatoes", "Tomato Puree", "Chopped Tomatoes", "Red Pepper", "Green Pepper",
+    "Chilli", "Mushrooms", "Spinach", "Peas", "Sweetcorn", "Broccoli", "Courgettes",
+    "Aubergine", "Cabbage", "Lettuce", "Cucumber", "Avocado", "Lemon", "Lime", "Orange",
+    "Apple", "Banana", "Strawberries", "Raisins", "Almonds", "Walnuts", "Peanuts",
+    "Olive Oil", "Vegetable Oil", "Sesame Oil", "Soy Sauce", "Fish Sauce", "Vinegar",
+    "White Wine", "Red Wine", "Chicken Stock", "Beef Stock", "Vegetable Stock", "Coconut Milk",
+    "Salt", "Black Pepper", "Paprika", "Cumin", "Coriander", "Turmeric", "Cinnamon",
+    "Nutmeg", "Oregano", "Basil", "Thyme", "Rosemary", "Parsley", "Bay Leaf", "Mint",
+    "Chilli Powder", "Garam Masala", "Curry Powder", "Mustard", "Mayonnaise", "Ketchup",
+    "Worcestershire Sauce", "Baking Powder", "Yeast", "Cocoa", "Dark Chocolate", "Vanilla Extract",
+    "Chickpeas", "Lentils", "Kidney Beans", "Tofu", "Water",
+]
+PREFIXES = ["Fresh", "Dried", "Smoked", "Ground", "Frozen", "Organic", "Wild", "Baby", "Red", "Sweet"]
+SUFFIXES = ["Powder", "Paste", "Flakes", "Sauce", "Oil", "Stock", "Puree", "Syrup"]
+
+MEASURES = ["1", "2", "3", "4", "6", "1 1/2", "1 tsp", "2 tsp", "1/2 tsp", "1/4 tsp", "1 tbsp",
+            "2 tbs", "3 tbsp", "1 cup", "2 cups", "1/2 cup", "3/4 cup", "100g", "200g", "250g",
+            "500g", "1kg", "1 lb", "2 lbs", "300ml", "1 litre", "1 can", "2 cloves", "4 slices",
+            "1 handful", "2 sprigs"]
+PREPARATIONS = ["", "", "", "", ", chopped", ", finely chopped", ", sliced", ", diced", ", minced",
+                ", grated", ", peeled", " (optional)", ", to serve"]
+# Portions without any quantity, {} is the ingredient
+PLAIN_PORTIONS = ["{} to taste", "Pinch {}", "Dash {}", "{} to garnish", "{}"]
+# Portions naming nothing from the vocabulary, so the matcher also sees misses
+UNMATCHED_PORTIONS = ["Edible flowers", "Garnish of choice", "Toothpicks", "Ice cubes"]
+
+STYLES = ["Spicy", "Classic", "Creamy", "Roasted", "Grilled", "Baked", "Slow Cooked", "Crispy",
+          "Honey Glazed", "Lemon", "Garlic", "Smoky", "Easy", "Mediterranean", "Thai", "Moroccan"]
+DISHES = ["Curry", "Stew", "Pie", "Salad", "Soup", "Bake", "Stir Fry", "Risotto", "Tacos",
+          "Burger", "Casserole", "Skewers", "Pasta", "Tart", "Wraps", "Traybake", "Omelette"]
+STEPS = [
+    "Preheat the oven to {temp}C.",
+    "Heat the oil in a large pan over a medium heat.",
+    "Add the {a} and cook for {mins} minutes until softened.",
+    "Stir in the {a} and the {b}, then season well.",
+    "Bring to the boil, then reduce the heat and simmer for {mins} minutes.",
+    "Mix the {a} with the {b} in a bowl until combined.",
+    "Transfer to a baking dish and bake for {mins} minutes until golden.",
+    "Leave to rest for {mins} minutes before serving.",
+    "Serve with the {a} and enjoy.",
+]
+
+
+def vocabulary(size: int) -> List[str]:
+    """`size` distinct ingredient names, the real ones first."""
+    names = list(BASE_INGREDIENTS)
+    seen = set(names)
+    derived = ([f"{p} {b}" for p in PREFIXES for b in BASE_INGREDIENTS]
+               + [f"{b} {s}" for s in SUFFIXES for b in BASE_INGREDIENTS])
+    for name in derived:
+        if len(names) >= size:
+            break
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    n = 2
+    while len(names) < size:
+        names.extend(f"{b} Variety {n}" for b in BASE_INGREDIENTS[:size - len(names)])
+        n += 1
+    return names[:size]
+
+
+def portion(rng: random.Random, name: str) -> str:
+    """One portion string as it appears under a meal."""
+    if rng.random() < 0.15:
+        return rng.choice(PLAIN_PORTIONS).format(name)
+    if rng.random() < 0.1:
+        # Lower cased names also turn up on the site
+        name = name.lower()
+    return f"{rng.choice(MEASURES)} {name}{rng.choice(PREPARATIONS)}"
+
+
+def instructions(rng: random.Random, names: List[str]) -> str:
+    steps = rng.sample(STEPS, rng.randint(3, len(STEPS)))
+    return "\r\n".join(step.format(temp=rng.choice([160, 180, 200, 220]), mins=rng.randint(2, 45),
+                                   a=rng.choice(names).lower(), b=rng.choice(names).lower())
+                       for step in steps)
+
+
+def generate_feed(recipes: int, ingredients: int = 600, seed: int = 42) -> Iterator[Dict]:
+    """
+    Yields the blocks one by one, so a million recipes never sit in memory.
+    Every INGREDIENT block comes right after the first meal using it (as the
+    spider follows ingredient links from meal pages), unused ones come last.
+    Popular ingredients are picked far more often (Zipf-like weights).
+    """
+    rng = random.Random(seed)
+    names = vocabulary(ingredients)
+    cum_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(names))))
+    total = cum_weights[-1]
+    emitted = set()
+    name_counts: Dict[str, int] = {}
+
+    for i in range(recipes):
+        count = min(len(names), max(3, int(rng.gauss(10, 3.5))))
+        used: List[str] = []
+        while len(used) < count:
+            name = names[bisect(cum_weights, rng.random() * total)]
+            if name not in used:
+                used.append(name)
+
+        title = f"{rng.choice(STYLES)} {used[0]} {rng.choice(DISHES)}"
+        seen = name_counts.get(title, 0)
+        name_counts[title] = seen + 1
+        if seen:
+            title = f"{title} {seen + 1}"
+
+        portions = [portion(rng, name) for name in used]
+        if rng.random() < 0.1:
+            portions.append(rng.choice(UNMATCHED_PORTIONS))
+        yield {
+            'TYPE': 'MEAL',
+            'Food_Name': title,
+            'Ingredients_Used': portions,
+            'Instructions': instructions(rng, used),
+            'Meal_URL': f"https://www.themealdb.com/meal/{52000 + i}",
+        }
+        for name in used:
+            if name not in emitted:
+                emitted.add(name)
+                yield {'TYPE': 'INGREDIENT', 'Food_Name': name}
+
+    for name in names:
+        if name not in emitted:
+            yield {'TYPE': 'INGREDIENT', 'Food_Name': name}
+
+
+def write_feed(blocks: Iterator[Dict], path: str, fmt: str) -> int:
+    """Writes a JSON array or JSON Lines (gzipped for a .gz path), returns the block count."""
+    opener = gzip.open if path.endswith('.gz') else open
+    count = 0
+    with opener(path, 'wt', encoding="utf-8") as f:
+        if fmt == 'json':
+            f.write("[\n")
+        for block in blocks:
+            line = json.dumps(block, ensure_ascii=False)
+            if fmt == 'json':
+                f.write((",\n" if count else "") + line)
+            else:
+                f.write(line + "\n")
+            count += 1
+        if fmt == 'json':
+            f.write("\n]\n")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic TheMealDB-shaped feed.")
+    parser.add_argument('--recipes', type=int, default=1000, help="MEAL blocks to write (default: 1000)")
+    parser.add_argument('--ingredients', type=int, default=600,
+                        help="Size of the ingredient vocabulary (default: 600, about TheMealDB's)")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='jsonl')
+    parser.add_argument('--output', default='bench_feed.jsonl', help="Output file, .gz is compressed")
+    args = parser.parse_args()
+    if args.recipes < 1 or args.ingredients < 1:
+        sys.exit("--recipes and --ingredients must be positive.")
+
+    start = time.perf_counter()
+    count = write_feed(generate_feed(args.recipes, args.ingredients, args.seed), args.output, args.format)
+    print(f"✅ {count} blocks ({args.recipes} recipes) written to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+The substring loop database_filler.py ran before IngredientMatcher.
+Kept as the reference the matcher is benchmarked and tested against.
+"""
+from typing import Iterable, List, Optional
+
+
+def legacy_order(names: Iterable[str]) -> List[str]:
+    """The old list was sorted by length only; equal lengths are ordered
+    alphabetically here, the tie-break IngredientMatcher documents."""
+    return sorted(names, key=lambda n: (-len(n), n))
+
+
+def legacy_match(portion_str, sorted_ingredients: List[str]) -> Optional[str]:
+    """The first (longest) known ingredient found in one portion, by scanning them all."""
+    if not portion_str or not isinstance(portion_str, str):
+        return None
+    cleaned_chars = [char if char.isalpha() or char.isspace() else ' ' for char in portion_str]
+    cleaned_portion_str = "".join(cleaned_chars).lower()
+    for known_ing in sorted_ingredients:
+        if known_ing.lower() in cleaned_portion_str:
+            return known_ing
+    return None
@@ -0,0 +1,121 @@
+"""
+Load test of recipe_service.py.
+Keeps --concurrency requests in flight for --duration seconds and reports
+QPS and latency percentiles. Start the service (and FalkorDB) first:
+
+    python recipe_service.py
+    python benchmarks/load_test.py --endpoint search --concurrency 32 --duration 30
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from metrics import percentile  # noqa: E402
+
+# Popular combinations, repeated the way real users repeat them
+DEFAULT_COMBINATIONS = [
+    ["chicken", "garlic"],
+    ["egg", "milk", "flour"],
+    ["beef", "onion", "tomato"],
+    ["rice", "chicken", "soy sauce"],
+    ["potato", "butter"],
+    ["pasta", "tomato", "basil"],
+    ["salmon", "lemon"],
+    ["sugar", "egg", "butter", "flour"],
+]
+
+
+def make_request(endpoint: str, combination: List[str], args) -> Tuple[str, Dict[str, Any]]:
+    """Path and body of one request."""
+    if endpoint == 'mixed':
+        endpoint = random.choice(['resolve', 'search', 'search', 'search'])
+    if endpoint == 'resolve':
+        return '/resolve', {'ingredients': combination}
+    body = {'ingredients': combination, 'engine': args.engine}
+    if args.max_missing is not None:
+        body.update(max_missing=args.max_missing, limit=args.limit)
+    return '/search', body
+
+
+async def worker(session: aiohttp.ClientSession, args, combinations, deadline: float,
+                 latencies: List[float], errors: List[str]):
+    while time.perf_counter() < deadline:
+        path, body = make_request(args.endpoint, next(combinations), args)
+        start = time.perf_counter()
+        try:
+            async with session.post(args.url + path, json=body) as response:
+                await response.read()
+                if response.status != 200:
+                    errors.append(f"HTTP {response.status}")
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args) -> Dict[str, Any]:
+    combinations = DEFAULT_COMBINATIONS
+    if args.combinations:
+        with open(args.combinations, 'r', encoding="utf-8") as f:
+            combinations = json.load(f)
+    cycle = itertools.cycle(combinations)
+    latencies: List[float] = []
+    errors: List[str] = []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # One warm-up request, so the first sample does not pay for cold caches
+        async with session.get(args.url + '/health') as response:
+            response.raise_for_status()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(worker(session, args, cycle, deadline, latencies, errors)
+                               for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'qps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round((latencies[-1] if latencies else 0.0) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the recipe service.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="Service address")
+    parser.add_argument('--endpoint', choices=['search', 'resolve', 'mixed'], default='search')
+    parser.add_argument('--engine', choices=['falkordb', 'local'], default='falkordb')
+    parser.add_argument('--max-missing', type=int, help="Use the ranked pantry search")
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight (default: 16)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run (default: 10)")
+    parser.add_argument('--combinations', help="JSON file with a list of ingredient lists")
+    parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"📊 {result['requests']} requests, {result['errors']} errors, {result['qps']} QPS")
+    print(f"   latency p50/p90/p99/max: {result['p50_ms']}/{result['p90_ms']}/"
+          f"{result['p99_ms']}/{result['max_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+"""
+Benchmark suite of the recipe pipeline.
+Runs on a synthetic feed (see generate_feed.py, same --seed, same feed) or on
+a real one, and saves every number as JSON so runs can be compared:
+
+    python benchmarks/run_benchmarks.py --recipes 10000 --output results/base.json
+    python benchmarks/run_benchmarks.py --recipes 10000 --compare results/base.json
+    python benchmarks/run_benchmarks.py --recipes 100000 --suites matching
+
+Suites:
+    matching    ingredient matching throughput (Aho-Corasick matcher vs the legacy substring loop)
+    workers     parallel matching with 1..16 worker processes
+    resolution  ingredient lookup / suggestion latency (trigram vocabulary)
+    lemmatizer  WordNet cold start vs the lemma table, memoized lookups
+    index       bitset engine build time, contains-all and ranked 20-ingredient search
+    memory      peak and retained memory of the in-memory structures
+    export      RecipeManager.export_recipes throughput and peak memory per format
+    load        full and incremental load into FalkorDB                      (needs FalkorDB)
+    lookup      old toLower() scans vs name_key index seeks, same graph     (needs FalkorDB)
+    search      Cypher vs bitset search p50/p99, cached searches             (needs FalkorDB)
+The FalkorDB suites use their own graph (--graph) and are skipped when no server answers.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from batch_loader import BatchLoader  # noqa: E402
+from database_filler import (COUNT_RECIPES, blocks_of_type, clear_graph, create_indexes,  # noqa: E402
+                             load_recipes, prepare_recipes)
+from db_util import RECIPE_DETAILS_QUERY, SEARCH_RECIPE_QUERY, RecipeDBClient  # noqa: E402
+from feed_reader import iter_feed  # noqa: E402
+from find_recipe import EXPORT_FORMATS, Recipe, RecipeManager  # noqa: E402
+from generate_feed import generate_feed  # noqa: E402
+from ingredient_matcher import IngredientMatcher, extract_ingredient_names, match_portions_parallel  # noqa: E402
+from ingredient_search import IngredientVocabulary  # noqa: E402
+from legacy_matcher import legacy_match, legacy_order  # noqa: E402
+from metrics import percentile  # noqa: E402
+from migrate_schema import graph_stats  # noqa: E402
+from normalization import WORDNET_RESOURCES, name_key  # noqa: E402
+from recipe_index import BitsetRecipeIndex  # noqa: E402
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError  # noqa: E402
+
+SUITES = ['matching', 'workers', 'resolution', 'lemmatizer', 'index', 'memory', 'export', 'load', 'lookup',
+          'search']
+BENCH_GRAPH = "RECIPIES_BENCH"
+
+
+def latency(samples: List[float]) -> Dict[str, Any]:
+    """count, mean and p50/p90/p99/max in milliseconds."""
+    ordered = sorted(samples)
+    summary = {'count': len(ordered),
+               'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0}
+    for q in (50, 90, 99):
+        summary[f'p{q}_ms'] = round(percentile(ordered, q) * 1000, 4)
+    summary['max_ms'] = round((ordered[-1] if ordered else 0.0) * 1000, 4)
+    return summary
+
+
+def time_each(fn: Callable[[Any], Any], inputs: Iterable[Any]) -> List[float]:
+    """Seconds of every fn(input) call."""
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def wordnet_available() -> bool:
+    """True when the WordNet corpus is installed (nothing is downloaded by the benchmarks)."""
+    import nltk
+    for resource_name in WORDNET_RESOURCES:
+        try:
+            nltk.data.find(resource_name)
+            return True
+        except LookupError:
+            continue
+    return False
+
+
+class Workload:
+    """The feed of one run and the query sets drawn from it, all derived from --seed."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self._names: Optional[List[str]] = None
+        self._recipes: Optional[List[dict]] = None
+        # Matched ingredient names of every recipe, filled by the matching suite
+        self.matched: Optional[List[List[str]]] = None
+
+    def blocks(self, block_type: str) -> Iterator[dict]:
+        if self.args.feed:
+            return iter_feed(self.args.feed, block_type)
+        return blocks_of_type(generate_feed(self.args.recipes, self.args.ingredients, self.args.seed),
+                              block_type)
+
+    @property
+    def ingredient_names(self) -> List[str]:
+        if self._names is None:
+            self._names = sorted(extract_ingredient_names(self.blocks('INGREDIENT')))
+        return self._names
+
+    @property
+    def recipes(self) -> List[dict]:
+        if self._recipes is None:
+            self._recipes = [r for r in self.blocks('MEAL') if r.get('Food_Name')]
+        return self._recipes
+
+    def matches(self) -> List[List[str]]:
+        if self.matched is None:
+            matcher = IngredientMatcher(self.ingredient_names)
+            self.matched = [sorted(matcher.match_portions(r.get('Ingredients_Used', [])))
+                            for r in self.recipes]
+        return self.matched
+
+    def index_rows(self) -> List[tuple]:
+        """Rows in the shape of recipe_index.EXPORT_QUERY."""
+        return [(r['Food_Name'], [name_key(n) for n in names], names,
+                 r.get('Ingredients_Used', []), r.get('Instructions'), idx)
+                for idx, (r, names) in enumerate(zip(self.recipes, self.matches())) if names]
+
+    def combinations(self) -> List[List[str]]:
+        """2-3 ingredients taken from one recipe, so most searches have results."""
+        with_enough = [names for names in self.matches() if len(names) >= 3]
+        return [self.rng.sample(names, self.rng.randint(2, 3))
+                for names in self.rng.choices(with_enough, k=self.args.queries)]
+
+    def pantries(self, size: int = 20) -> List[List[str]]:
+        """`size` ingredients: two recipes' worth topped up with random ones."""
+        pantries = []
+        for _ in range(self.args.queries):
+            pantry = set(self.rng.choice(self.matches())) | set(self.rng.choice(self.matches()))
+            while len(pantry) < min(size, len(self.ingredient_names)):
+                pantry.add(self.rng.choice(self.ingredient_names))
+            pantries.append(sorted(pantry)[:size])
+        return pantries
+
+    def resolution_queries(self) -> List[str]:
+        """What users type: exact, lower case, singular, a typo or the first letters."""
+        queries = []
+        for name in self.rng.choices(self.ingredient_names, k=self.args.queries):
+            kind = self.rng.randrange(5)
+            if kind == 1:
+                name = name.lower()
+            elif kind == 2:
+                name = name.rstrip('s')
+            elif kind == 3 and len(name) > 3:
+                i = self.rng.randrange(len(name) - 1)
+                name = name[:i] + name[i + 1] + name[i] + name[i + 2:]
+            elif kind == 4:
+                name = name[:4]
+            queries.append(name)
+        return queries
+
+
+# -----------------
+#   IN-PROCESS SUITES
+# -----------------
+def bench_matching(w: Workload) -> Dict[str, Any]:
+    start = time.perf_counter()
+    matcher = IngredientMatcher(w.ingredient_names)
+    build_seconds = time.perf_counter() - start
+
+    recipes = w.recipes
+    matched: List[List[str]] = []
+    portions = hits = 0
+    start = time.perf_counter()
+    for recipe in recipes:
+        found = set()
+        for portion in recipe.get('Ingredients_Used', []):
+            name = matcher.match(portion)
+            portions += 1
+            if name:
+                hits += 1
+                found.add(name)
+        matched.append(sorted(found))
+    seconds = time.perf_counter() - start
+    w.matched = matched
+    return {
+        'vocabulary': len(w.ingredient_names),
+        'build_seconds': round(build_seconds, 4),
+        'recipes': len(recipes),
+        'portions': portions,
+        'seconds': round(seconds, 4),
+        'recipes_per_sec': round(len(recipes) / seconds, 1) if seconds else 0.0,
+        'portions_per_sec': round(portions / seconds, 1) if seconds else 0.0,
+        'match_rate': round(hits / portions, 4) if portions else 0.0,
+        'legacy': bench_legacy_matching(w, matcher),
+    }
+
+
+def bench_legacy_matching(w: Workload, matcher: IngredientMatcher) -> Dict[str, Any]:
+    """The substring loop the matcher replaced, on the first --legacy-recipes recipes (it scans
+    the whole vocabulary per portion). The speedup compares both on that same sample."""
+    limit = w.args.legacy_recipes
+    portions = [p for r in (w.recipes[:limit] if limit else w.recipes) for p in r.get('Ingredients_Used', [])]
+    sorted_ingredients = legacy_order(w.ingredient_names)
+
+    start = time.perf_counter()
+    legacy = [legacy_match(p, sorted_ingredients) for p in portions]
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    current = [matcher.match(p) for p in portions]
+    seconds = time.perf_counter() - start
+    return {
+        'recipes': min(limit, len(w.recipes)) if limit else len(w.recipes),
+        'portions': len(portions),
+        'seconds': round(legacy_seconds, 4),
+        'portions_per_sec': round(len(portions) / legacy_seconds, 1) if legacy_seconds else 0.0,
+        'speedup': round(legacy_seconds / seconds, 1) if seconds else 0.0,
+        'mismatches': sum(a != b for a, b in zip(legacy, current)),
+    }
+
+
+def bench_workers(w: Workload) -> Dict[str, Any]:
+    portion_lists = [r.get('Ingredients_Used', []) for r in w.recipes[:w.args.worker_recipes]]
+    result: Dict[str, Any] = {'recipes': len(portion_lists), 'cpu_count': os.cpu_count(), 'runs': {}}
+    baseline = None
+    for workers in w.args.workers:
+        start = time.perf_counter()
+        if workers == 1:
+            matcher = IngredientMatcher(w.ingredient_names)
+            for portions in portion_lists:
+                sorted(matcher.match_portions(portions))
+        else:
+            for _ in match_portions_parallel(portion_lists, w.ingredient_names, workers):
+                pass
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        result['runs'][str(workers)] = {
+            'seconds': round(seconds, 4),
+            'recipes_per_sec': round(len(portion_lists) / seconds, 1),
+            'speedup': round(baseline / seconds, 2),
+        }
+    return result
+
+
+def bench_resolution(w: Workload) -> Dict[str, Any]:
+    from normalization import lemmatize
+    lemmatizer = 'wordnet'
+    if not wordnet_available():
+        lemmatize, lemmatizer = str, 'identity (WordNet is not installed)'
+    vocabulary = IngredientVocabulary(lambda: w.ingredient_names, lambda: 'bench', lemmatize, ttl=3600)
+    start = time.perf_counter()
+    vocabulary.current_version()
+    load_seconds = time.perf_counter() - start
+
+    queries = w.resolution_queries()
+    found = sum(vocabulary.lookup(q) is not None for q in queries)
+    return {
+        'vocabulary': len(w.ingredient_names),
+        'lemmatizer': lemmatizer,
+        'load_seconds': round(load_seconds, 4),
+        'lookup_hit_rate': round(found / len(queries), 4) if queries else 0.0,
+        'lookup': latency(time_each(vocabulary.lookup, queries)),
+        'similar': latency(time_each(vocabulary.similar, queries)),
+    }
+
+
+def cold_lemmatize_seconds(table_path: str) -> float:
+    """First lemmatize() calls of a fresh process, imports included: a word, a phrase and a capitalized word."""
+    code = ("import time; t = time.perf_counter(); from normalization import lemmatize; "
+            "lemmatize('tomatoes'); lemmatize('olive oil'); lemmatize('Garlic'); "
+            "print(time.perf_counter() - t)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            check=True, env={**os.environ, 'LEMMA_TABLE_PATH': table_path})
+    return float(result.stdout.strip())
+
+
+def bench_lemmatizer(w: Workload) -> Dict[str, Any]:
+    if not wordnet_available():
+        return {'skipped': "WordNet is not installed"}
+    import normalization
+    runs = w.args.cold_runs
+    with tempfile.TemporaryDirectory() as tmp:
+        table_path = os.path.join(tmp, 'lemma_table.json')
+        normalization.save_lemma_table(w.ingredient_names, path=table_path)
+        wordnet = [cold_lemmatize_seconds(os.path.join(tmp, 'missing.json')) for _ in range(runs)]
+        table = [cold_lemmatize_seconds(table_path) for _ in range(runs)]
+
+    keys = {name_key(name) for name in w.ingredient_names}
+    lookups = sorted(keys | {word for key in keys for word in key.split()})
+    normalization.lemmatize.cache_clear()
+    first = time_each(normalization.lemmatize, lookups)
+    cached = time_each(normalization.lemmatize, lookups)
+    return {
+        'cold_wordnet_ms': round(sorted(wordnet)[runs // 2] * 1000, 2),
+        'cold_lemma_table_ms': round(sorted(table)[runs // 2] * 1000, 2),
+        'lookups': len(lookups),
+        'first_call': latency(first),
+        'cached_call': latency(cached),
+    }
+
+
+def bench_index(w: Workload) -> Dict[str, Any]:
+    rows = w.index_rows()
+    start = time.perf_counter()
+    index = BitsetRecipeIndex(rows, version='bench')
+    build_seconds = time.perf_counter() - start
+
+    combinations = [[name_key(n) for n in combo] for combo in w.combinations()]
+    pantries = [[name_key(n) for n in pantry] for pantry in w.pantries()]
+    hits = [len(index.contains_all(combo)) for combo in combinations]
+    return {
+        'recipes': len(index),
+        'ingredients': len(index.ingredient_names),
+        'build_seconds': round(build_seconds, 4),
+        'mean_results': round(sum(hits) / len(hits), 1) if hits else 0.0,
+        'contains_all': latency(time_each(index.contains_all, combinations)),
+        'contains_any': latency(time_each(index.contains_any, combinations)),
+        'ranked_20': latency(time_each(lambda keys: index.ranked(keys, max_missing=2, limit=20), pantries)),
+    }
+
+
+def traced(build: Callable[[], Any]) -> Dict[str, float]:
+    """Peak and retained MB allocated while building one structure."""
+    tracemalloc.start()
+    try:
+        kept = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return {'retained_mb': round(current / 2 ** 20, 2), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+def bench_memory(w: Workload) -> Dict[str, Any]:
+    names = w.ingredient_names
+    rows = w.index_rows()
+    vocabulary = IngredientVocabulary(lambda: names, lambda: 'bench', str)
+    return {
+        'feed': traced(lambda: [r for r in w.blocks('MEAL')]),
+        'matcher': traced(lambda: IngredientMatcher(names)),
+        'vocabulary': traced(lambda: vocabulary.load(names, 'bench') or vocabulary),
+        'bitset_index': traced(lambda: BitsetRecipeIndex(rows)),
+        # Linux reports KB
+        'process_max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def bench_export(w: Workload) -> Dict[str, Any]:
+    """Exports every recipe once per format; the Recipe objects are created lazily."""
+    manager = RecipeManager()
+    result: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in EXPORT_FORMATS:
+            recipes = (Recipe(name=r['Food_Name'], ingredients=r.get('Ingredients_Used', []),
+                              instructions=r.get('Instructions') or "")
+                       for r in w.recipes)
+            path = os.path.join(tmp, f'export.{fmt}')
+            tracemalloc.start()
+            start = time.perf_counter()
+            try:
+                written = manager.export_recipes(recipes, path, fmt, append=False)
+                seconds = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            result[fmt] = {
+                'recipes': written,
+                'seconds': round(seconds, 4),
+                'recipes_per_sec': round(written / seconds, 1) if seconds else 0.0,
+                'file_mb': round(os.path.getsize(path) / 2 ** 20, 2),
+                'peak_mb': round(peak / 2 ** 20, 2),
+            }
+    return result
+
+
+# -----------------
+#   FALKORDB SUITES
+# -----------------
+def bench_load(w: Workload, client: RecipeDBClient) -> Dict[str, Any]:
+    graph = client.graph
+    loader = BatchLoader(graph, chunk_size=w.args.chunk_size, pipeline_depth=w.args.pipeline_depth,
+                         connection=client.db.connection)
+    clear_graph(graph)
+    create_indexes(graph)
+    start = time.perf_counter()
+    manifest = load_recipes(graph, loader, prepare_recipes(w.blocks('MEAL'), IngredientMatcher(w.ingredient_names)))
+    full_seconds = time.perf_counter() - start
+
+    # Same feed again: every recipe is matched and hashed, nothing is written
+    start = time.perf_counter()
+    load_recipes(graph, loader, prepare_recipes(w.blocks('MEAL'), IngredientMatcher(w.ingredient_names)),
+                 manifest)
+    incremental_seconds = time.perf_counter() - start
+    return {
+        'recipes': len(manifest),
+        'full_seconds': round(full_seconds, 3),
+        'full_recipes_per_sec': round(len(manifest) / full_seconds, 1) if full_seconds else 0.0,
+        'unchanged_incremental_seconds': round(incremental_seconds, 3),
+        'chunk_size': w.args.chunk_size,
+        'pipeline_depth': w.args.pipeline_depth,
+        **graph_stats(client),
+    }
+
+
+# The lookups before name_key was indexed, on the current schema so only the matching differs
+LEGACY_INGREDIENT_QUERY = """
+    MATCH (i:Ingredient)
+    WHERE toLower(i.name) = toLower($name)
+    RETURN i.name
+    LIMIT 1
+"""
+INDEXED_INGREDIENT_QUERY = """
+    MATCH (i:Ingredient {name_key: $name})
+    RETURN i.name
+    LIMIT 1
+"""
+LEGACY_SEARCH_QUERY = """
+    MATCH (rec:Recipe)-[:MADE_WITH]->(i:Ingredient)
+    WHERE toLower(i.name) IN $input_ingredients
+    WITH rec, COUNT(i) AS matchedCount, size($input_ingredients) AS requiredCount
+    WHERE matchedCount = requiredCount
+    RETURN rec.name AS RecipeName,
+           rec.portions AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           rec.id AS RecipeId
+"""
+LEGACY_DETAILS_QUERY = """
+    MATCH (rec:Recipe)
+    WHERE toLower(rec.name) = toLower($r_name)
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           rec.portions AS IngredientsPortion
+"""
+
+
+def bench_lookup(w: Workload, client: RecipeDBClient) -> Dict[str, Any]:
+    """Each pair of queries runs on the same graph with the same inputs; the answers must agree."""
+    graph = client.graph
+    if graph.query(COUNT_RECIPES).result_set[0][0] == 0:
+        return {'skipped': "The benchmark graph is empty, run the load suite first"}
+
+    names = [name_key(n) for n in w.rng.choices(w.ingredient_names, k=w.args.queries)]
+    combinations = [sorted({name_key(n) for n in combo}) for combo in w.combinations()]
+    recipes = [name_key(r['Food_Name']) for r in w.rng.choices(w.recipes, k=w.args.queries)]
+    pairs = {
+        'ingredient': (LEGACY_INGREDIENT_QUERY, INDEXED_INGREDIENT_QUERY, 'name', names),
+        'contains_all': (LEGACY_SEARCH_QUERY, SEARCH_RECIPE_QUERY, 'input_ingredients', combinations),
+        'details': (LEGACY_DETAILS_QUERY, RECIPE_DETAILS_QUERY, 'r_name', recipes),
+    }
+    result: Dict[str, Any] = {}
+    for label, (legacy_query, indexed_query, param, inputs) in pairs.items():
+        answers = {}
+
+        def execute(query, value):
+            rows = graph.query(query, {param: value}).result_set
+            answers.setdefault(query, []).append(sorted(map(repr, rows)))
+
+        legacy = latency(time_each(lambda value: execute(legacy_query, value), inputs))
+        indexed = latency(time_each(lambda value: execute(indexed_query, value), inputs))
+        result[label] = {
+            'legacy': legacy,
+            'indexed': indexed,
+            'speedup_p50': round(legacy['p50_ms'] / indexed['p50_ms'], 1) if indexed['p50_ms'] else 0.0,
+            'same_results': answers[legacy_query] == answers[indexed_query],
+        }
+    return result
+
+
+def bench_search(w: Workload, client: RecipeDBClient) -> Dict[str, Any]:
+    import db_util
+    db_util.configure(host=client.host, port=client.port, graph_name=client.graph_name)
+    db_util.configure_result_cache(max_entries=0, shared=False)
+
+    queries = w.resolution_queries()
+    db_util.vocabulary.current_version()
+    combinations = w.combinations()
+    pantries = w.pantries()
+    result: Dict[str, Any] = {
+        'resolve_lookup': latency(time_each(db_util.vocabulary.lookup, queries)),
+        'resolve_similar': latency(time_each(db_util.vocabulary.similar, queries)),
+        'cypher_contains_all': latency(time_each(db_util.list_recipies, combinations)),
+        'cypher_ranked_20': latency(time_each(db_util.rank_recipes, pantries)),
+    }
+
+    start = time.perf_counter()
+    db_util.recipe_index()
+    result['bitset_build_seconds'] = round(time.perf_counter() - start, 4)
+    # Looked up per query like fetch_recommendations does, so the version check is timed too
+    result['bitset_contains_all'] = latency(time_each(
+        lambda combo: db_util.recipe_index().contains_all(db_util.search_keys(combo)), combinations))
+    result['bitset_ranked_20'] = latency(time_each(
+        lambda pantry: db_util.recipe_index().ranked(db_util.search_keys(pantry)), pantries))
+
+    # Second pass over the same combinations is served by the result cache
+    db_util.configure_result_cache(shared=False)
+    for combo in combinations:
+        db_util.list_recipies(combo)
+    result['cached_contains_all'] = latency(time_each(db_util.list_recipies, combinations))
+    result['cache'] = db_util.result_cache.counters()
+    return result
+
+
+LOCAL_SUITES = {
+    'matching': bench_matching,
+    'workers': bench_workers,
+    'resolution': bench_resolution,
+    'lemmatizer': bench_lemmatizer,
+    'index': bench_index,
+    'memory': bench_memory,
+    'export': bench_export,
+}
+
+
+DB_SUITES = {
+    'load': bench_load,
+    'lookup': bench_lookup,
+    'search': bench_search,
+}
+
+
+def falkordb_client(args) -> Optional[RecipeDBClient]:
+    """A client of the benchmark graph, None when FalkorDB does not answer."""
+    client = RecipeDBClient(host=args.host, port=args.port, graph_name=args.graph)
+    try:
+        client.db.connection.ping()
+    except RedisConnectionError:
+        return None
+    return client
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """{'suite.metric.p50_ms': value} for every number of a result file."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]):
+    """Prints every number both runs have, with the relative change."""
+    old, new = flatten(previous['suites']), flatten(current['suites'])
+    print(f"\n📊 Compared with {previous['meta'].get('commit')} ({previous['meta'].get('started')}):")
+    for key in sorted(old.keys() & new.keys()):
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else "n/a"
+        print(f"   {key:<55} {old[key]:>12} -> {new[key]:<12} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the recipe pipeline.")
+    parser.add_argument('--feed', help="Use this feed instead of a generated one")
+    parser.add_argument('--recipes', type=int, default=10000, help="Generated recipes (default: 10000)")
+    parser.add_argument('--ingredients', type=int, default=600, help="Generated vocabulary size (default: 600)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the feed and the queries (default: 42)")
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES, help="Suites to run (default: all)")
+    parser.add_argument('--queries', type=int, default=500, help="Queries per latency measurement (default: 500)")
+    parser.add_argument('--legacy-recipes', type=int, default=5000,
+                        help="Recipes the legacy substring loop matches, 0 for all (default: 5000)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="Worker counts of the workers suite (default: 1 2 4 8 16)")
+    parser.add_argument('--worker-recipes', type=int, default=20000,
+                        help="Recipes matched per worker count (default: 20000)")
+    parser.add_argument('--cold-runs', type=int, default=5, help="Fresh processes per cold start (default: 5)")
+    parser.add_argument('--host', help="FalkorDB host (default: FALKORDB_HOST or localhost)")
+    parser.add_argument('--port', type=int, help="FalkorDB port (default: FALKORDB_PORT or 6379)")
+    parser.add_argument('--graph', default=BENCH_GRAPH, help=f"Graph the load suite rebuilds (default: {BENCH_GRAPH})")
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--pipeline-depth', type=int, default=4)
+    parser.add_argument('--output', help="Result file (default: benchmarks/results/<time>.json)")
+    parser.add_argument('--compare', metavar='PATH', help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    results: Dict[str, Any] = {
+        'meta': {
+            'started': started,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'feed': args.feed or f"generated: {args.recipes} recipes, {args.ingredients} ingredients, seed {args.seed}",
+            'queries': args.queries,
+        },
+        'suites': {},
+    }
+    workload = Workload(args)
+    client = falkordb_client(args) if set(args.suites) & set(DB_SUITES) else None
+
+    for suite in [s for s in SUITES if s in args.suites]:
+        print(f"⏱️ {suite}...")
+        if suite in DB_SUITES:
+            if client is None:
+                result = {'skipped': "FalkorDB is not reachable"}
+            else:
+                try:
+                    result = DB_SUITES[suite](workload, client)
+                except (RedisConnectionError, ResponseError) as e:
+                    result = {'error': str(e)}
+        else:
+            result = LOCAL_SUITES[suite](workload)
+        results['suites'][suite] = result
+        print(f"   {json.dumps(result)}")
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', started.replace(':', '') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup benchmark of the find_recipe CLI.
+Measures `import find_recipe` with `python -X importtime` and the wall time of
+`find_recipe.py --help` and of a rejected input, then checks the import against a budget.
+Exits with status 1 when the budget is exceeded, so it can guard CI.
+
+    python benchmarks/startup_time.py --runs 10 --budget-ms 60
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules that must stay out of the startup path of --help
+HEAVY_MODULES = ('db_util', 'falkordb', 'redis', 'nltk', 'asyncio')
+# Budget of the median `import find_recipe` time in ms
+BUDGET_MS = 60.0
+
+
+def import_profile(module: str):
+    """Runs `python -X importtime -c "import module"`, returns {module: cumulative µs}."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def wall_time(args) -> float:
+    """Seconds one `python find_recipe.py <args>` run takes."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'find_recipe.py', *args], cwd=ROOT,
+                   capture_output=True, text=True, check=False)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time of the find_recipe CLI.")
+    parser.add_argument('--runs', type=int, default=10, help="Repetitions per measurement (default: 10)")
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help=f"Budget of the median `import find_recipe` time (default: {BUDGET_MS:.0f})")
+    args = parser.parse_args()
+
+    imports = []
+    profile = {}
+    for _ in range(args.runs):
+        profile = import_profile('find_recipe')
+        imports.append(profile['find_recipe'] / 1000)
+    help_times = [wall_time(['--help']) * 1000 for _ in range(args.runs)]
+    rejected_times = [wall_time(['b4con']) * 1000 for _ in range(args.runs)]
+
+    median_import = statistics.median(imports)
+    print(f"import find_recipe : median {median_import:.1f} ms, min {min(imports):.1f} ms")
+    print(f"--help             : median {statistics.median(help_times):.1f} ms")
+    print(f"rejected input     : median {statistics.median(rejected_times):.1f} ms")
+
+    loaded = [name for name in HEAVY_MODULES if name in profile]
+    if loaded:
+        print(f"❌ Heavy modules imported at startup: {', '.join(loaded)}")
+    if median_import > args.budget_ms:
+        print(f"❌ Startup budget exceeded: {median_import:.1f} ms > {args.budget_ms:.1f} ms")
+        for name, micros in sorted(profile.items(), key=lambda kv: -kv[1])[1:11]:
+            print(f"   {micros / 1000:8.1f} ms  {name}")
+    if loaded or median_import > args.budget_ms:
+        sys.exit(1)
+    print(f"✅ Within the {args.budget_ms:.0f} ms startup budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,412 @@
 """This Script basically receives the data
     that is scraped and stored in .json file,
     and designs a graphical database"""
+import argparse
+import hashlib
 import json
+import os
 import sys
-import nltk
-from nltk.stem import WordNetLemmatizer
-from falkordb import FalkorDB
+import time
+from itertools import tee
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from batch_loader import BatchLoader, chunked
+from db_util import INGREDIENT_NAMES_QUERY, RecipeDBClient
+from feed_reader import iter_feed
+from ingredient_matcher import (IngredientMatcher, extract_ingredient_names, match_among,
+                                match_portions_parallel, parse_portion)
+from normalization import name_key, save_lemma_table
+from metrics import add_metrics_arguments, metrics, profiling, report_metrics
 #For specified errors and exceptions
 from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
 #Library Loading DONE!
 #---------------------
-#Calling tools from imported libs for lemmatizing strings and operating the db
-nltk.download('wordnet')
-L = WordNetLemmatizer()
-try:
-    db = FalkorDB(host='localhost', port=6379)
-    graph = db.select_graph("RECIPIES")
-except RedisConnectionError as e:
-    sys.exit(f"Critical Error: Database connection failed. {e}")
-print("Cleaning the any existing database...")
-try:
-    graph.delete()
-    print("✅ Cleanup DONE!.")
-except Exception:
-    print("ℹ️ No data to clean up (It might be already empty).")
-# Safely reading and retrieving the JSON
-try:
-    with open('foods1.json', 'r', encoding="utf-8") as f:
-        raw_recipe_ing_data = json.load(f)
-except (FileNotFoundError, json.JSONDecodeError) as e:
-    sys.exit(f"Critical Error: JSON file could not be read. {e}")
-
-# Spliting the JSON Date according to dict block assigned type
-recipes = []
-ingredients = []
-for block in raw_recipe_ing_data:
-    if block.get('TYPE') == 'MEAL':
-        recipes.append(block)
-    elif block.get('TYPE') == 'INGREDIENT':
-        ingredients.append(block)
+GRAPH_NAME = "RECIPIES"
+FEED_PATH = 'foods1.json'
+# Keeps the content hash of every recipe that is already in the graph
+MANIFEST_PATH = '.load_manifest.json'
 
 # ----------------------
-# 1. Extracting raw ingredient name
-# ----------------------
-ingredient_names = set()
-for block in ingredients:
-    ing_name = block.get('Food_Name', '')
-    if not ing_name or not isinstance(ing_name, str):
-        continue
-    cleaned_words = []
-    for char in ing_name:
-        if char.isalpha() or char.isspace():
-            cleaned_words.append(char)
-        else:
-            cleaned_words.append(' ')
+#   DEFINING QUERIES
+# -----------------------
+# $parameter prevents the not SQL (since Falkor noSQL) but the Cypher injection attacks
+# Query 1: Creating Recipe Nodes, merged on their compact id only.
+# The portion strings are one list property, the instructions a plain property.
+CREATE_RECIPE_NODE = """
+    UNWIND $r_data AS r
+    MERGE (recipe:Recipe {id: r.Id})
+    SET recipe.name = r.Food_Name,
+        recipe.name_key = r.Name_Key,
+        recipe.instructions = r.Instructions,
+        recipe.portions = r.Portions
+"""
+# Query 2: Linking Raw Ingredients, one edge per ingredient with its parsed portion
+CREATE_RAW_INGREDIENT_NODE = """
+    UNWIND $dict AS d
+    MATCH (r:Recipe {id: d.Id})
+    SET r.ingredient_count = size(d.Links)
+    WITH r,d
+    UNWIND d.Links AS l
+    MERGE (i:Ingredient {name: l.name})
+    SET i.name_key = l.key
+    MERGE (r)-[e:MADE_WITH]->(i)
+    SET e.position = l.position, e.quantity = l.quantity, e.unit = l.unit
+"""
+# Query 3: Removing changed or vanished recipes (and their edges)
+DELETE_RECIPE_NODE = """
+    UNWIND $ids AS recipe_id
+    MATCH (r:Recipe {id: recipe_id})
+    DETACH DELETE r
+"""
+# Query 4: Removing ingredient nodes no recipe points to anymore
+DELETE_ORPHAN_NODES = """
+    MATCH (i:Ingredient)
+    WHERE NOT ()-[:MADE_WITH]->(i)
+    DELETE i
+"""
+COUNT_RECIPES = "MATCH (r:Recipe) RETURN count(r)"
+# Recipes of an older schema have no id yet, migrate_schema.py rewrites them
+COUNT_LEGACY_RECIPES = "MATCH (r:Recipe) WHERE r.id IS NULL RETURN count(r)"
+# Query 5: Version stamp, readers drop their caches when it changes
+BUMP_GRAPH_VERSION = """
+    MERGE (m:GraphMeta {id: 'graph'})
+    SET m.version = $version
+"""
+# Range indexes: MERGE/MATCH lookups by id or name and the db_util lookups by name_key
+INDEXED_PROPERTIES = [
+    ('Recipe', 'id'),
+    ('Recipe', 'name_key'),
+    ('Ingredient', 'name'),
+    ('Ingredient', 'name_key'),
+]
+# Part of every recipe hash: bumping it makes --incremental rewrite
+# every recipe with the properties the current queries expect
+SCHEMA_VERSION = 3
 
-    cleaned_name_str = "".join(cleaned_words).strip()
+# (MEAL block, matched raw ingredient names, content hash)
+PreparedRecipe = Tuple[dict, List[str], str]
 
-    if len(cleaned_name_str) > 1:
-        normalized_full_name = " ".join([word.lower().capitalize() for word in cleaned_name_str.split()])
-        ingredient_names.add(normalized_full_name)
-# ----------------------
-# 2. Matching and Comparing
-# ----------------------
-recipe_raw_ing_lst = []
-sorted_ingredients = sorted(list(ingredient_names), key=len, reverse=True)
 
-print("Matching Phase... (might take some time)")
+def read_feed(path: str) -> List[dict]:
+    """Safely reads the whole feed (file or shard directory) into memory."""
+    try:
+        return list(iter_feed(path))
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        sys.exit(f"Critical Error: JSON file could not be read. {e}")
+
 
-for recipe in recipes:
-    recipe_ing_dict = {}
-    IngredientsP = recipe.get('Ingredients_Used', [])
-    found_ingredients = set()
+def blocks_of_type(blocks: Iterable[dict], block_type: str) -> Iterator[dict]:
+    """Filters the feed by the TYPE assigned by the spider (MEAL or INGREDIENT)."""
+    return (block for block in blocks if block.get('TYPE') == block_type)
 
-    for portion_str in IngredientsP:
-        if not portion_str or not isinstance(portion_str, str):
+
+def recipe_id(name: str) -> int:
+    """Compact, stable id of a recipe: 52 bits of the hash of its name_key (exact as a JSON number too)."""
+    return int(hashlib.sha256(name_key(name).encode('utf-8')).hexdigest()[:13], 16)
+
+
+def portion_links(portions: List[str], raw_ingredients: List[str]) -> List[dict]:
+    """
+    One MADE_WITH edge per raw ingredient: the position of the first portion
+    naming it, with the quantity and unit parsed from that portion.
+    """
+    links: Dict[str, dict] = {}
+    for position, portion_str in enumerate(portions):
+        name = match_among(portion_str, raw_ingredients)
+        if name and name not in links:
+            quantity, unit = parse_portion(portion_str)
+            links[name] = {'name': name, 'key': name_key(name), 'position': position,
+                           'quantity': quantity, 'unit': unit}
+    return list(links.values())
+
+
+def recipe_hash(recipe: dict, raw_ingredients: List[str]) -> str:
+    """Content hash of everything that the loader writes for one recipe."""
+    content = json.dumps([
+        SCHEMA_VERSION,
+        recipe.get('Food_Name'),
+        recipe.get('Instructions'),
+        recipe.get('Ingredients_Used', []),
+        raw_ingredients,
+    ], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def prepare_recipes(recipes: Iterable[dict], matcher: IngredientMatcher) -> Iterator[PreparedRecipe]:
+    """
+    Finds the raw ingredients used by every recipe and hashes the result.
+    Works on a stream, one recipe at a time.
+    """
+    for recipe in recipes:
+        if not recipe.get('Food_Name'):
             continue
+        raw_ingredients = sorted(matcher.match_portions(recipe.get('Ingredients_Used', [])))
+        yield recipe, raw_ingredients, recipe_hash(recipe, raw_ingredients)
+
+
+def prepare_recipes_parallel(recipes: Iterable[dict], ingredient_names: Iterable[str],
+                             workers: int) -> Iterator[PreparedRecipe]:
+    """Same output as prepare_recipes(), the matching runs on `workers` processes."""
+    named = (recipe for recipe in recipes if recipe.get('Food_Name'))
+    # tee only buffers the recipes whose matches are still in flight
+    to_match, to_yield = tee(named)
+    matches = match_portions_parallel((recipe.get('Ingredients_Used', []) for recipe in to_match),
+                                      ingredient_names, workers)
+    for recipe, raw_ingredients in zip(to_yield, matches):
+        yield recipe, raw_ingredients, recipe_hash(recipe, raw_ingredients)
+
+
+def load_manifest(path: str) -> Dict[str, str]:
+    """Returns the recipe hashes of the last successful load by name_key (empty if none)."""
+    try:
+        with open(path, 'r', encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get('graph') != GRAPH_NAME:
+        return {}
+    return manifest.get('recipes', {})
+
+
+def save_manifest(path: str, hashes: Dict[str, str]):
+    """Writes the manifest atomically so a crash never leaves half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump({'graph': GRAPH_NAME, 'recipes': hashes}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def create_indexes(graph):
+    """Creates the missing range indexes."""
+    for label, prop in INDEXED_PROPERTIES:
+        try:
+            graph.query(f"CREATE INDEX FOR (n:{label}) ON (n.{prop})")
+        except ResponseError:
+            # Already indexed
+            continue
+
 
-        cleaned_chars = [char if char.isalpha() or char.isspace() else ' ' for char in portion_str]
-        cleaned_portion_str = "".join(cleaned_chars).lower()
+def write_recipes(loader: BatchLoader, prepared: List[Tuple[dict, List[str]]]):
+    """
+    Creates the recipe nodes first, then links them to raw ingredients.
+    Both queries are sent in chunks, so a failure only costs the failed chunk.
+    Only the properties that are written are sent, together with their name_key.
+    """
+    recipe_rows = ({
+        'Id': recipe_id(recipe['Food_Name']),
+        'Food_Name': recipe['Food_Name'],
+        'Name_Key': name_key(recipe['Food_Name']),
+        'Instructions': recipe.get('Instructions'),
+        'Portions': recipe.get('Ingredients_Used', []),
+    } for recipe, _ in prepared)
+    link_rows = ({
+        'Id': recipe_id(recipe['Food_Name']),
+        'Links': portion_links(recipe.get('Ingredients_Used', []), raw_ingredients),
+    } for recipe, raw_ingredients in prepared if raw_ingredients)
+    loader.load(CREATE_RECIPE_NODE, 'r_data', recipe_rows, label="Recipe nodes")
+    loader.load(CREATE_RAW_INGREDIENT_NODE, 'dict', link_rows, label="Ingredient links")
 
-        for known_ing in sorted_ingredients:
-            if known_ing.lower() in cleaned_portion_str:
-                found_ingredients.add(known_ing)
 
-                break
+def clear_graph(graph):
+    """Deletes the whole graph before a full rebuild."""
+    print("Cleaning the any existing database...")
+    try:
+        graph.delete()
+        print("✅ Cleanup DONE!.")
+    except Exception:
+        print("ℹ️ No data to clean up (It might be already empty).")
 
-    if found_ingredients:
-        recipe_ing_dict['Food_Name'] = recipe['Food_Name']
-        recipe_ing_dict['Raw_Ingredients'] = list(found_ingredients)
-        recipe_raw_ing_lst.append(recipe_ing_dict)
+
+def checked_manifest(graph, manifest: Dict[str, str]) -> Dict[str, str]:
+    """
+    Drops the manifest if the graph was wiped behind our back.
+    Exits on a graph of an older schema: an incremental load would add
+    an id-keyed copy of every recipe next to the old nodes.
+    """
+    try:
+        recipe_count = graph.query(COUNT_RECIPES).result_set[0][0]
+        legacy_count = graph.query(COUNT_LEGACY_RECIPES).result_set[0][0]
+    except ResponseError:
+        recipe_count = legacy_count = 0
+    if legacy_count:
+        sys.exit(f"❌ {legacy_count} recipe(s) are stored in an older schema. Run 'python migrate_schema.py' "
+                 f"first, or a full load without --incremental.")
+    if recipe_count == 0 and manifest:
+        print("ℹ️ Graph is empty, ignoring the previous load manifest.")
+        return {}
+    return manifest
+
+
+def graph_ingredient_names(graph) -> List[str]:
+    """Every Ingredient name already in the graph."""
+    return [record[0] for record in graph.query(INGREDIENT_NAMES_QUERY).result_set]
+
+
+def bump_graph_version(graph):
+    """Stamps the graph with a new version so db_util caches reload."""
+    graph.query(BUMP_GRAPH_VERSION, {'version': str(time.time_ns())})
+
+
+def load_recipes(graph, loader: BatchLoader, prepared: Iterable[PreparedRecipe],
+                 manifest: Optional[Dict[str, str]] = None, prune: bool = True) -> Dict[str, str]:
+    """
+    Writes the prepared recipes window by window and returns the new manifest.
+    Without a manifest every recipe is written (full rebuild).
+    With one, unchanged recipes are skipped, changed ones are replaced
+    and vanished ones are deleted, so the graph stays readable during the update.
+    prune=False is for delta feeds holding only the changed recipes: nothing is deleted
+    and the recipes missing from the feed stay in the manifest.
+    """
+    hashes: Dict[str, str] = {}
+    if manifest is not None:
+        # Keyed by name_key like the node ids, so a case or spacing rename of a
+        # recipe is a change of the same node rather than a new one plus a removal
+        manifest = {name_key(name): digest for name, digest in manifest.items()}
+    written = replaced = 0
+    for window in chunked(prepared, loader.window_size):
+        to_write = []
+        stale = []
+        for recipe, raw_ingredients, digest in window:
+            key = name_key(recipe['Food_Name'])
+            hashes[key] = digest
+            if manifest is not None:
+                previous = manifest.get(key)
+                if previous == digest:
+                    continue
+                if previous is not None:
+                    stale.append(key)
+            to_write.append((recipe, raw_ingredients))
+        # Changed recipes are removed first, so no edge of the old version survives
+        if stale:
+            graph.query(DELETE_RECIPE_NODE, {'ids': [recipe_id(key) for key in stale]})
+        write_recipes(loader, to_write)
+        written += len(to_write)
+        replaced += len(stale)
+
+    removed = sorted(set(manifest or {}) - set(hashes)) if prune else []
+    if removed:
+        graph.query(DELETE_RECIPE_NODE, {'ids': [recipe_id(key) for key in removed]})
+    if replaced or removed:
+        graph.query(DELETE_ORPHAN_NODES)
+
+    if manifest is not None:
+        print(f"Incremental update: {written - replaced} new, {replaced} changed, "
+              f"{len(removed)} removed, {len(hashes) - written} unchanged recipe(s).")
+    loader.report()
+    if written or removed:
+        bump_graph_version(graph)
+    if not prune:
+        hashes = {**(manifest or {}), **hashes}
+    return hashes
+
+
+def main():
+    """Reads the feed, matches ingredients and fills the graph database."""
+    parser = argparse.ArgumentParser(
+        description="Loads the scraped recipes into FalkorDB."
+    )
+    parser.add_argument('--feed', nargs='+', default=[FEED_PATH],
+                        help=f"Scraped JSON/JSON Lines feed or shard directory (default: {FEED_PATH}), "
+                             f"several delta feeds are loaded one after the other")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only upsert new/changed recipes instead of a full rebuild")
+    parser.add_argument('--delta', action='store_true',
+                        help="The feed only holds changed items (scrap_web.py --incremental), "
+                             "implies --incremental and never deletes recipes")
+    parser.add_argument('--manifest', default=MANIFEST_PATH,
+                        help=f"Load manifest used by --incremental (default: {MANIFEST_PATH})")
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help="Rows sent per UNWIND query (default: 500)")
+    parser.add_argument('--pipeline-depth', type=int, default=4,
+                        help="Chunks sent per round trip to FalkorDB (default: 4)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read the feed block by block in two passes (flat memory use)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processes matching ingredients in parallel (default: 1)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.delta:
+        args.incremental = True
+    elif len(args.feed) > 1:
+        parser.error("several feeds can only be loaded with --delta")
+
+    with profiling(args.profile):
+        fill_database(args)
+    report_metrics(args)
+
+
+def fill_database(args):
+    """Loads the feeds named by the parsed arguments."""
+    # Same FALKORDB_* settings as db_util
+    client = RecipeDBClient(graph_name=GRAPH_NAME)
+    try:
+        graph = client.graph
+    except RedisConnectionError as e:
+        sys.exit(f"Critical Error: Database connection failed. {e}")
+    loader = BatchLoader(graph, chunk_size=args.chunk_size,
+                         pipeline_depth=args.pipeline_depth, connection=client.db.connection)
+
+    # Deltas in crawl order, a recipe changed by several crawls ends up in its latest version.
+    # A failed feed stops the run, a later delta must never be applied before it.
+    for path in args.feed:
+        if len(args.feed) > 1:
+            print(f"Loading {path}...")
+        if not fill_from_feed(graph, loader, path, args):
+            break
+
+
+def fill_from_feed(graph, loader: BatchLoader, path: str, args) -> bool:
+    """Loads one feed (file or shard directory) into the graph, False if the database failed."""
+    if args.stream:
+        # Two passes: ingredient names first (small), then the recipes one by one.
+        # A shard directory only opens the shards of the requested type.
+        def blocks(block_type):
+            return iter_feed(path, block_type)
     else:
-        pass
-# ----------------------
-#   DEFINING QUERIES
-# -----------------------
-# $parameter prevents the not SQL (since Falkor noSQL) but the Cypher injection attacks
-# Query 1: Creating Recipe Nodes
-CREATE_RECIPE_NODE = """
-    UNWIND $r_data AS r
-    MERGE (recipe:Recipe {name: r.Food_Name, instructions: r.Instructions})
-    WITH recipe,r
-    UNWIND r.Ingredients_Used AS ingPortionSTR
-    MERGE (i:IngredientP {ingPortion: ingPortionSTR})
-    MERGE (recipe)-[:MADE_WITH]->(i)
-"""
-# Query 2: Linking Raw Ingredients
-CREATE_RAW_INGREDIENT_NODE = """
-    UNWIND $dict AS d
-    MATCH (r:Recipe {name: d.Food_Name})
-    WITH r,d
-    UNWIND d.Raw_Ingredients AS I
-    MERGE (i:Ingredient {name: I})
-    MERGE (r)-[:HAS_THE_ITEM]->(i)
-"""
-print("Starting database update...")
-
-# Running the queries safely
-try:
-    graph.query(CREATE_RECIPE_NODE, {'r_data': recipes})
-    graph.query(CREATE_RAW_INGREDIENT_NODE, {'dict': recipe_raw_ing_lst})
-    print("Database update successful.")
-except ResponseError as e:
-    print(f"Cypher Query Execution Error: {e}")
-except RedisConnectionError as e:
-    print(f"Database Connection error while executing query: {e}")
+        feed = read_feed(path)
+
+        def blocks(block_type):
+            return blocks_of_type(feed, block_type)
+
+    # Running the queries safely
+    try:
+        ingredient_names = extract_ingredient_names(blocks('INGREDIENT'))
+        if args.delta:
+            # Unchanged ingredients are not in a delta feed, the graph still knows them
+            ingredient_names |= set(graph_ingredient_names(graph))
+        manifest = None
+        if args.incremental:
+            manifest = checked_manifest(graph, load_manifest(args.manifest))
+        else:
+            clear_graph(graph)
+        create_indexes(graph)
+
+        print("Matching and updating the database...")
+        if args.workers > 1:
+            # Every worker compiles its own matcher once, only the portions are sent per task
+            prepared = prepare_recipes_parallel(blocks('MEAL'), ingredient_names, args.workers)
+        else:
+            # The matcher is built once and scans each portion string in a single pass
+            prepared = prepare_recipes(blocks('MEAL'), IngredientMatcher(ingredient_names))
+        # Matching runs lazily between the batches, only its own share of the time is counted
+        prepared = metrics.timed_iter('match', prepared, workers=args.workers)
+        with metrics.span('load'):
+            hashes = load_recipes(graph, loader, prepared, manifest, prune=not args.delta)
+        save_manifest(args.manifest, hashes)
+        # db_util reads it instead of asking WordNet for every vocabulary word
+        try:
+            save_lemma_table(ingredient_names)
+        except LookupError as e:
+            print(f"⚠️ Lemma table not written, WordNet is unavailable: {e}")
+        print("Database update successful.")
+        return True
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        sys.exit(f"Critical Error: JSON file could not be read. {e}")
+    except ResponseError as e:
+        print(f"Cypher Query Execution Error: {e}")
+    except RedisConnectionError as e:
+        print(f"Database Connection error while executing query: {e}")
+    return False
+
+
+if __name__ == "__main__":
+    main()
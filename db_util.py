@@ -3,109 +3,366 @@ This module provides utility functions to interact with the Recipe Graph Databas
 It handles ingredient checks, finding similar ingredients, listing recipes,
 and retrieving detailed recipe instructions using FalkorDB.
 """
+import os
+import threading
 from typing import List, Optional, Dict, Any
 from falkordb import FalkorDB
-from nltk.stem import WordNetLemmatizer
+from redis import BlockingConnectionPool
+from ingredient_search import IngredientVocabulary
+from recipe_index import BitsetRecipeIndex
+from normalization import lemmatize, name_key
+from result_cache import ResultCache, cache_key
+from metrics import metrics
+
+
+class RecipeDBClient:
+    """
+    Holds one connection pool and one graph handle for the whole process.
+    Settings come from the arguments, then from the FALKORDB_HOST, FALKORDB_PORT,
+    FALKORDB_POOL_SIZE and FALKORDB_TIMEOUT environment variables.
+    Nothing is connected until the graph is used for the first time,
+    and the pool hands out connections safely to many threads.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 graph_name: str = "RECIPIES"):
+        self.host = host or os.environ.get('FALKORDB_HOST', 'localhost')
+        self.port = int(port or os.environ.get('FALKORDB_PORT', 6379))
+        self.pool_size = int(pool_size or os.environ.get('FALKORDB_POOL_SIZE', 16))
+        timeout = timeout or os.environ.get('FALKORDB_TIMEOUT')
+        self.timeout = float(timeout) if timeout else None
+        self.graph_name = graph_name
+        self._db: Optional[FalkorDB] = None
+        self._graph = None
+        self._lock = threading.Lock()
+
+    @property
+    def db(self) -> FalkorDB:
+        """The FalkorDB connection, created on first access."""
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    # Blocks for `timeout` seconds when every connection is busy
+                    pool = BlockingConnectionPool(
+                        host=self.host, port=self.port,
+                        max_connections=self.pool_size, timeout=self.timeout,
+                        socket_timeout=self.timeout, socket_connect_timeout=self.timeout,
+                        decode_responses=True,
+                    )
+                    self._db = FalkorDB(connection_pool=pool)
+        return self._db
+
+    @property
+    def graph(self):
+        """The reusable handle of the recipe graph."""
+        if self._graph is None:
+            self._graph = self.db.select_graph(self.graph_name)
+        return self._graph
+
+    def close(self):
+        """Disconnects every pooled connection, the next use reconnects."""
+        with self._lock:
+            if self._db is not None:
+                self._db.connection.connection_pool.disconnect()
+            self._db = None
+            self._graph = None
+
+
+def configure(**settings) -> RecipeDBClient:
+    """Replaces the shared client, e.g. configure(host='db', pool_size=32)."""
+    global client
+    client.close()
+    client = RecipeDBClient(**settings)
+    return client
+
 
 # Global instances
-L = WordNetLemmatizer()
-db = FalkorDB(host='localhost', port=6379)
+client = RecipeDBClient()
 
+GRAPH_VERSION_QUERY = "MATCH (m:GraphMeta {id: 'graph'}) RETURN m.version"
+INGREDIENT_NAMES_QUERY = "MATCH (i:Ingredient) RETURN i.name"
+# Every input key is an index seek, recipes are reached from the ingredient side.
+# The portions are a property of the recipe, so no second traversal is needed.
+SEARCH_RECIPE_QUERY = """
+    UNWIND $input_ingredients AS ing_key
+    MATCH (i:Ingredient {name_key: ing_key})<-[:MADE_WITH]-(rec:Recipe)
+    WITH rec, COUNT(i) AS matchedCount, size($input_ingredients) AS requiredCount
+    WHERE matchedCount = requiredCount
+    RETURN rec.name AS RecipeName,
+           rec.portions AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           rec.id AS RecipeId
+"""
+# Pantry search: recipes ranked by the share of their ingredients the user has.
+# Scoring, filtering and LIMIT all run on the server, one round trip.
+RANKED_RECIPE_QUERY = """
+    UNWIND $input_ingredients AS ing_key
+    MATCH (i:Ingredient {name_key: ing_key})<-[:MADE_WITH]-(rec:Recipe)
+    WITH rec, COUNT(i) AS matchedCount
+    WITH rec, matchedCount, rec.ingredient_count - matchedCount AS missingCount
+    WHERE missingCount <= $max_missing
+    WITH rec, matchedCount, missingCount,
+         toFloat(matchedCount) / rec.ingredient_count AS coverage
+    ORDER BY coverage DESC, missingCount ASC, rec.name ASC
+    LIMIT $limit
+    RETURN rec.name AS RecipeName,
+           rec.portions AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           rec.id AS RecipeId,
+           coverage AS Coverage,
+           [(rec)-[:MADE_WITH]->(m:Ingredient) WHERE NOT m.name_key IN $input_ingredients | m.name]
+               AS MissingIngredients
+    ORDER BY Coverage DESC, size(MissingIngredients) ASC, RecipeName ASC
+"""
+# The detail queries share their RETURN shape, see to_recipe_details()
+RECIPE_DETAILS_QUERY = """
+    MATCH (rec:Recipe {name_key: $r_name})
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           rec.portions AS IngredientsPortion
+"""
+# Recipe ids come from a previous search, the lookup is an index seek
+RECIPE_DETAILS_BY_ID_QUERY = """
+    MATCH (rec:Recipe {id: $r_id})
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           rec.portions AS IngredientsPortion
+"""
+RECIPE_DETAILS_MANY_QUERY = """
+    UNWIND $r_names AS r_name
+    MATCH (rec:Recipe {name_key: r_name})
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           rec.portions AS IngredientsPortion
+"""
 
-def is_ingredient(temp_ingredient: str):
-    """Checks if the given ingredient exists in the database."""
-    graph = db.select_graph("RECIPIES")
 
-    input_to_check = L.lemmatize(temp_ingredient.lower().capitalize())
+def run_query(name: str, query: str, params: Optional[Dict[str, Any]] = None):
+    """
+    Runs a query on the recipe graph, recording the round trip as db_query
+    and FalkorDB's own execution time as db_query_server (label: query=name).
+    """
+    with metrics.span('db_query', query=name):
+        results = client.graph.query(query, params)
+    metrics.record('db_query_server', results.run_time_ms / 1000, query=name)
+    return results
+
+
+def _fetch_ingredient_names() -> List[str]:
+    """Every Ingredient name in the graph, used to fill the vocabulary cache."""
+    results = run_query('ingredient_names', INGREDIENT_NAMES_QUERY)
+    return [record[0] for record in results.result_set]
+
 
-    ingredient_search_query = """
-        MATCH (i:Ingredient) 
-        WHERE toLower(i.name) = toLower($temp_ingredient) 
-        RETURN i
+def _fetch_graph_version() -> Optional[str]:
+    """The version stamp the loader bumps after every successful load."""
+    results = run_query('graph_version', GRAPH_VERSION_QUERY)
+    return results.result_set[0][0] if results.result_set else None
+
+
+# Answers is_ingredient/find_similar_ingredients without a round trip per call
+vocabulary = IngredientVocabulary(_fetch_ingredient_names, _fetch_graph_version, lemmatize)
+
+
+def _shared_cache_tier():
+    """The FalkorDB instance doubles as the shared Redis tier of the result cache."""
+    return client.db.connection
+
+
+def configure_result_cache(max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                           shared: Optional[bool] = None) -> ResultCache:
     """
+    Replaces the search result cache. Settings come from the arguments, then from the
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL and RESULT_CACHE_SHARED (1/0) environment variables.
+    """
+    global result_cache
+    if max_entries is None:
+        max_entries = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+    if ttl is None:
+        ttl = float(os.environ.get('RESULT_CACHE_TTL', 300))
+    if shared is None:
+        shared = os.environ.get('RESULT_CACHE_SHARED', '0') == '1'
+    result_cache = ResultCache(max_entries=max_entries, ttl=ttl,
+                               shared=_shared_cache_tier if shared else None)
+    return result_cache
+
+
+# Popular ingredient combinations are answered without running the traversal again
+result_cache = configure_result_cache()
 
-    results = graph.query(ingredient_search_query, {'temp_ingredient': input_to_check})
-    return len(results.result_set) > 0
 
-def find_similar_ingredients(temp_ingredient: str):
+def _cached_search(operation: str, keys: List[str], params: tuple, execute):
     """
-    Finds and returns a list of ingredients similar to the input string.
-    Returns None if no matches are found.
+    Returns the cached result of a search or runs it and caches it.
+    The graph version is part of the key, so a reload invalidates every entry
+    (noticed within the vocabulary's version check interval).
     """
-    graph = db.select_graph("RECIPIES")
-    temp_ingredient = L.lemmatize(temp_ingredient.lower())
+    version = vocabulary.current_version()
+    result_cache.observe_version(version)
+    key = cache_key(operation, version, keys, *params)
+    found, result = result_cache.get(key)
+    if not found:
+        result = execute()
+        result_cache.put(key, result)
+    return result
+
 
-    retrieve_ingredient_query = """
-        MATCH (i:Ingredient) 
-        WHERE toLower(i.name) CONTAINS toLower($temp_ingredient)
-        RETURN i.name
+_recipe_index: Optional[BitsetRecipeIndex] = None
+_recipe_index_lock = threading.Lock()
+
+
+def recipe_index() -> BitsetRecipeIndex:
+    """
+    The local bitset engine, exported from the graph on first use
+    and exported again whenever the graph version stamp changes
+    (read through the vocabulary, so at most once per its ttl).
     """
-    results = graph.query(retrieve_ingredient_query, {'temp_ingredient': temp_ingredient})
+    global _recipe_index
+    with _recipe_index_lock:
+        version = vocabulary.current_version()
+        if _recipe_index is None or _recipe_index.version != version:
+            with metrics.span('recipe_index_build'):
+                _recipe_index = BitsetRecipeIndex.from_graph(client.graph, version=version)
+        return _recipe_index
 
-    if len(results.result_set) == 0:
+
+def is_ingredient(temp_ingredient: str):
+    """Checks if the given ingredient exists in the database."""
+    input_to_check = lemmatize(temp_ingredient.lower().capitalize())
+    return vocabulary.lookup(input_to_check) is not None
+
+
+def find_similar_ingredients(temp_ingredient: str, top_k: int = 10):
+    """
+    Finds and returns a list of ingredients similar to the input string,
+    best match first and at most top_k of them. Names containing the input
+    come first; if there are none, names within a small edit distance are returned.
+    Returns None if no matches are found.
+    """
+    with metrics.span('lemmatize', step='resolve'):
+        temp_ingredient = name_key(lemmatize(temp_ingredient.lower()))
+
+    with metrics.span('resolve_ingredient'):
+        ingredient_list = vocabulary.similar(temp_ingredient, top_k=top_k)
+
+    if not ingredient_list:
         print(f"No similar ingredients found for '{temp_ingredient}'")
         return None
-    # List comprehension for cleaner code
-    ingredient_list=[]
-    for record in results.result_set:
-        ingredient_list.append(record[0])
     return ingredient_list
 
 
-def list_recipies(input_ing_list: List[str]):
-    """
-    Returns a list of recipes that can be made with the given ingredients,
-    including the required portion details for each recipe.
-    """
-    graph = db.select_graph("RECIPIES")
+def search_keys(input_ing_list: List[str]) -> List[str]:
+    """Lemmatized, deduplicated name_keys of the user's ingredients."""
+    with metrics.span('lemmatize', step='search_keys'):
+        return sorted({name_key(lemmatize(ing.lower())) for ing in input_ing_list})
 
-    search_recipe_query = """
-        MATCH (rec:Recipe)-[:HAS_THE_ITEM]->(i:Ingredient)
-        WHERE toLower(i.name) IN $input_ingredients
-        WITH rec, COUNT(i) AS matchedCount, size($input_ingredients) AS requiredCount
-        WHERE matchedCount = requiredCount
-        MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
-        RETURN rec.name AS RecipeName, 
-               collect(ingP.ingPortion) AS FullIngredientsList
-    """
-    lemmatized_input_list = [L.lemmatize(ing.lower()) for ing in input_ing_list]
-    results = graph.query(search_recipe_query, {'input_ingredients': lemmatized_input_list})
 
-    if len(results.result_set) == 0:
+def to_recipe_list(result_set) -> Optional[List[Dict[str, Any]]]:
+    """Shapes the rows of SEARCH_RECIPE_QUERY, None if there are none."""
+    if len(result_set) == 0:
         return None
     recipe_list = [
         {
             'Food Name': result[0],
-            'Full Ingredients': result[1]
+            'Full Ingredients': result[1],
+            'Instructions': result[2],
+            'Id': result[3]
         }
-        for result in results.result_set
+        for result in result_set
     ]
     return recipe_list
 
 
+def to_ranked_recipe_list(result_set) -> List[Dict[str, Any]]:
+    """Shapes the rows of RANKED_RECIPE_QUERY, best coverage first."""
+    return [
+        {
+            'Food Name': result[0],
+            'Full Ingredients': result[1],
+            'Instructions': result[2],
+            'Id': result[3],
+            'Coverage': result[4],
+            'Missing Ingredients': result[5]
+        }
+        for result in result_set
+    ]
+
+
+def _details_row(result) -> Dict[str, Any]:
+    return {
+        'Food Name': result[0],
+        'Instructions': result[1],
+        'Ingredients': result[2]
+    }
+
+
+def to_recipe_details(result_set) -> Optional[Dict[str, Any]]:
+    """Shapes the row of a recipe details query, None if the recipe is unknown."""
+    if len(result_set) == 0:
+        return None
+    return _details_row(result_set[0])
+
+
+def to_recipe_details_many(result_set, keys: List[str]) -> List[Dict[str, Any]]:
+    """Shapes every row of RECIPE_DETAILS_MANY_QUERY, in the order of `keys`."""
+    by_key = {name_key(result[0]): _details_row(result) for result in result_set}
+    return [by_key[key] for key in keys if key in by_key]
+
+
+def list_recipies(input_ing_list: List[str]):
+    """
+    Returns a list of recipes that can be made with the given ingredients,
+    including the required portion details for each recipe.
+    Instructions and the recipe id come back in the same round trip,
+    so no recipe_details call is needed afterwards.
+    """
+    keys = search_keys(input_ing_list)
+
+    def execute():
+        results = run_query('search', SEARCH_RECIPE_QUERY, {'input_ingredients': keys})
+        return to_recipe_list(results.result_set)
+
+    return _cached_search('list', keys, (), execute)
+
+
+def rank_recipes(input_ing_list: List[str], max_missing: int = 2, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Returns the top `limit` recipes that need at most `max_missing`
+    ingredients besides the given ones, ranked by coverage
+    (matched / required ingredients of the recipe).
+    """
+    keys = search_keys(input_ing_list)
+
+    def execute():
+        results = run_query('ranked_search', RANKED_RECIPE_QUERY, {'input_ingredients': keys,
+                                                                   'max_missing': max_missing,
+                                                                   'limit': limit})
+        return to_ranked_recipe_list(results.result_set)
+
+    return _cached_search('ranked', keys, (max_missing, limit), execute)
+
+
 def recipe_details(recipe_name: str) -> Optional[Dict[str, Any]]:
     """
     Retrieves the full instructions and ingredient portions for a specific recipe.
     Case-insensitive*
     """
-    graph = db.select_graph("RECIPIES")
+    results = run_query('details', RECIPE_DETAILS_QUERY, {'r_name': name_key(recipe_name)})
+    return to_recipe_details(results.result_set)
 
-    detailed_query = """
-        MATCH (rec:Recipe)
-        WHERE toLower(rec.name) = toLower($r_name)
-        MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
-        RETURN rec.instructions AS Instructions, 
-               collect(ingP.ingPortion) AS IngredientsPortion
-    """
 
-    results = graph.query(detailed_query, {'r_name': recipe_name.lower()})
+def recipe_details_by_id(recipe_id: int) -> Optional[Dict[str, Any]]:
+    """Same as recipe_details, for a recipe id returned by list_recipies."""
+    results = run_query('details_by_id', RECIPE_DETAILS_BY_ID_QUERY, {'r_id': recipe_id})
+    return to_recipe_details(results.result_set)
 
-    if len(results.result_set) == 0:
-        return None
 
-    result = results.result_set[0]
-    return {
-        'Food Name': result[0] if hasattr(result, '__getitem__') else recipe_name,  # Garantiye almak için
-        'Instructions': result[0],
-        'Ingredients': result[1]
-    }
+def recipe_details_many(recipe_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Retrieves the details of many recipes in a single query.
+    Unknown names are skipped, the rest keep the input order.
+    """
+    keys = list(dict.fromkeys(name_key(name) for name in recipe_names))
+    results = run_query('details_many', RECIPE_DETAILS_MANY_QUERY, {'r_names': keys})
+    return to_recipe_details_many(results.result_set, keys)
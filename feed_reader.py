@@ -0,0 +1,142 @@
+"""
+This module reads the scraped feed one block at a time.
+Both the JSON array written by the json exporter and JSON Lines are
+supported, so memory use does not grow with the size of the crawl.
+A feed can also be a directory of per-type JSON Lines shards
+(meal-00000.jsonl.gz, ingredient-00000.jsonl, ...) written by scrap_web.py.
+"""
+import gzip
+import io
+import json
+import os
+import re
+from typing import IO, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BUFFER_SIZE = 1 << 16
+# Text a number can still go on with, "-0" + ".5" must not be read as -0
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+def iter_json_array(fp: IO[str], buffer_size: int = BUFFER_SIZE, prefix: str = "") -> Iterator[dict]:
+    """
+    Yields the items of a top level JSON array without loading all of it.
+    `prefix` is text already read from fp (compressed streams cannot seek back).
+    Items must be separated by exactly one ',' like json.load expects,
+    anything else raises json.JSONDecodeError.
+    """
+    decoder = json.JSONDecoder()
+    buffer = prefix
+    pos = 0
+    eof = False
+    started = False
+    # After '[' an item or ']' follows, after an item ',' or ']', after ',' only an item
+    after_item = False
+    after_comma = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = fp.read(buffer_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated JSON array", buffer, pos)
+            fill()
+            continue
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise json.JSONDecodeError("Expecting '['", buffer, pos)
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            if after_comma:
+                raise json.JSONDecodeError("Expecting value", buffer, pos)
+            return
+        if after_item:
+            if char != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            after_item = False
+            after_comma = True
+            pos += 1
+            continue
+        if char == ',':
+            raise json.JSONDecodeError("Expecting value", buffer, pos)
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if not eof and NUMBER_TAIL.fullmatch(buffer, end):
+            # The item might go on in the next chunk
+            fill()
+            continue
+        pos = end
+        after_item = True
+        after_comma = False
+        yield item
+
+
+def iter_json_lines(fp: IO[str]) -> Iterator[dict]:
+    """Yields one item per non-empty line."""
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def open_text(path: str) -> IO[str]:
+    """Opens a plain, .gz or .zst file for reading text."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding="utf-8")
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError(f"Reading '{path}' needs the 'zstandard' package.")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, 'r', encoding="utf-8")
+
+
+def shard_paths(directory: str, block_type: Optional[str] = None) -> List[str]:
+    """The shard files of a feed directory in write order, only one TYPE if given."""
+    prefix = f"{block_type.lower()}-" if block_type else ""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith(prefix) and '.jsonl' in name)
+
+
+def iter_file(path: str) -> Iterator[dict]:
+    """Yields every block of one file, the format is detected from the first character."""
+    with open_text(path) as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == '[':
+            yield from iter_json_array(f, prefix=first)
+        elif first:
+            yield json.loads(first + f.readline())
+            yield from iter_json_lines(f)
+
+
+def iter_feed(path: str, block_type: Optional[str] = None) -> Iterator[dict]:
+    """
+    Yields every block of a feed file or shard directory.
+    With block_type, only those blocks (and only their shards) are read.
+    """
+    paths = shard_paths(path, block_type) if os.path.isdir(path) else [path]
+    for file_path in paths:
+        for block in iter_file(file_path):
+            if block_type is None or block.get('TYPE') == block_type:
+                yield block
@@ -4,16 +4,36 @@ This script takes ingredients as input, validates them,
 and recommends recipes using the db_util module.
 """
 import argparse
+import json
 import sys
 import os
-from typing import List, Optional
-from dataclasses import dataclass
-
-try:
-    import db_util
-except ImportError:
-    sys.exit("❌ Critical Error: 'db_util.py' module not found."
-             "Please ensure it is in the same directory.")
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+from dataclasses import dataclass, field
+from metrics import add_metrics_arguments, metrics, profiling, report_metrics
+from normalization import name_key
+
+# db_util pulls in falkordb, redis and asyncio (~0.1s); it is imported on first use,
+# so --help and rejected inputs return before paying for it
+db_util = None
+
+EXPORT_FORMATS = ("txt", "md", "jsonl")
+# Recipes whose missing details are fetched with one query (and the most held at once)
+EXPORT_BATCH_SIZE = 200
+EXPORT_BUFFER_SIZE = 1 << 20
+
+
+def load_db_util():
+    """Imports db_util once, when the first database call is made."""
+    global db_util
+    if db_util is None:
+        try:
+            import db_util as module
+        except ImportError:
+            sys.exit("❌ Critical Error: 'db_util.py' module not found."
+                     "Please ensure it is in the same directory.")
+        db_util = module
+    return db_util
 
 
 @dataclass
@@ -24,22 +44,54 @@ class Recipe:
     name: str
     ingredients: List[str]
     instructions: Optional[str] = None
+    node_id: Optional[int] = None
+    # Only set by the ranked (pantry) search
+    coverage: Optional[float] = None
+    missing: List[str] = field(default_factory=list)
+
+
+def export_format(path: str) -> str:
+    """Export format implied by the file extension, plain text by default."""
+    extension = os.path.splitext(path)[1].lower()
+    return {'.md': 'md', '.markdown': 'md', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension, 'txt')
+
+
+def format_recipe(recipe: Recipe, fmt: str) -> str:
+    """One recipe as a block of an export file, in one of the EXPORT_FORMATS."""
+    if fmt == 'jsonl':
+        row = {'name': recipe.name, 'ingredients': recipe.ingredients,
+               'instructions': recipe.instructions, 'id': recipe.node_id}
+        if recipe.coverage is not None:
+            row.update(coverage=recipe.coverage, missing=recipe.missing)
+        return json.dumps(row, ensure_ascii=False) + "\n"
+    if fmt == 'md':
+        lines = [f"## {recipe.name}", "", "### Ingredients", "",
+                 *(f"- {ing}" for ing in recipe.ingredients),
+                 "", "### Instructions", "", f"{recipe.instructions}", "", ""]
+        return "\n".join(lines)
+    lines = ["", "=" * 40, f"RECIPE: {recipe.name.upper()}", "-" * 40, "INGREDIENTS:",
+             *(f" - {ing}" for ing in recipe.ingredients),
+             "", "INSTRUCTIONS:", f"{recipe.instructions}", "=" * 40, ""]
+    return "\n".join(lines)
 
 
 class InputValidator:
     """Handles validation and normalization of user inputs."""
 
+    MAX_INGREDIENTS = 20
+
     @staticmethod
     def validate_args(ingredients: List[str]) -> bool:
         """
         Validates the list of ingredients:
-        1. Limits the list to a maximum of 5 ingredients.
+        1. Limits the list to a maximum of MAX_INGREDIENTS ingredients.
         2. Ensures no ingredient name contains numbers.
         """
-        if len(ingredients) > 5:
-            print("⚠️  Warning: You entered more than 5 ingredients. "
-                  "Considering only the first 5.")
-            del ingredients[5:]
+        limit = InputValidator.MAX_INGREDIENTS
+        if len(ingredients) > limit:
+            print(f"⚠️  Warning: You entered more than {limit} ingredients. "
+                  f"Considering only the first {limit}.")
+            del ingredients[limit:]
 
         invalid_inputs = [item for item in ingredients
                           if any(char.isdigit() for char in item)]
@@ -61,15 +113,26 @@ class IngredientResolver:
         Resolves user-provided ingredients against the database.
         Returns a list of validated ingredients or None if ambiguity is detected.
         """
-        valid_ingredients = []
-        ambiguity_flag = False
-
         print("\n🔍 Checking ingredients in the database...")
 
+        all_suggestions = []
         for user_input in raw_ingredients:
             print(f"     Scanning for matches or suggestions for '{user_input}'...")
-            suggestions = db_util.find_similar_ingredients(user_input)
+            all_suggestions.append(load_db_util().find_similar_ingredients(user_input))
+
+        return self._pick_ingredients(raw_ingredients, all_suggestions)
 
+    @staticmethod
+    def _pick_ingredients(raw_ingredients: List[str],
+                          all_suggestions: List[Optional[List[str]]]) -> Optional[List[str]]:
+        """
+        Accepts single suggestions and lists the ambiguous ones.
+        Returns None if any ingredient was ambiguous.
+        """
+        valid_ingredients = []
+        ambiguity_flag = False
+
+        for user_input, suggestions in zip(raw_ingredients, all_suggestions):
             if suggestions:
                 if len(suggestions) > 1:
                     print(
@@ -101,53 +164,249 @@ class IngredientResolver:
 
         return valid_ingredients
 
+    @staticmethod
+    def classify(raw_ingredients: List[str],
+                 all_suggestions: List[Optional[List[str]]]) -> Dict[str, Any]:
+        """
+        Same decision as _pick_ingredients, without printing (used by the service).
+        'resolved' is None if any ingredient was ambiguous.
+        """
+        resolved, ambiguous, unknown = [], {}, []
+        for user_input, suggestions in zip(raw_ingredients, all_suggestions):
+            if not suggestions:
+                unknown.append(user_input)
+            elif len(suggestions) > 1:
+                ambiguous[user_input] = suggestions
+            else:
+                resolved.append(suggestions[0])
+        return {
+            'resolved': None if ambiguous else resolved,
+            'ambiguous': ambiguous,
+            'unknown': unknown,
+        }
+
+
+class AsyncIngredientResolver(IngredientResolver):
+    """
+    Same checks as IngredientResolver, but every ingredient is looked up
+    at the same time, so the wall time is the slowest lookup instead of the sum.
+    """
+
+    async def resolve_ingredients_async(self, raw_ingredients: List[str]) -> Optional[List[str]]:
+        """Async version of resolve_ingredients."""
+        import async_db_util
+
+        print("\n🔍 Checking ingredients in the database...")
+        for user_input in raw_ingredients:
+            print(f"     Scanning for matches or suggestions for '{user_input}'...")
+        all_suggestions = await async_db_util.find_similar_ingredients_many(raw_ingredients)
+
+        return self._pick_ingredients(raw_ingredients, all_suggestions)
+
+    def resolve_ingredients(self, raw_ingredients: List[str]) -> Optional[List[str]]:
+        """
+        Runs the concurrent lookups from synchronous code, on a new event loop.
+        The asyncio connections belong to that loop, so they are closed before it ends.
+        """
+        import asyncio
+        import async_db_util
+
+        async def resolve():
+            try:
+                return await self.resolve_ingredients_async(raw_ingredients)
+            finally:
+                await async_db_util.client.aclose()
+
+        return asyncio.run(resolve())
+
 
 class RecipeManager:
-    """Handles fetching recipes and saving details to a file."""
+    """
+    Handles fetching recipes and saving details to a file.
+    engine="falkordb" runs every search as a Cypher query,
+    engine="local" answers them from the in-memory bitset index.
+    """
+
+    ENGINES = ("falkordb", "local")
 
-    def __init__(self, save_path: str = "Saved_Recipes.txt"):
+    def __init__(self, save_path: str = "Saved_Recipes.txt", engine: str = "falkordb"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', choose from {self.ENGINES}.")
         self.save_path = save_path
+        self.engine = engine
 
     def fetch_recommendations(self, ingredients: List[str]) -> List[Recipe]:
         """
         Fetches recipes that contain ALL the provided ingredients
-        and converts them into Recipe objects.
+        and converts them into Recipe objects, instructions included.
         """
         if not ingredients:
             return []
 
-        raw_data = db_util.list_recipies(ingredients)
+        load_db_util()
+        if self.engine == "local":
+            raw_data = db_util.recipe_index().contains_all(db_util.search_keys(ingredients))
+        else:
+            raw_data = db_util.list_recipies(ingredients) or []
         return [
-            Recipe(name=item['Food Name'], ingredients=item['Full Ingredients'])
+            Recipe(name=item['Food Name'], ingredients=item['Full Ingredients'],
+                   instructions=item['Instructions'], node_id=item['Id'])
             for item in raw_data
         ]
 
-    def save_recipe_details(self, recipe: Recipe):
+    def fetch_ranked_recommendations(self, ingredients: List[str], max_missing: int,
+                                     limit: int = 20) -> List[Recipe]:
         """
-        Fetches and saves the full details of a selected recipe object to a file.
+        Fetches the best recipes for a pantry: recipes may need up to
+        max_missing other ingredients and come sorted by coverage.
         """
-        details = db_util.recipe_details(recipe.name)
-        if not details:
-            print("❌ Error fetching recipe details.")
-            return
+        if not ingredients:
+            return []
 
-        recipe.instructions = details['Instructions']
+        load_db_util()
+        if self.engine == "local":
+            raw_data = db_util.recipe_index().ranked(db_util.search_keys(ingredients),
+                                                     max_missing=max_missing, limit=limit)
+        else:
+            raw_data = db_util.rank_recipes(ingredients, max_missing=max_missing, limit=limit)
+        return [
+            Recipe(name=item['Food Name'], ingredients=item['Full Ingredients'],
+                   instructions=item['Instructions'], node_id=item['Id'],
+                   coverage=item['Coverage'], missing=item['Missing Ingredients'])
+            for item in raw_data
+        ]
+
+    def fetch_details_many(self, recipes: List[Recipe]) -> Dict[str, Dict[str, Any]]:
+        """Details of many recipes from one query, keyed by the name_key of the recipe."""
+        rows = load_db_util().recipe_details_many([recipe.name for recipe in recipes])
+        return {name_key(row['Food Name']): row for row in rows}
 
+    def export_recipes(self, recipes: Iterable[Recipe], path: Optional[str] = None,
+                       fmt: Optional[str] = None, append: bool = True) -> int:
+        """
+        Writes many recipes in one pass through a single buffered file.
+        Recipes are taken EXPORT_BATCH_SIZE at a time and the details missing
+        from a batch come from one query, so any number of recipes
+        (a generator too) is exported with flat memory use.
+        Returns the number of recipes written, unknown recipes are skipped.
+        """
+        path = path or self.save_path
+        fmt = fmt or export_format(path)
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{fmt}', choose from {EXPORT_FORMATS}.")
+
+        recipes = iter(recipes)
+        written = skipped = 0
+        with open(path, 'a' if append else 'w', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE) as f:
+            while True:
+                batch = list(islice(recipes, EXPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                missing = [recipe for recipe in batch if recipe.instructions is None]
+                if missing:
+                    details = self.fetch_details_many(missing)
+                    for recipe in missing:
+                        row = details.get(name_key(recipe.name))
+                        if row:
+                            recipe.instructions = row['Instructions']
+                            recipe.ingredients = recipe.ingredients or row['Ingredients']
+                for recipe in batch:
+                    if recipe.instructions is None:
+                        skipped += 1
+                        continue
+                    f.write(format_recipe(recipe, fmt))
+                    written += 1
+        if skipped:
+            print(f"⚠️ {skipped} recipe(s) could not be found and were skipped.")
+        return written
+
+    def save_recipes(self, recipes: List[Recipe]):
+        """Appends the full details of the selected recipes to the save file."""
         try:
-            with open(self.save_path, 'a', encoding='utf-8') as f:
-                f.write(f"\n{'=' * 40}\n")
-                f.write(f"RECIPE: {recipe.name.upper()}\n")
-                f.write(f"{'-' * 40}\n")
-                f.write("INGREDIENTS:\n")
-                for ing in recipe.ingredients:
-                    f.write(f" - {ing}\n")
-                f.write(f"\nINSTRUCTIONS:\n{recipe.instructions}\n")
-                f.write(f"{'=' * 40}\n")
-
-            abs_path = os.path.abspath(self.save_path)
-            print(f"\n📄 Recipe saved successfully!\n📍 Path: {abs_path}")
+            written = self.export_recipes(recipes, self.save_path, 'txt')
         except IOError as e:
             print(f"❌ File I/O Error: {e}")
+            return
+        if not written:
+            print("❌ Error fetching recipe details.")
+            return
+        abs_path = os.path.abspath(self.save_path)
+        print(f"\n📄 {written} recipe(s) saved successfully!\n📍 Path: {abs_path}")
+
+    def save_recipe_details(self, recipe: Recipe):
+        """
+        Saves the full details of a selected recipe object to a file.
+        Details are only fetched if the search did not return them already.
+        """
+        self.save_recipes([recipe])
+
+
+class RecipeServiceClient:
+    """
+    Talks to a running recipe_service.py over its JSON API.
+    Only the standard library is used, so the thin client starts instantly.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Sends one JSON request, exits with the service's message on an error."""
+        from urllib import error, request
+        req = request.Request(f"{self.base_url}{path}", data=json.dumps(payload).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return json.load(response)
+        except error.HTTPError as e:
+            try:
+                message = json.load(e).get('error', e.reason)
+            except (ValueError, AttributeError):
+                # Not a JSON object, e.g. a proxy's HTML error page
+                message = e.reason
+            sys.exit(f"❌ Service error ({e.code}): {message}")
+        except error.URLError as e:
+            sys.exit(f"❌ Critical Error: recipe service at {self.base_url} is unreachable. {e.reason}")
+
+
+class RemoteIngredientResolver(IngredientResolver):
+    """IngredientResolver whose lookups are answered by the recipe service."""
+
+    def __init__(self, service: RecipeServiceClient):
+        self.service = service
+
+    def resolve_ingredients(self, raw_ingredients: List[str]) -> Optional[List[str]]:
+        print("\n🔍 Checking ingredients in the database...")
+        answer = self.service.post('/resolve', {'ingredients': raw_ingredients})
+        return self._pick_ingredients(raw_ingredients, answer['suggestions'])
+
+
+class RemoteRecipeManager(RecipeManager):
+    """RecipeManager whose searches run inside the recipe service."""
+
+    def __init__(self, service: RecipeServiceClient, save_path: str = "Saved_Recipes.txt",
+                 engine: str = "falkordb"):
+        super().__init__(save_path=save_path, engine=engine)
+        self.service = service
+
+    def fetch_recommendations(self, ingredients: List[str]) -> List[Recipe]:
+        if not ingredients:
+            return []
+        answer = self.service.post('/search', {'ingredients': ingredients, 'engine': self.engine})
+        return [Recipe(**recipe) for recipe in answer['recipes']]
+
+    def fetch_ranked_recommendations(self, ingredients: List[str], max_missing: int,
+                                     limit: int = 20) -> List[Recipe]:
+        if not ingredients:
+            return []
+        answer = self.service.post('/search', {'ingredients': ingredients, 'engine': self.engine,
+                                               'max_missing': max_missing, 'limit': limit})
+        return [Recipe(**recipe) for recipe in answer['recipes']]
+
+    def fetch_details_many(self, recipes: List[Recipe]) -> Dict[str, Dict[str, Any]]:
+        rows = self.service.post('/details', {'names': [recipe.name for recipe in recipes]})['recipes']
+        return {name_key(row['Food Name']): row for row in rows}
 
 
 def main():
@@ -163,15 +422,72 @@ def main():
         metavar='INGREDIENT',
         type=str,
         nargs='+',
-        help='List of ingredients (Max 5 recommended)'
+        help=f'List of ingredients (Max {InputValidator.MAX_INGREDIENTS})'
+    )
+    parser.add_argument(
+        '--max-missing',
+        metavar='K',
+        type=int,
+        default=None,
+        help='Pantry mode: also list recipes missing up to K ingredients, best coverage first'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=20,
+        help='Maximum number of recipes listed in pantry mode (default: 20)'
+    )
+    parser.add_argument(
+        '--engine',
+        choices=RecipeManager.ENGINES,
+        default='falkordb',
+        help='Search with Cypher queries (falkordb) or the in-memory bitset index (local)'
+    )
+
+    parser.add_argument(
+        '--concurrent-lookups',
+        action='store_true',
+        help='Look up all the ingredients at the same time over asyncio connections'
+    )
+    parser.add_argument(
+        '--server',
+        metavar='URL',
+        help='Use a running recipe_service.py (e.g. http://localhost:8080) instead of the database'
+    )
+
+    parser.add_argument(
+        '--export',
+        metavar='PATH',
+        help='Write every recipe found to PATH in one pass instead of asking which ones to save'
+    )
+    parser.add_argument(
+        '--export-format',
+        choices=EXPORT_FORMATS,
+        help='Format of --export (default: from the file extension, .md / .jsonl, else txt)'
     )
 
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
+    with profiling(args.profile):
+        find_recipes(args)
+    report_metrics(args)
+
+
+def find_recipes(args):
+    """Validates, resolves and searches the ingredients, then offers to save a recipe."""
     if not InputValidator.validate_args(args.ingredients):
         return
 
-    resolver = IngredientResolver()
-    final_ingredients = resolver.resolve_ingredients(args.ingredients)
+    if args.server:
+        service = RecipeServiceClient(args.server)
+        resolver = RemoteIngredientResolver(service)
+        manager = RemoteRecipeManager(service, engine=args.engine)
+    else:
+        resolver = AsyncIngredientResolver() if args.concurrent_lookups else IngredientResolver()
+        manager = RecipeManager(engine=args.engine)
+    with metrics.span('resolve'):
+        final_ingredients = resolver.resolve_ingredients(args.ingredients)
 
     if final_ingredients is None:
         print("\n🚨 Since too many similar ingredients were found.")
@@ -185,35 +501,59 @@ def main():
     print(f"\n🚀 All ingredients validated! Searching recipes with:"
           f"{', '.join(final_ingredients)}...")
 
-    manager = RecipeManager()
-    recipes = manager.fetch_recommendations(final_ingredients)
+    with metrics.span('search', ranked=args.max_missing is not None):
+        if args.max_missing is not None:
+            recipes = manager.fetch_ranked_recommendations(final_ingredients, args.max_missing,
+                                                           args.limit)
+        else:
+            recipes = manager.fetch_recommendations(final_ingredients)
 
     if not recipes:
-        print("\n🚫 No recipes found containing ALL these ingredients.")
+        if args.max_missing is not None:
+            print(f"\n🚫 No recipes found missing at most {args.max_missing} ingredient(s).")
+        else:
+            print("\n🚫 No recipes found containing ALL these ingredients.")
         return
 
     print(f"\n🌟 Found {len(recipes)} Recipe(s):")
     for idx, rec in enumerate(recipes, 1):
-        ing_preview = ", ".join(rec.ingredients)
-        print(f"   {idx}. {rec.name} (Needs: {ing_preview[:50]}...)")
+        if rec.coverage is not None:
+            missing = ", ".join(rec.missing) if rec.missing else "nothing"
+            print(f"   {idx}. {rec.name} ({rec.coverage:.0%} covered, Missing: {missing})")
+        else:
+            ing_preview = ", ".join(rec.ingredients)
+            print(f"   {idx}. {rec.name} (Needs: {ing_preview[:50]}...)")
+    if args.export:
+        try:
+            written = manager.export_recipes(recipes, args.export, args.export_format, append=False)
+        except IOError as e:
+            sys.exit(f"❌ File I/O Error: {e}")
+        print(f"\n📄 {written} recipe(s) exported to {os.path.abspath(args.export)}")
+        return
+
     checker=True
     while checker:
-        try:
-            user_input = input("\n💾 Enter number to SAVE details (or '0' to exit): ")
-            choice = int(user_input)
+        user_input = input("\n💾 Enter number(s) to SAVE details, e.g. '1 3' or 'all' (or '0' to exit): ")
+        user_input = user_input.strip().lower()
 
-            if choice == 0:
-                print("👋 Happy Cooking! Exiting.")
-                checker = False
-                break
+        if user_input == '0':
+            print("👋 Happy Cooking! Exiting.")
+            checker = False
+            break
 
-            if 1 <= choice <= len(recipes):
-                selected_recipe = recipes[choice - 1]
-                manager.save_recipe_details(selected_recipe)
-            else:
-                print("⚠️ Invalid number. Choose from the list.")
+        if user_input == 'all':
+            manager.save_recipes(recipes)
+            continue
+        try:
+            choices = [int(part) for part in user_input.replace(',', ' ').split()]
         except ValueError:
             print("⚠️ Please enter a valid number.")
+            continue
+
+        if choices and all(1 <= choice <= len(recipes) for choice in choices):
+            manager.save_recipes([recipes[choice - 1] for choice in choices])
+        else:
+            print("⚠️ Invalid number. Choose from the list.")
 
 
 if __name__ == "__main__":
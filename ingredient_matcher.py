@@ -0,0 +1,221 @@
+"""
+This module matches raw portion strings (e.g. "1 tbsp Olive Oil")
+against the known ingredient names.
+The names are compiled once into an Aho-Corasick automaton, so each
+portion string is scanned in a single pass no matter how big the vocabulary is.
+Big feeds can be matched on several processes with match_portions_parallel().
+parse_portion() reads the quantity and unit in front of the ingredient.
+"""
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Unit spellings found on the site, mapped to one canonical unit
+UNITS = {
+    'tsp': 'tsp', 'tsps': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp', 'tblsp': 'tbsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'cup': 'cup', 'cups': 'cup',
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'grams': 'g', 'kg': 'kg',
+    'ml': 'ml', 'l': 'l', 'litre': 'l', 'litres': 'l', 'liter': 'l', 'liters': 'l',
+    'oz': 'oz', 'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'can': 'can', 'cans': 'can', 'tin': 'can', 'tins': 'can',
+    'clove': 'clove', 'cloves': 'clove', 'slice': 'slice', 'slices': 'slice',
+    'pinch': 'pinch', 'dash': 'dash', 'handful': 'handful', 'sprig': 'sprig', 'sprigs': 'sprig',
+}
+FRACTIONS = {'½': 0.5, '¼': 0.25, '¾': 0.75, '⅓': 1 / 3, '⅔': 2 / 3, '⅛': 0.125}
+# A number with the unit glued to it: "200g", "1.5kg"
+NUMBER_WITH_UNIT = re.compile(r"^(\d+(?:[.,]\d+)?)([a-zA-Z]+)$")
+
+
+def clean_text(text: str) -> str:
+    """Replaces every character that is not a letter or a space with a space."""
+    return "".join(char if char.isalpha() or char.isspace() else ' ' for char in text)
+
+
+def normalize_ingredient_name(raw_name) -> Optional[str]:
+    """
+    Cleans a scraped ingredient title and capitalizes each word.
+    Returns None if nothing meaningful is left.
+    """
+    if not raw_name or not isinstance(raw_name, str):
+        return None
+    cleaned_name_str = clean_text(raw_name).strip()
+    if len(cleaned_name_str) <= 1:
+        return None
+    return " ".join([word.lower().capitalize() for word in cleaned_name_str.split()])
+
+
+def extract_ingredient_names(ingredient_blocks: Iterable[dict]) -> Set[str]:
+    """Collects the normalized names of every INGREDIENT block."""
+    ingredient_names = set()
+    for block in ingredient_blocks:
+        normalized_full_name = normalize_ingredient_name(block.get('Food_Name', ''))
+        if normalized_full_name:
+            ingredient_names.add(normalized_full_name)
+    return ingredient_names
+
+
+class IngredientMatcher:
+    """
+    Finds the longest known ingredient name inside a portion string.
+    Ties on length are broken alphabetically so the result is deterministic.
+    """
+
+    def __init__(self, ingredient_names: Iterable[str]):
+        # Rank 0 is the preferred match: longest first, then alphabetical
+        self.names: List[str] = sorted(set(ingredient_names), key=lambda n: (-len(n), n))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Best (lowest) rank of any name ending at this state, -1 if none
+        self._best: List[int] = [-1]
+        for rank, name in enumerate(self.names):
+            self._add_pattern(name.lower(), rank)
+        self._build_failure_links()
+
+    def _add_pattern(self, pattern: str, rank: int):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(-1)
+            state = next_state
+        if self._best[state] == -1 or rank < self._best[state]:
+            self._best[state] = rank
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                # A state also "contains" every name ending at its suffix states
+                inherited = self._best[self._fail[next_state]]
+                own = self._best[next_state]
+                if inherited != -1 and (own == -1 or inherited < own):
+                    self._best[next_state] = inherited
+
+    def match(self, portion_str) -> Optional[str]:
+        """Returns the best ingredient name found in the portion string, or None."""
+        if not portion_str or not isinstance(portion_str, str):
+            return None
+        goto, fail, best = self._goto, self._fail, self._best
+        state = 0
+        best_rank = -1
+        for char in clean_text(portion_str).lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            rank = best[state]
+            if rank != -1 and (best_rank == -1 or rank < best_rank):
+                best_rank = rank
+                if best_rank == 0:
+                    break
+        return self.names[best_rank] if best_rank != -1 else None
+
+    def match_portions(self, portions: Iterable[str]) -> Set[str]:
+        """Returns the set of ingredient names found across all portion strings."""
+        found_ingredients = set()
+        for portion_str in portions:
+            known_ing = self.match(portion_str)
+            if known_ing:
+                found_ingredients.add(known_ing)
+        return found_ingredients
+
+
+def match_among(portion_str, names: Iterable[str]) -> Optional[str]:
+    """
+    IngredientMatcher.match() over a handful of names, without building an automaton.
+    Given the matches of a recipe, every portion of it gets the same name the full matcher found.
+    """
+    if not portion_str or not isinstance(portion_str, str):
+        return None
+    text = clean_text(portion_str).lower()
+    found = [name for name in names if name.lower() in text]
+    return min(found, key=lambda n: (-len(n), n)) if found else None
+
+
+def parse_quantity(token: str) -> Optional[float]:
+    """'2', '1.5', '1/2' or '½' as a number, None for anything else."""
+    if token in FRACTIONS:
+        return FRACTIONS[token]
+    numerator, slash, denominator = token.partition('/')
+    if slash:
+        if numerator.isdigit() and denominator.isdigit() and int(denominator):
+            return int(numerator) / int(denominator)
+        return None
+    try:
+        return float(token.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def parse_portion(portion_str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    The quantity and canonical unit at the start of a portion string:
+    "1 1/2 cups Flour" -> (1.5, 'cup'), "200g Butter" -> (200.0, 'g'),
+    "Pinch Salt" -> (None, 'pinch'), "Salt to taste" -> (None, None).
+    """
+    tokens = portion_str.split() if isinstance(portion_str, str) else []
+    quantity = None
+    position = 0
+    # "1 1/2" is one quantity written as two numbers
+    while position < len(tokens) and position < 2:
+        glued = NUMBER_WITH_UNIT.match(tokens[position])
+        if glued and glued.group(2).lower() in UNITS:
+            return (quantity or 0.0) + float(glued.group(1).replace(',', '.')), UNITS[glued.group(2).lower()]
+        value = parse_quantity(tokens[position])
+        if value is None:
+            break
+        quantity = (quantity or 0.0) + value
+        position += 1
+    unit = UNITS.get(tokens[position].lower().rstrip('.')) if position < len(tokens) else None
+    return quantity, unit
+
+
+# The matcher of a worker process, built once by _init_worker
+_worker_matcher: Optional[IngredientMatcher] = None
+
+
+def _init_worker(ingredient_names: List[str]):
+    """Runs once per worker: the vocabulary is sent and compiled a single time."""
+    global _worker_matcher
+    _worker_matcher = IngredientMatcher(ingredient_names)
+
+
+def _match_chunk(portion_lists: List[List[str]]) -> List[List[str]]:
+    return [sorted(_worker_matcher.match_portions(portions)) for portions in portion_lists]
+
+
+def match_portions_parallel(portion_lists: Iterable[List[str]], ingredient_names: Iterable[str],
+                            workers: int, chunk_size: int = 256) -> Iterator[List[str]]:
+    """
+    Yields the sorted matches of every portion list, in input order, using `workers` processes.
+    Only chunk_size lists travel per task and at most 2 chunks per worker are in flight,
+    so the input can be a stream.
+    """
+    portion_lists = iter(portion_lists)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(sorted(set(ingredient_names)),)) as executor:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(portion_lists, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_match_chunk, chunk))
+            if not pending:
+                return
+            # Results are taken in submission order, so the output is deterministic
+            yield from pending.popleft().result()
@@ -0,0 +1,188 @@
+"""
+This module answers "similar ingredient" lookups from an in-memory trigram index.
+Substring hits are ranked first (exact, whole word, then closest length);
+if there are none, names within a small edit distance are suggested instead.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from normalization import name_key
+from metrics import metrics
+
+
+def trigrams(text: str, padded: bool = False) -> Set[str]:
+    """Returns the character trigrams of the text, padded with spaces if asked."""
+    if padded:
+        text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Levenshtein distance between a and b.
+    Stops early and returns max_distance + 1 once the limit is exceeded.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def default_max_distance(query: str) -> int:
+    """Short words tolerate one typo, longer ones two."""
+    return 1 if len(query) <= 5 else 2
+
+
+class TrigramIndex:
+    """Trigram postings over the name_key of every ingredient name."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = sorted(set(names))
+        self.keys: List[str] = [name_key(name) for name in self.names]
+        self._exact: Dict[str, int] = {key: idx for idx, key in enumerate(self.keys)}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        for idx, key in enumerate(self.keys):
+            for gram in trigrams(key, padded=True):
+                self._postings[gram].add(idx)
+
+    def __len__(self):
+        return len(self.names)
+
+    def exact(self, key: str) -> Optional[str]:
+        """Returns the ingredient whose name_key is exactly `key`."""
+        idx = self._exact.get(key)
+        return self.names[idx] if idx is not None else None
+
+    def search(self, query: str, top_k: int = 10, max_distance: Optional[int] = None) -> List[str]:
+        """Returns at most top_k names, best match first."""
+        key = name_key(query)
+        if not key:
+            return []
+        hits = self._substring_hits(key)
+        if hits:
+            ranked = sorted(hits, key=lambda idx: self._substring_rank(key, idx))
+        else:
+            ranked = self._fuzzy_hits(key, default_max_distance(key)
+                                      if max_distance is None else max_distance)
+        return [self.names[idx] for idx in ranked[:top_k]]
+
+    def _substring_hits(self, key: str) -> List[int]:
+        if len(key) < 3:
+            return [idx for idx, candidate in enumerate(self.keys) if key in candidate]
+        grams = sorted(trigrams(key), key=lambda gram: len(self._postings.get(gram, ())))
+        candidates = set(self._postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            if not candidates:
+                break
+            candidates &= self._postings.get(gram, set())
+        # Every trigram matching does not guarantee they are in the same order
+        return [idx for idx in candidates if key in self.keys[idx]]
+
+    def _substring_rank(self, key: str, idx: int):
+        candidate = self.keys[idx]
+        return (candidate != key,
+                key not in candidate.split(),
+                len(candidate) - len(key),
+                candidate)
+
+    def _fuzzy_hits(self, key: str, max_distance: int) -> List[int]:
+        shared = Counter()
+        for gram in trigrams(key, padded=True):
+            for idx in self._postings.get(gram, ()):
+                shared[idx] += 1
+        scored = []
+        for idx, common in shared.items():
+            # A typo in a word can still match one of the words of a longer name
+            distance = min(edit_distance(key, part, max_distance)
+                           for part in [self.keys[idx], *self.keys[idx].split()])
+            if distance <= max_distance:
+                scored.append((distance, -common, self.keys[idx], idx))
+        scored.sort()
+        return [idx for *_, idx in scored]
+
+
+class IngredientVocabulary:
+    """
+    In-memory copy of every Ingredient name with its name_key and lemma form.
+    The graph version stamp written by the loader is checked at most
+    every `ttl` seconds; when it changed, the names are loaded again.
+    """
+
+    def __init__(self, fetch_names: Callable[[], Iterable[str]],
+                 fetch_version: Callable[[], Optional[str]],
+                 lemmatize: Callable[[str], str], ttl: float = 5.0):
+        self._fetch_names = fetch_names
+        self._fetch_version = fetch_version
+        self._lemmatize = lemmatize
+        self.ttl = ttl
+        self.version: Optional[str] = None
+        self._checked_at = float('-inf')
+        # (index, lemma_key -> name), swapped as a whole on reload
+        self._snapshot: Optional[Tuple[TrigramIndex, Dict[str, str]]] = None
+        self._lock = threading.Lock()
+
+    def lemma_key(self, text: str) -> str:
+        """name_key with every word lemmatized ("Cherry Tomatoes" -> "cherry tomato")."""
+        return " ".join(self._lemmatize(word) for word in name_key(text).split())
+
+    def invalidate(self):
+        """Forces a reload on the next lookup."""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = float('-inf')
+
+    def needs_check(self) -> bool:
+        """True when the version stamp has to be read again."""
+        return self._snapshot is None or time.monotonic() - self._checked_at >= self.ttl
+
+    def needs_reload(self, version: Optional[str]) -> bool:
+        """True when the names loaded so far do not belong to this version."""
+        return self._snapshot is None or version != self.version
+
+    def load(self, names: Iterable[str], version: Optional[str]):
+        """Replaces the cached names, used directly by the asyncio client."""
+        with metrics.span('vocabulary_load'):
+            index = TrigramIndex(names)
+            by_lemma = {self.lemma_key(n): n for n in reversed(index.names)}
+        self._snapshot = (index, by_lemma)
+        self.version = version
+        self.mark_checked()
+
+    def mark_checked(self):
+        """Records that the version stamp was just confirmed."""
+        self._checked_at = time.monotonic()
+
+    def _current(self) -> Tuple[TrigramIndex, Dict[str, str]]:
+        with self._lock:
+            if self.needs_check():
+                version = self._fetch_version()
+                if self.needs_reload(version):
+                    self.load(self._fetch_names(), version)
+                else:
+                    self.mark_checked()
+            return self._snapshot
+
+    def current_version(self) -> Optional[str]:
+        """The graph version stamp, read from the graph at most every `ttl` seconds."""
+        self._current()
+        return self.version
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Returns the ingredient matching the text exactly or by lemma form."""
+        index, by_lemma = self._current()
+        return index.exact(name_key(text)) or by_lemma.get(self.lemma_key(text))
+
+    def similar(self, text: str, top_k: int = 10) -> List[str]:
+        """Ranked suggestions, see TrigramIndex.search."""
+        index, _ = self._current()
+        return index.search(text, top_k=top_k)
@@ -0,0 +1,192 @@
+"""
+This module is a small, dependency free instrumentation layer.
+Code paths are timed with span() (or record() for times measured elsewhere),
+every metric keeps its count, sum, max and a window of recent samples for
+percentiles, and the whole registry is exported as JSON or Prometheus text.
+profiling() wraps a run with cProfile for the --profile flags.
+"""
+import json
+import math
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# Recent samples kept per metric for the percentiles
+SAMPLE_WINDOW = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_PREFIX = "recipes_"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values) / 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Timer:
+    """Durations (seconds) of one metric with one set of labels."""
+
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        """Nearest-rank quantile (0..1) of the recent samples."""
+        return percentile(sorted(self.samples), q * 100)
+
+
+class Metrics:
+    """Registry of timers, keyed by metric name and labels."""
+
+    def __init__(self):
+        self._timers: Dict[Tuple[str, LabelKey], Timer] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, **labels):
+        """Adds one duration in seconds."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = Timer()
+            timer.add(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Times the with-block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, **labels)
+
+    def timed_iter(self, name: str, items: Iterable[Any], **labels) -> Iterator[Any]:
+        """
+        Yields the items and records the time spent producing them as one sample,
+        for lazy pipelines whose stages run interleaved with their consumer.
+        """
+        spent = 0.0
+        iterator = iter(items)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    spent += time.perf_counter() - started
+                    return
+                spent += time.perf_counter() - started
+                yield item
+        finally:
+            self.record(name, spent, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric as plain data: {name: [{labels, count, sum, max, p50, p90, p99}]}."""
+        with self._lock:
+            items = sorted(self._timers.items())
+        result: Dict[str, Any] = {}
+        for (name, labels), timer in items:
+            entry = {'labels': dict(labels), 'count': timer.count,
+                     'sum_seconds': round(timer.total, 6), 'max_seconds': round(timer.max, 6)}
+            for q in QUANTILES:
+                entry[f'p{int(q * 100)}_seconds'] = round(timer.quantile(q), 6)
+            result.setdefault(name, []).append(entry)
+        return result
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format, one summary per metric."""
+        lines = []
+        for name, entries in self.snapshot().items():
+            metric = f"{METRIC_PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for entry in entries:
+                labels = entry['labels']
+                for q in QUANTILES:
+                    lines.append(f"{metric}{_labels({**labels, 'quantile': str(q)})} "
+                                 f"{entry[f'p{int(q * 100)}_seconds']}")
+                lines.append(f"{metric}_sum{_labels(labels)} {entry['sum_seconds']}")
+                lines.append(f"{metric}_count{_labels(labels)} {entry['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, fmt: str, path: Optional[str] = None):
+        """Writes the metrics as 'json' or 'prometheus' to a file, or to stderr."""
+        text = self.to_json() + "\n" if fmt == 'json' else self.to_prometheus()
+        if path:
+            with open(path, 'w', encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stderr.write(text)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+               for k, v in sorted(labels.items()))
+    return "{" + ",".join(escaped) + "}"
+
+
+@contextmanager
+def profiling(path: Optional[str], top: int = 25):
+    """
+    Runs the with-block under cProfile when a path is given: the raw stats are
+    written there (for snakeviz / pstats) and the top functions are printed.
+    """
+    if not path:
+        yield
+        return
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"\n⏱️ Profile written to {path}, top {top} by cumulative time:", file=sys.stderr)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(top)
+
+
+def add_metrics_arguments(parser):
+    """Adds the --metrics, --metrics-file and --profile options shared by the CLIs."""
+    parser.add_argument('--metrics', choices=['json', 'prometheus'],
+                        help="Print timing metrics (to stderr or --metrics-file) when done")
+    parser.add_argument('--metrics-file', metavar='PATH', help="Write the --metrics output to this file")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Run under cProfile and write the stats to PATH")
+
+
+def report_metrics(args):
+    """Writes the metrics if the run asked for them with --metrics."""
+    if args.metrics:
+        metrics.dump(args.metrics, args.metrics_file)
+
+
+# The process wide registry
+metrics = Metrics()
@@ -0,0 +1,381 @@
+"""
+Migrates a recipe graph written by an older loader to the compact schema,
+in place and batch by batch:
+
+    (Recipe {name, instructions})-[:MADE_WITH]->(IngredientP {ingPortion})
+    (Recipe)-[:HAS_THE_ITEM]->(Ingredient {name})
+becomes
+    (Recipe {id, name, name_key, instructions, portions, ingredient_count})
+        -[:MADE_WITH {position, quantity, unit}]->(Ingredient {name, name_key})
+
+Both older schemas are handled: the original one, searched with toLower(name)
+scans, and the one with indexed name_key properties (and ingredient_count).
+
+Graph memory and search latency are measured before and after with the same
+ingredient combinations (--output saves them as JSON).
+An interrupted migration continues where it stopped when started again.
+
+    python migrate_schema.py --output migration.json
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List
+from database_filler import (COUNT_LEGACY_RECIPES, GRAPH_NAME, bump_graph_version, create_indexes,
+                             portion_links, recipe_id)
+from db_util import (RANKED_RECIPE_QUERY, RECIPE_DETAILS_MANY_QUERY, SEARCH_RECIPE_QUERY,
+                     RecipeDBClient)
+from metrics import Metrics
+from normalization import name_key
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
+
+# ----------------------
+#   SCHEMA 1 QUERIES
+# -----------------------
+# The original loader stored no name_key, every lookup scanned with toLower()
+BASELINE_SEARCH_QUERY = """
+    MATCH (rec:Recipe)-[:HAS_THE_ITEM]->(i:Ingredient)
+    WHERE toLower(i.name) IN $input_ingredients
+    WITH rec, COUNT(i) AS matchedCount, size($input_ingredients) AS requiredCount
+    WHERE matchedCount = requiredCount
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    RETURN rec.name AS RecipeName,
+           collect(ingP.ingPortion) AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           id(rec) AS RecipeId
+"""
+BASELINE_RANKED_QUERY = """
+    MATCH (rec:Recipe)-[:HAS_THE_ITEM]->(i:Ingredient)
+    WHERE toLower(i.name) IN $input_ingredients
+    WITH rec, COUNT(i) AS matchedCount
+    WITH rec, matchedCount, size([(rec)-[:HAS_THE_ITEM]->(a:Ingredient) | a]) AS ingredientCount
+    WITH rec, matchedCount, ingredientCount, ingredientCount - matchedCount AS missingCount
+    WHERE missingCount <= $max_missing
+    WITH rec, matchedCount, missingCount,
+         toFloat(matchedCount) / ingredientCount AS coverage
+    ORDER BY coverage DESC, missingCount ASC, rec.name ASC
+    LIMIT $limit
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    WITH rec, matchedCount, missingCount, coverage, collect(ingP.ingPortion) AS portions
+    RETURN rec.name AS RecipeName,
+           portions AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           id(rec) AS RecipeId,
+           coverage AS Coverage,
+           [(rec)-[:HAS_THE_ITEM]->(m:Ingredient) WHERE NOT toLower(m.name) IN $input_ingredients | m.name]
+               AS MissingIngredients
+    ORDER BY Coverage DESC, size(MissingIngredients) ASC, RecipeName ASC
+"""
+BASELINE_DETAILS_MANY_QUERY = """
+    UNWIND $r_names AS r_name
+    MATCH (rec:Recipe)
+    WHERE toLower(rec.name) = r_name
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           collect(ingP.ingPortion) AS IngredientsPortion
+"""
+
+# ----------------------
+#   SCHEMA 2 QUERIES
+# -----------------------
+LEGACY_SEARCH_QUERY = """
+    UNWIND $input_ingredients AS ing_key
+    MATCH (i:Ingredient {name_key: ing_key})<-[:HAS_THE_ITEM]-(rec:Recipe)
+    WITH rec, COUNT(i) AS matchedCount, size($input_ingredients) AS requiredCount
+    WHERE matchedCount = requiredCount
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    RETURN rec.name AS RecipeName,
+           collect(ingP.ingPortion) AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           id(rec) AS RecipeId
+"""
+LEGACY_RANKED_QUERY = """
+    UNWIND $input_ingredients AS ing_key
+    MATCH (i:Ingredient {name_key: ing_key})<-[:HAS_THE_ITEM]-(rec:Recipe)
+    WITH rec, COUNT(i) AS matchedCount
+    WITH rec, matchedCount, rec.ingredient_count - matchedCount AS missingCount
+    WHERE missingCount <= $max_missing
+    WITH rec, matchedCount, missingCount,
+         toFloat(matchedCount) / rec.ingredient_count AS coverage
+    ORDER BY coverage DESC, missingCount ASC, rec.name ASC
+    LIMIT $limit
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    WITH rec, matchedCount, missingCount, coverage, collect(ingP.ingPortion) AS portions
+    RETURN rec.name AS RecipeName,
+           portions AS FullIngredientsList,
+           rec.instructions AS Instructions,
+           id(rec) AS RecipeId,
+           coverage AS Coverage,
+           [(rec)-[:HAS_THE_ITEM]->(m:Ingredient) WHERE NOT m.name_key IN $input_ingredients | m.name]
+               AS MissingIngredients
+    ORDER BY Coverage DESC, size(MissingIngredients) ASC, RecipeName ASC
+"""
+LEGACY_DETAILS_MANY_QUERY = """
+    UNWIND $r_names AS r_name
+    MATCH (rec:Recipe {name_key: r_name})
+    MATCH (rec)-[:MADE_WITH]->(ingP:IngredientP)
+    RETURN rec.name AS RecipeName,
+           rec.instructions AS Instructions,
+           collect(ingP.ingPortion) AS IngredientsPortion
+"""
+SCHEMA_QUERIES = {
+    'baseline': {'search': BASELINE_SEARCH_QUERY, 'ranked': BASELINE_RANKED_QUERY,
+                 'details': BASELINE_DETAILS_MANY_QUERY},
+    'legacy': {'search': LEGACY_SEARCH_QUERY, 'ranked': LEGACY_RANKED_QUERY,
+               'details': LEGACY_DETAILS_MANY_QUERY},
+    'compact': {'search': SEARCH_RECIPE_QUERY, 'ranked': RANKED_RECIPE_QUERY,
+                'details': RECIPE_DETAILS_MANY_QUERY},
+}
+# Ingredient keys of some recipes, the searches are drawn from them.
+# toLower(name) equals the name_key of the (already single spaced) names of the original schema.
+SAMPLE_QUERY = """
+    MATCH (rec:Recipe)-[:{edge}]->(i:Ingredient)
+    WITH rec, collect(coalesce(i.name_key, toLower(i.name))) AS keys
+    RETURN coalesce(rec.name_key, toLower(rec.name)), keys
+    LIMIT $limit
+"""
+
+# ----------------------
+#   MIGRATION QUERIES
+# -----------------------
+COUNT_UNKEYED = "MATCH (r:Recipe) WHERE r.id IS NULL AND r.name_key IS NULL RETURN count(r)"
+# The original schema has no Ingredient.name_key, every search seeks on it afterwards
+READ_UNKEYED_INGREDIENTS = """
+    MATCH (i:Ingredient) WHERE i.name_key IS NULL
+    RETURN id(i), i.name
+    LIMIT $batch
+"""
+WRITE_INGREDIENT_KEYS = """
+    UNWIND $rows AS row
+    MATCH (i:Ingredient) WHERE id(i) = row.Node
+    SET i.name_key = row.Key
+"""
+READ_LEGACY_BATCH = """
+    MATCH (r:Recipe) WHERE r.id IS NULL
+    WITH r LIMIT $batch
+    OPTIONAL MATCH (r)-[:MADE_WITH]->(p:IngredientP)
+    WITH r, collect(p.ingPortion) AS portions
+    OPTIONAL MATCH (r)-[:HAS_THE_ITEM]->(i:Ingredient)
+    RETURN id(r), r.name, portions, collect(i.name)
+"""
+EXISTING_IDS = """
+    UNWIND $ids AS recipe_id
+    MATCH (r:Recipe {id: recipe_id})
+    RETURN r.id
+"""
+DELETE_NODES = """
+    UNWIND $nodes AS node
+    MATCH (r:Recipe) WHERE id(r) = node
+    DETACH DELETE r
+"""
+# The old edges go in the same query as the new ones are written,
+# an interruption never leaves a recipe without either of them
+WRITE_COMPACT_BATCH = """
+    UNWIND $rows AS row
+    MATCH (r:Recipe) WHERE id(r) = row.Node
+    OPTIONAL MATCH (r)-[old:MADE_WITH|HAS_THE_ITEM]->()
+    DELETE old
+    WITH DISTINCT r, row
+    SET r.id = row.Id,
+        r.name_key = row.Name_Key,
+        r.portions = row.Portions,
+        r.ingredient_count = size(row.Links)
+    WITH r, row
+    UNWIND row.Links AS l
+    MATCH (i:Ingredient {name: l.name})
+    MERGE (r)-[e:MADE_WITH]->(i)
+    SET e.position = l.position, e.quantity = l.quantity, e.unit = l.unit
+"""
+DELETE_PORTION_NODES = """
+    MATCH (p:IngredientP)
+    WITH p LIMIT $batch
+    DETACH DELETE p
+    RETURN count(p)
+"""
+LEGACY_INDEXES = [('IngredientP', 'ingPortion'), ('Recipe', 'name')]
+
+
+def graph_stats(client: RecipeDBClient) -> Dict[str, Any]:
+    """Node and edge counts, FalkorDB's GRAPH.MEMORY report (if supported) and Redis used_memory."""
+    graph = client.graph
+    connection = client.db.connection
+    try:
+        usage = connection.execute_command('GRAPH.MEMORY', 'USAGE', client.graph_name)
+        usage = dict(zip(usage[::2], usage[1::2]))
+    except ResponseError:
+        usage = None
+    return {
+        'nodes': dict(graph.query("MATCH (n) RETURN labels(n)[0], count(n)").result_set),
+        'edges': dict(graph.query("MATCH ()-[e]->() RETURN type(e), count(e)").result_set),
+        'graph_memory': usage,
+        'used_memory_mb': round(connection.info('memory')['used_memory'] / 2 ** 20, 2),
+    }
+
+
+def graph_schema(graph) -> str:
+    """'compact' once every recipe has its id, else 'baseline' (no name_key) or 'legacy'."""
+    if graph.query(COUNT_LEGACY_RECIPES).result_set[0][0] == 0:
+        return 'compact'
+    return 'baseline' if graph.query(COUNT_UNKEYED).result_set[0][0] > 0 else 'legacy'
+
+
+def sample_workload(graph, schema: str, queries: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Parameters of every measured query, the same before and after the migration."""
+    edge = 'MADE_WITH' if schema == 'compact' else 'HAS_THE_ITEM'
+    rows = graph.query(SAMPLE_QUERY.replace('{edge}', edge), {'limit': max(queries * 5, 1000)}).result_set
+    rows = [(key, keys) for key, keys in rows if key and len(keys) >= 2]
+    if not rows:
+        sys.exit("❌ The graph holds no recipe with two ingredients, nothing to measure.")
+    rng = random.Random(seed)
+    workload: Dict[str, List[Dict[str, Any]]] = {'search': [], 'ranked': [], 'details': []}
+    for _ in range(queries):
+        _, keys = rng.choice(rows)
+        workload['search'].append({'input_ingredients': sorted(rng.sample(keys, 2))})
+        pantry = set()
+        for _, keys in rng.sample(rows, min(3, len(rows))):
+            pantry.update(keys)
+        workload['ranked'].append({'input_ingredients': sorted(pantry)[:20], 'max_missing': 2, 'limit': 20})
+        workload['details'].append({'r_names': [key for key, _ in rng.sample(rows, min(10, len(rows)))]})
+    return workload
+
+
+def measure(graph, queries: Dict[str, str], workload: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Round trip and server time of every query, after one untimed warm-up pass."""
+    timings = Metrics()
+    for name, query in queries.items():
+        for params in workload[name][:10]:
+            graph.query(query, params)
+        for params in workload[name]:
+            with timings.span(name):
+                result = graph.query(query, params)
+            timings.record(f"{name}_server", result.run_time_ms / 1000)
+    return {name: {'count': entries[0]['count'],
+                   'p50_ms': round(entries[0]['p50_seconds'] * 1000, 3),
+                   'p99_ms': round(entries[0]['p99_seconds'] * 1000, 3)}
+            for name, entries in timings.snapshot().items()}
+
+
+def migrate(client: RecipeDBClient, batch_size: int) -> Dict[str, int]:
+    """
+    Gives every ingredient its name_key, rewrites every legacy recipe,
+    then drops the IngredientP nodes and their index.
+    """
+    graph = client.graph
+    # The id index first: the duplicate check and the later loads seek on it
+    create_indexes(graph)
+    keyed = 0
+    while True:
+        batch = graph.query(READ_UNKEYED_INGREDIENTS, {'batch': batch_size * 20}).result_set
+        if not batch:
+            break
+        graph.query(WRITE_INGREDIENT_KEYS, {'rows': [{'Node': node, 'Key': name_key(name or "")}
+                                                     for node, name in batch]})
+        keyed += len(batch)
+
+    migrated = duplicates = 0
+    while True:
+        batch = graph.query(READ_LEGACY_BATCH, {'batch': batch_size}).result_set
+        if not batch:
+            break
+        rows, seen = [], {}
+        for node, name, portions, raw_ingredients in batch:
+            rid = recipe_id(name)
+            if rid in seen:
+                # Same name_key twice: the lookups already treated them as one recipe
+                seen[rid].append(node)
+                continue
+            seen[rid] = [node]
+            rows.append({'Node': node, 'Id': rid, 'Name_Key': name_key(name), 'Portions': portions,
+                         'Links': portion_links(portions, sorted(raw_ingredients))})
+        existing = {record[0] for record in graph.query(EXISTING_IDS, {'ids': list(seen)}).result_set}
+        stale = [node for rid, nodes in seen.items() for node in (nodes if rid in existing else nodes[1:])]
+        rows = [row for row in rows if row['Id'] not in existing]
+        if stale:
+            graph.query(DELETE_NODES, {'nodes': stale})
+        if rows:
+            graph.query(WRITE_COMPACT_BATCH, {'rows': rows})
+        migrated += len(rows)
+        duplicates += len(stale)
+        print(f"   ↳ {migrated} recipe(s) migrated...")
+
+    removed = 0
+    while True:
+        count = graph.query(DELETE_PORTION_NODES, {'batch': batch_size * 20}).result_set[0][0]
+        if not count:
+            break
+        removed += count
+    for label, prop in LEGACY_INDEXES:
+        try:
+            graph.query(f"DROP INDEX FOR (n:{label}) ON (n.{prop})")
+        except ResponseError:
+            # Already dropped
+            continue
+    bump_graph_version(graph)
+    return {'ingredient_keys_added': keyed, 'migrated': migrated, 'duplicates_removed': duplicates,
+            'portion_nodes_removed': removed}
+
+
+def print_comparison(before: Dict[str, Any], after: Dict[str, Any]):
+    print("\n📊 Before -> after:")
+    print(f"   used_memory: {before['graph']['used_memory_mb']} MB -> {after['graph']['used_memory_mb']} MB")
+    if before['graph']['graph_memory'] and after['graph']['graph_memory']:
+        for key, value in before['graph']['graph_memory'].items():
+            print(f"   {key}: {value} -> {after['graph']['graph_memory'].get(key)}")
+    print(f"   nodes: {before['graph']['nodes']} -> {after['graph']['nodes']}")
+    print(f"   edges: {before['graph']['edges']} -> {after['graph']['edges']}")
+    for name, timing in before['latency'].items():
+        new = after['latency'].get(name, {})
+        print(f"   {name:<15} p50 {timing['p50_ms']} -> {new.get('p50_ms')} ms, "
+              f"p99 {timing['p99_ms']} -> {new.get('p99_ms')} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrates the recipe graph to the compact schema.")
+    parser.add_argument('--graph', default=GRAPH_NAME, help=f"Graph to migrate (default: {GRAPH_NAME})")
+    parser.add_argument('--batch-size', type=int, default=500, help="Recipes rewritten per query (default: 500)")
+    parser.add_argument('--queries', type=int, default=200,
+                        help="Queries per latency measurement (default: 200)")
+    parser.add_argument('--seed', type=int, default=42, help="Seed of the measured queries (default: 42)")
+    parser.add_argument('--measure-only', action='store_true', help="Only measure the graph as it is")
+    parser.add_argument('--output', metavar='PATH', help="Save the measurements as JSON")
+    args = parser.parse_args()
+
+    client = RecipeDBClient(graph_name=args.graph)
+    try:
+        graph = client.graph
+        schema = graph_schema(graph)
+        workload = sample_workload(graph, schema, args.queries, args.seed)
+        report: Dict[str, Any] = {'graph': args.graph, 'schema': schema}
+        print(f"⏱️ Measuring the {schema} graph...")
+        report['before'] = {'graph': graph_stats(client),
+                            'latency': measure(graph, SCHEMA_QUERIES[schema], workload)}
+
+        if schema != 'compact' and not args.measure_only:
+            print("Migrating to the compact schema...")
+            start = time.perf_counter()
+            report['migration'] = migrate(client, args.batch_size)
+            report['migration']['seconds'] = round(time.perf_counter() - start, 2)
+            print(f"✅ Migration DONE! {report['migration']}")
+            print("ℹ️ The next --incremental load rewrites every recipe once "
+                  "(the schema version is part of the recipe hash).")
+            report['after'] = {'graph': graph_stats(client),
+                               'latency': measure(graph, SCHEMA_QUERIES['compact'], workload)}
+            print_comparison(report['before'], report['after'])
+        else:
+            print(json.dumps(report['before'], indent=2))
+    except ResponseError as e:
+        sys.exit(f"Cypher Query Execution Error: {e}")
+    except RedisConnectionError as e:
+        sys.exit(f"Critical Error: Database connection failed. {e}")
+
+    if args.output:
+        with open(args.output, 'w', encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Measurements saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
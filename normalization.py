@@ -0,0 +1,99 @@
+"""
+This module holds the text normalization shared by the loader and db_util.
+Both sides must build lookup keys exactly the same way,
+otherwise the indexed lookups miss.
+
+Lemmatization is memoized: every word or name is first looked up in the
+lemma table the loader writes for the ingredient vocabulary, and WordNet is
+only loaded (and downloaded, if there is no local copy) for one it has not seen.
+"""
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+# Written by database_filler.py next to its load manifest
+LEMMA_TABLE_PATH = os.environ.get('LEMMA_TABLE_PATH', '.lemma_table.json')
+LEMMA_CACHE_SIZE = 65536
+# The corpus may be installed unzipped or as the zip nltk.download() leaves behind
+WORDNET_RESOURCES = ('corpora/wordnet', 'corpora/wordnet.zip')
+
+_wordnet_lemmatizer = None
+_lemma_table: Optional[Dict[str, str]] = None
+_lock = threading.Lock()
+
+
+def name_key(name: str) -> str:
+    """Lowercased name with single spaces, stored as the indexed `name_key` property."""
+    return " ".join(name.lower().split())
+
+
+def ensure_wordnet():
+    """Downloads WordNet only when no local copy is found, so a ready machine never hits the network."""
+    import nltk
+    for resource in WORDNET_RESOURCES:
+        try:
+            nltk.data.find(resource)
+            return
+        except LookupError:
+            continue
+    nltk.download('wordnet', quiet=True)
+
+
+def _lemmatizer():
+    """The WordNet lemmatizer, created (and its corpus checked) on first use."""
+    global _wordnet_lemmatizer
+    if _wordnet_lemmatizer is None:
+        with _lock:
+            if _wordnet_lemmatizer is None:
+                ensure_wordnet()
+                from nltk.stem import WordNetLemmatizer
+                _wordnet_lemmatizer = WordNetLemmatizer()
+    return _wordnet_lemmatizer
+
+
+def lemma_table() -> Dict[str, str]:
+    """The persisted word -> lemma table, read from disk on first use (empty if there is none)."""
+    global _lemma_table
+    if _lemma_table is None:
+        try:
+            with open(LEMMA_TABLE_PATH, 'r', encoding="utf-8") as f:
+                _lemma_table = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _lemma_table = {}
+    return _lemma_table
+
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word: str) -> str:
+    """Same result as WordNetLemmatizer().lemmatize(word), memoized."""
+    key = word.lower()
+    lemma = lemma_table().get(key)
+    if lemma is None:
+        return _lemmatizer().lemmatize(word)
+    # WordNet only holds lower case forms, any other spelling comes back unchanged
+    return lemma if key == word else word
+
+
+def build_lemma_table(names: Iterable[str]) -> Dict[str, str]:
+    """Lemma of every name_key and of every word in it, keyed in lower case."""
+    keys = {name_key(name) for name in names}
+    words = {word for key in keys for word in key.split()}
+    lemmatizer = _lemmatizer()
+    return {key: lemmatizer.lemmatize(key) for key in sorted(keys | words)}
+
+
+def save_lemma_table(names: Iterable[str], path: Optional[str] = None) -> Dict[str, str]:
+    """Precomputes the table for the vocabulary and writes it atomically."""
+    global _lemma_table
+    path = path or LEMMA_TABLE_PATH
+    table = build_lemma_table(names)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    if path == LEMMA_TABLE_PATH:
+        _lemma_table = table
+        lemmatize.cache_clear()
+    return table
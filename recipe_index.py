@@ -0,0 +1,163 @@
+"""
+This module is a local query engine over an export of the recipe graph.
+Every ingredient gets an integer id and every ingredient keeps a bitmap
+(a python int, bit i = recipe i) of the recipes using it, so searches
+are a handful of big-integer AND/OR operations instead of graph traversals.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Recipe rows: name, ingredient name_keys, ingredient names, portions, instructions, recipe id
+EXPORT_QUERY = """
+    MATCH (rec:Recipe)-[:MADE_WITH]->(i:Ingredient)
+    WITH rec, collect(i.name_key) AS keys, collect(i.name) AS names
+    RETURN rec.name, keys, names, rec.portions, rec.instructions, rec.id
+"""
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    """Yields the positions of the set bits, lowest first."""
+    while bitmap:
+        lowest = bitmap & -bitmap
+        yield lowest.bit_length() - 1
+        bitmap ^= lowest
+
+
+def bitmap_from_indices(indices: Iterable[int], size: int) -> int:
+    """Builds the bitmap in one pass (setting bits on an int one by one copies it each time)."""
+    buffer = bytearray(size // 8 + 1)
+    for idx in indices:
+        buffer[idx >> 3] |= 1 << (idx & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class BitsetRecipeIndex:
+    """
+    Recipes are numbered in name order, so walking a bitmap from its lowest
+    bit lists recipes alphabetically without sorting.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]], version: Optional[str] = None):
+        self.version = version
+        rows = sorted(rows, key=lambda row: row[0])
+        self.ingredient_ids: Dict[str, int] = {}
+        self.ingredient_names: List[str] = []
+        self.recipes: List[Dict[str, Any]] = []
+        self.recipe_bits: List[int] = []
+        postings: Dict[int, List[int]] = defaultdict(list)
+        by_count: Dict[int, List[int]] = defaultdict(list)
+
+        for idx, (name, keys, names, portions, instructions, recipe_id) in enumerate(rows):
+            bits = 0
+            for key, ing_name in zip(keys, names):
+                iid = self.ingredient_ids.get(key)
+                if iid is None:
+                    iid = self.ingredient_ids[key] = len(self.ingredient_names)
+                    self.ingredient_names.append(ing_name)
+                bits |= 1 << iid
+                postings[iid].append(idx)
+            self.recipe_bits.append(bits)
+            by_count[bits.bit_count()].append(idx)
+            self.recipes.append({
+                'Food Name': name,
+                'Full Ingredients': portions,
+                'Instructions': instructions,
+                'Id': recipe_id,
+            })
+
+        size = len(self.recipes)
+        self.postings: List[int] = [bitmap_from_indices(postings[iid], size)
+                                    for iid in range(len(self.ingredient_names))]
+        # Recipes grouped by how many ingredients they need
+        self.by_count: Dict[int, int] = {count: bitmap_from_indices(indices, size)
+                                         for count, indices in by_count.items()}
+        self.all_recipes = (1 << len(self.recipes)) - 1
+
+    @classmethod
+    def from_graph(cls, graph, version: Optional[str] = None) -> "BitsetRecipeIndex":
+        """Builds the index from one export query."""
+        return cls(graph.query(EXPORT_QUERY).result_set, version=version)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def _ids(self, keys: Iterable[str]) -> List[Optional[int]]:
+        return [self.ingredient_ids.get(key) for key in dict.fromkeys(keys)]
+
+    def contains_all_bitmap(self, keys: Iterable[str]) -> int:
+        """Recipes using every ingredient, an unknown ingredient matches nothing."""
+        bitmap = self.all_recipes
+        for iid in self._ids(keys):
+            if iid is None:
+                return 0
+            bitmap &= self.postings[iid]
+        return bitmap
+
+    def contains_any_bitmap(self, keys: Iterable[str]) -> int:
+        """Recipes using at least one of the ingredients."""
+        bitmap = 0
+        for iid in self._ids(keys):
+            if iid is not None:
+                bitmap |= self.postings[iid]
+        return bitmap
+
+    def contains_all(self, keys: Iterable[str]) -> List[Dict[str, Any]]:
+        """Same result shape as db_util.list_recipies (but [] instead of None)."""
+        return [self.recipes[idx] for idx in iter_bits(self.contains_all_bitmap(keys))]
+
+    def contains_any(self, keys: Iterable[str]) -> List[Dict[str, Any]]:
+        """Recipes using at least one of the ingredients, alphabetically."""
+        return [self.recipes[idx] for idx in iter_bits(self.contains_any_bitmap(keys))]
+
+    def _matched_slices(self, query_ids: List[int]) -> List[int]:
+        """
+        Bit-sliced counters: bit j of a recipe's matched count is its bit in slices[j].
+        Each posting is added to all recipes at once with ripple-carry addition.
+        """
+        slices: List[int] = []
+        for iid in query_ids:
+            carry = self.postings[iid]
+            for j, current in enumerate(slices):
+                if not carry:
+                    break
+                slices[j], carry = current ^ carry, current & carry
+            if carry:
+                slices.append(carry)
+        return slices
+
+    def _matched_equals(self, slices: List[int], matched: int) -> int:
+        """Bitmap of the recipes whose matched count is exactly `matched`."""
+        if matched >> len(slices):
+            return 0
+        bitmap = self.all_recipes
+        for j, current in enumerate(slices):
+            bitmap &= current if (matched >> j) & 1 else ~current
+        return bitmap
+
+    def ranked(self, keys: Iterable[str], max_missing: int = 2, limit: int = 20) -> List[Dict[str, Any]]:
+        """Same ranking and result shape as db_util.rank_recipes."""
+        query_ids = [iid for iid in self._ids(keys) if iid is not None]
+        query_bits = sum(1 << iid for iid in query_ids)
+        slices = self._matched_slices(query_ids)
+
+        # Recipes sharing (coverage, missing) form one bucket; only full
+        # coverage can come from several (required, matched) pairs
+        buckets: Dict[tuple, int] = defaultdict(int)
+        for required, count_bitmap in self.by_count.items():
+            for matched in range(max(1, required - max_missing), min(required, len(query_ids)) + 1):
+                bitmap = count_bitmap & self._matched_equals(slices, matched)
+                if bitmap:
+                    buckets[(-matched / required, required - matched)] |= bitmap
+
+        results = []
+        for (neg_coverage, _), bitmap in sorted(buckets.items()):
+            for idx in iter_bits(bitmap):
+                if len(results) >= limit:
+                    return results
+                missing_bits = self.recipe_bits[idx] & ~query_bits
+                results.append({
+                    **self.recipes[idx],
+                    'Coverage': -neg_coverage,
+                    'Missing Ingredients': [self.ingredient_names[iid] for iid in iter_bits(missing_bits)],
+                })
+        return results
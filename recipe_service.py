@@ -0,0 +1,201 @@
+"""
+Long-running recipe query service with a local HTTP/JSON API.
+The interpreter, the lemma cache, the ingredient vocabulary, the bitset index
+and the FalkorDB connection pools stay warm between requests, so a search
+costs one query instead of a whole process start.
+
+    POST /resolve  {"ingredients": [...]}
+    POST /search   {"ingredients": [...], "max_missing": K, "limit": 20, "engine": "falkordb"}
+    POST /details  {"id": 12} | {"name": "..."} | {"names": [...]}
+    POST /batch    {"requests": [{"op": "search", ...}, {"op": "details", ...}]}
+    GET  /health
+    GET  /metrics  (Prometheus text)
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Dict, List
+from aiohttp import web
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
+import async_db_util
+import db_util
+from metrics import metrics
+from find_recipe import IngredientResolver, InputValidator, RecipeManager
+
+# One manager per engine, they only hold settings
+MANAGERS = {engine: RecipeManager(engine=engine) for engine in RecipeManager.ENGINES}
+
+
+class BadRequest(ValueError):
+    """The request body is not usable, answered with HTTP 400."""
+
+
+def ingredients_of(body: Dict[str, Any]) -> List[str]:
+    """The validated ingredient list of a request, same rules as the CLI."""
+    ingredients = body.get('ingredients')
+    if not isinstance(ingredients, list) or not all(isinstance(i, str) for i in ingredients):
+        raise BadRequest("'ingredients' must be a list of strings.")
+    if len(ingredients) > InputValidator.MAX_INGREDIENTS:
+        raise BadRequest(f"At most {InputValidator.MAX_INGREDIENTS} ingredients are supported.")
+    invalid_inputs = [item for item in ingredients if any(char.isdigit() for char in item)]
+    if invalid_inputs:
+        raise BadRequest(f"Ingredient names cannot contain numbers: {', '.join(invalid_inputs)}")
+    return ingredients
+
+
+def integer_of(body: Dict[str, Any], key: str, default: Any = None) -> int:
+    """An integer field of a request, numeric strings are accepted."""
+    value = body.get(key, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"'{key}' must be an integer, got {value!r}.")
+
+
+def manager_of(body: Dict[str, Any]) -> RecipeManager:
+    engine = body.get('engine', 'falkordb')
+    if engine not in MANAGERS:
+        raise BadRequest(f"Unknown engine '{engine}', choose from {RecipeManager.ENGINES}.")
+    return MANAGERS[engine]
+
+
+async def in_thread(func, *args):
+    """Runs a blocking db_util call on the service's thread pool."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def resolve(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Suggestions for every ingredient plus the resolver's decision."""
+    ingredients = ingredients_of(body)
+    suggestions = await async_db_util.find_similar_ingredients_many(ingredients)
+    return {'suggestions': suggestions, **IngredientResolver.classify(ingredients, suggestions)}
+
+
+async def search(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Recipes using all the ingredients, or ranked by coverage with max_missing."""
+    ingredients = ingredients_of(body)
+    manager = manager_of(body)
+    max_missing = body.get('max_missing')
+    if max_missing is None:
+        recipes = await in_thread(manager.fetch_recommendations, ingredients)
+    else:
+        recipes = await in_thread(manager.fetch_ranked_recommendations, ingredients,
+                                  integer_of(body, 'max_missing'), integer_of(body, 'limit', 20))
+    return {'recipes': [asdict(recipe) for recipe in recipes]}
+
+
+async def details(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Details of one recipe (by id or name) or of many names in one query."""
+    if 'names' in body:
+        if not isinstance(body['names'], list) or not all(isinstance(n, str) for n in body['names']):
+            raise BadRequest("'names' must be a list of strings.")
+        return {'recipes': await async_db_util.recipe_details_many(body['names'])}
+    if body.get('id') is not None:
+        return {'recipe': await async_db_util.recipe_details_by_id(integer_of(body, 'id'))}
+    if body.get('name'):
+        return {'recipe': await async_db_util.recipe_details(body['name'])}
+    raise BadRequest("Give an 'id', a 'name' or a list of 'names'.")
+
+
+OPERATIONS = {'resolve': resolve, 'search': search, 'details': details}
+
+
+async def batch(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs many operations concurrently, answers keep the request order."""
+    requests = body.get('requests')
+    if not isinstance(requests, list):
+        raise BadRequest("'requests' must be a list.")
+
+    async def run(request):
+        if not isinstance(request, dict):
+            return {'error': "Every request must be a JSON object."}
+        operation = OPERATIONS.get(request.get('op'))
+        if operation is None:
+            return {'error': f"Unknown op '{request.get('op')}', choose from {sorted(OPERATIONS)}."}
+        try:
+            return await operation(request)
+        except BadRequest as e:
+            return {'error': str(e)}
+
+    return {'responses': await asyncio.gather(*(run(request) for request in requests))}
+
+
+def json_endpoint(operation):
+    """Wraps an operation as a POST handler: JSON body in, JSON out, errors as JSON."""
+    async def handler(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({'error': "The body must be JSON."}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({'error': "The body must be a JSON object."}, status=400)
+        try:
+            with metrics.span('request', endpoint=request.path):
+                answer = await operation(body)
+            return web.json_response(answer)
+        except BadRequest as e:
+            return web.json_response({'error': str(e)}, status=400)
+        except RedisConnectionError as e:
+            return web.json_response({'error': f"Database unavailable: {e}"}, status=503)
+        except ResponseError as e:
+            return web.json_response({'error': f"Cypher Query Execution Error: {e}"}, status=500)
+    return handler
+
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({'status': 'ok', 'graph_version': db_util.vocabulary.version,
+                              'result_cache': db_util.result_cache.counters()})
+
+
+async def prometheus_metrics(request: web.Request) -> web.Response:
+    """Query, lemmatization and request timings in the Prometheus text format."""
+    return web.Response(text=metrics.to_prometheus(), content_type='text/plain')
+
+
+async def on_startup(app: web.Application):
+    # The blocking db_util pool and the thread pool get the same size
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=db_util.client.pool_size, thread_name_prefix='recipe-db'))
+    try:
+        await async_db_util.warm_up()
+        if app['warm_local']:
+            await in_thread(db_util.recipe_index)
+        print(f"🔥 Caches warm (graph version {db_util.vocabulary.version}).")
+    except RedisConnectionError as e:
+        print(f"⚠️ Database not reachable yet, caches load on the first request. {e}")
+
+
+async def on_cleanup(app: web.Application):
+    await async_db_util.client.aclose()
+    db_util.client.close()
+
+
+def create_app(warm_local: bool = False) -> web.Application:
+    """The aiohttp application, also used by benchmarks/load_test.py."""
+    app = web.Application()
+    app['warm_local'] = warm_local
+    app.router.add_post('/resolve', json_endpoint(resolve))
+    app.router.add_post('/search', json_endpoint(search))
+    app.router.add_post('/details', json_endpoint(details))
+    app.router.add_post('/batch', json_endpoint(batch))
+    app.router.add_get('/health', health)
+    app.router.add_get('/metrics', prometheus_metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    """Parses the server options and serves until interrupted."""
+    parser = argparse.ArgumentParser(description="Recipe query service (HTTP/JSON).")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on (default: 8080)")
+    parser.add_argument('--warm-local', action='store_true',
+                        help="Build the in-memory bitset index at startup (engine=local)")
+    args = parser.parse_args()
+    web.run_app(create_app(warm_local=args.warm_local), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+This module caches search results keyed by the normalized ingredient set.
+The first tier is an in-process LRU bounded by entry count and TTL; an
+optional second tier keeps JSON copies in Redis (the FalkorDB instance
+itself), shared by every process. Keys carry the graph version stamp,
+so a reload of the graph makes every older entry unreachable.
+"""
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Counter names reported by ResultCache.counters()
+COUNTERS = ('hits', 'misses', 'shared_hits', 'evictions', 'expirations', 'invalidations')
+# Returned by get_local() when there is no live entry (None is a valid cached result)
+MISSING = object()
+
+
+def cache_key(operation: str, version: Optional[str], keys: Iterable[str], *params) -> str:
+    """Key of one search: operation, graph version, sorted lemmatized keys and parameters."""
+    parts = [operation, str(version), "|".join(sorted(keys))]
+    parts.extend(str(param) for param in params)
+    return "\x1f".join(parts)
+
+
+class ResultCache:
+    """
+    LRU + TTL result cache with an optional shared Redis tier.
+    `shared` is a redis client (decode_responses=True), a function returning one
+    (called on first use, so nothing connects early) or None for local only.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, shared=None,
+                 namespace: str = "recipes:result-cache"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._shared = shared
+        self.namespace = namespace
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._counters = Counter({name: 0 for name in COUNTERS})
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def shared(self):
+        """The redis client of the shared tier, None if there is none."""
+        if callable(self._shared):
+            self._shared = self._shared()
+        return self._shared
+
+    @property
+    def shared_enabled(self) -> bool:
+        """True if a shared tier is configured (without connecting to it)."""
+        return self._shared is not None
+
+    def shared_key(self, key: str) -> str:
+        """Redis key of an entry."""
+        return f"{self.namespace}:{key}"
+
+    def observe_version(self, version: Optional[str]):
+        """Drops the local entries once the graph version changed (they can never hit again)."""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self._counters['invalidations'] += 1
+                self._entries.clear()
+                self.version = version
+
+    def get_local(self, key: str) -> Any:
+        """The cached value, or MISSING. Counts nothing, see get()."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def put_local(self, key: str, value: Any):
+        """Stores a value in the LRU tier, evicting the least recently used ones."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def count(self, name: str):
+        """Increments one of the COUNTERS (used by the asyncio lookups)."""
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(found, value): the local tier first, then the shared one."""
+        value = self.get_local(key)
+        if value is not MISSING:
+            self.count('hits')
+            return True, value
+        if self.shared is not None:
+            raw = self.shared.get(self.shared_key(key))
+            if raw is not None:
+                value = json.loads(raw)
+                self.put_local(key, value)
+                self.count('shared_hits')
+                return True, value
+        self.count('misses')
+        return False, None
+
+    def put(self, key: str, value: Any):
+        """Stores a value in both tiers."""
+        self.put_local(key, value)
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), json.dumps(value), ex=max(1, int(self.ttl)))
+
+    def clear(self):
+        """Empties the local tier (shared entries expire by TTL or version)."""
+        with self._lock:
+            self._entries.clear()
+
+    def counters(self) -> Dict[str, Any]:
+        """Hit/miss counters, the hit ratio and the current size."""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters['hits'] + counters['shared_hits'] + counters['misses']
+        counters['hit_ratio'] = round((counters['hits'] + counters['shared_hits']) / lookups, 4) if lookups else 0.0
+        counters['size'] = size
+        counters['max_entries'] = self.max_entries
+        return counters
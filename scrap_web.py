@@ -1,7 +1,301 @@
 """Scrapes MealDB website to extract meals and ingredients."""
 
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
 import scrapy
+from scrapy import signals
 from scrapy.crawler import CrawlerProcess
+from scrapy.downloadermiddlewares.retry import RetryMiddleware
+from twisted.internet import task
+from metrics import add_metrics_arguments, metrics, percentile, profiling, report_metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File suffix of every supported shard compression
+COMPRESSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+# Every shard name ShardedJsonLinesPipeline writes, whatever the type and compression
+SHARD_NAME = re.compile(r"^[a-z]+-\d{5}\.jsonl(" + "|".join(re.escape(s) for s in COMPRESSIONS.values()) + ")$")
+# HTTP cache and visited pages of the incremental crawl
+STATE_DIR = '.crawl_state'
+# Default outputs, an incremental crawl only holds the changed items and never replaces the full ones.
+# Every incremental run gets the next sequence number, so a delta that was not loaded yet is never overwritten.
+OUTPUT = 'foods1.json'
+OUTPUT_DIR = 'feeds'
+DELTA_OUTPUT = 'foods1.delta-{:05d}.json'
+DELTA_OUTPUT_DIR = os.path.join('feeds-delta', '{:05d}')
+
+# Crawl profiles, "default" is the historical behaviour (no delay, Scrapy's concurrency)
+CRAWL_PROFILES = {
+    'polite': {
+        'CONCURRENT_REQUESTS': 4,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 2,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 1.0,
+        'AUTOTHROTTLE_MAX_DELAY': 30.0,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 1.0,
+        'RETRY_TIMES': 5,
+        'RETRY_BACKOFF_BASE': 2.0,
+        'RETRY_BACKOFF_MAX': 60.0,
+    },
+    'default': {
+        'CONCURRENT_REQUESTS': 16,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
+        'AUTOTHROTTLE_ENABLED': False,
+        'RETRY_TIMES': 2,
+        'RETRY_BACKOFF_BASE': 1.0,
+        'RETRY_BACKOFF_MAX': 30.0,
+    },
+    'fast': {
+        'CONCURRENT_REQUESTS': 64,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 32,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 0.0,
+        'AUTOTHROTTLE_MAX_DELAY': 10.0,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 16.0,
+        'RETRY_TIMES': 3,
+        'RETRY_BACKOFF_BASE': 0.5,
+        'RETRY_BACKOFF_MAX': 10.0,
+    },
+}
+
+
+class BackoffRetryMiddleware(RetryMiddleware):
+    """
+    Scrapy's retries, plus exponential backoff: every retry of a domain raises
+    its download delay to RETRY_BACKOFF_BASE * 2^(attempt-1), capped at RETRY_BACKOFF_MAX.
+    Without AutoThrottle the delay is halved again on every good answer.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 1.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 30.0)
+        self.base_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.autothrottle = settings.getbool('AUTOTHROTTLE_ENABLED')
+
+    def _slot(self, request):
+        downloader = self.crawler.engine.downloader
+        return downloader.slots.get(downloader.get_slot_key(request))
+
+    def _retry(self, request, reason):
+        retry_request = super()._retry(request, reason)
+        slot = self._slot(request)
+        if retry_request is not None and slot is not None:
+            attempt = retry_request.meta.get('retry_times', 1)
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+            slot.delay = max(slot.delay, delay)
+            self.crawler.stats.inc_value('retry/backoff_count')
+        return retry_request
+
+    def process_response(self, request, response, spider=None):
+        result = super().process_response(request, response)
+        if result is response and not self.autothrottle:
+            slot = self._slot(request)
+            if slot is not None and slot.delay > self.base_delay:
+                slot.delay = max(self.base_delay, slot.delay / 2)
+        return result
+
+
+class CrawlThroughputStats:
+    """
+    Extension collecting pages/sec, items/sec, download latency percentiles
+    and the scheduler queue depth (sampled every CRAWL_STATS_INTERVAL seconds).
+    The summary is printed and added to the crawl stats when the spider closes.
+    """
+
+    def __init__(self, crawler, interval=1.0):
+        self.crawler = crawler
+        self.interval = interval
+        self.latencies = []
+        self.queue_depths = []
+        self.pages = 0
+        self.items = 0
+        self.started = None
+        self._sampler = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler, crawler.settings.getfloat('CRAWL_STATS_INTERVAL', 1.0))
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.item_scraped, signal=signals.item_scraped)
+        return extension
+
+    def spider_opened(self, spider):
+        self.started = time.monotonic()
+        self._sampler = task.LoopingCall(self._sample_queue)
+        self._sampler.start(self.interval, now=True)
+
+    def _sample_queue(self):
+        scheduler = self.crawler.engine.scheduler if self.crawler.engine else None
+        if scheduler is not None:
+            self.queue_depths.append(len(scheduler))
+
+    def response_received(self, response, request, spider):
+        self.pages += 1
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.latencies.append(latency)
+            metrics.record('crawl_download', latency)
+
+    def item_scraped(self, item, response, spider):
+        self.items += 1
+
+    def summary(self):
+        """The throughput numbers of the crawl so far."""
+        elapsed = max(time.monotonic() - self.started, 1e-9) if self.started else 0.0
+        latencies = sorted(self.latencies)
+        depths = self.queue_depths or [0]
+        return {
+            'pages': self.pages,
+            'items': self.items,
+            'elapsed_sec': round(elapsed, 3),
+            'pages_per_sec': round(self.pages / elapsed, 2) if elapsed else 0.0,
+            'items_per_sec': round(self.items / elapsed, 2) if elapsed else 0.0,
+            'latency_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'latency_p90_ms': round(percentile(latencies, 90) * 1000, 1),
+            'latency_p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'queue_depth_max': max(depths),
+            'queue_depth_avg': round(sum(depths) / len(depths), 1),
+        }
+
+    def spider_closed(self, spider, reason):
+        if self._sampler is not None and self._sampler.running:
+            self._sampler.stop()
+        summary = self.summary()
+        for key, value in summary.items():
+            self.crawler.stats.set_value(f'throughput/{key}', value)
+        print(f"📊 Crawl finished ({reason}): {summary['pages']} pages, {summary['items']} items "
+              f"in {summary['elapsed_sec']}s")
+        print(f"   {summary['pages_per_sec']} pages/sec, {summary['items_per_sec']} items/sec")
+        print(f"   latency p50/p90/p99: {summary['latency_p50_ms']}/{summary['latency_p90_ms']}/"
+              f"{summary['latency_p99_ms']} ms")
+        print(f"   queue depth max/avg: {summary['queue_depth_max']}/{summary['queue_depth_avg']}")
+
+
+class ShardedJsonLinesPipeline:
+    """
+    Writes compact JSON Lines, one shard series per item TYPE
+    (meal-00000.jsonl, ingredient-00000.jsonl, ...), optionally compressed.
+    A new shard is started once SHARD_MAX_BYTES (uncompressed) were written to the current one.
+    """
+
+    def __init__(self, output_dir, max_bytes=0, compression='none'):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'.")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression needs the 'zstandard' package.")
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.shards = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(settings.get('SHARD_DIR', 'feeds'),
+                   settings.getint('SHARD_MAX_BYTES', 0),
+                   settings.get('SHARD_COMPRESSION', 'none'))
+
+    def _open_shard(self, item_type, number):
+        path = os.path.join(self.output_dir, f"{item_type.lower()}-{number:05d}.jsonl"
+                                             f"{COMPRESSIONS[self.compression]}")
+        if self.compression == 'gzip':
+            handle = gzip.open(path, 'wb')
+        elif self.compression == 'zstd':
+            handle = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'))
+        else:
+            handle = open(path, 'wb')
+        return {'handle': handle, 'number': number, 'bytes': 0}
+
+    def open_spider(self, spider=None):
+        """Creates the output directory and removes the shards of an earlier crawl,
+        which the feed reader would otherwise read together with the new ones."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stale = [name for name in os.listdir(self.output_dir) if SHARD_NAME.match(name)]
+        for name in stale:
+            os.remove(os.path.join(self.output_dir, name))
+        if stale:
+            print(f"🧹 Removed {len(stale)} shard(s) of an earlier crawl from {self.output_dir}")
+
+    def process_item(self, item, spider=None):
+        item_type = item.get('TYPE') or 'OTHER'
+        line = (json.dumps(dict(item), ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        shard = self.shards.get(item_type)
+        if shard is None:
+            shard = self.shards[item_type] = self._open_shard(item_type, 0)
+        elif self.max_bytes and shard['bytes'] + len(line) > self.max_bytes:
+            shard['handle'].close()
+            shard = self.shards[item_type] = self._open_shard(item_type, shard['number'] + 1)
+        shard['handle'].write(line)
+        shard['bytes'] += len(line)
+        return item
+
+    def close_spider(self, spider=None):
+        for shard in self.shards.values():
+            shard['handle'].close()
+        self.shards = {}
+
+
+class CrawlState:
+    """
+    What an incremental crawl remembers between runs: the visited pages
+    and the content hash of every item yielded so far (by page URL).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.visited_meals = set()
+        self.visited_ingredients = set()
+        self.visited_letters = set()
+        self.item_hashes = {}
+        self.skipped = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding="utf-8") as f:
+                state = json.load(f)
+            self.visited_meals = set(state.get('visited_meals', []))
+            self.visited_ingredients = set(state.get('visited_ingredients', []))
+            self.visited_letters = set(state.get('visited_letters', []))
+            self.item_hashes = state.get('item_hashes', {})
+
+    @staticmethod
+    def item_hash(item):
+        """Content hash of one scraped item."""
+        payload = json.dumps(dict(item), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_changed(self, url, item):
+        """Records the item's hash, True if it is new or differs from the last run."""
+        digest = self.item_hash(item)
+        if self.item_hashes.get(url) == digest:
+            self.skipped += 1
+            return False
+        self.item_hashes[url] = digest
+        return True
+
+    def save(self):
+        """Writes the state atomically, a crash never leaves half a file behind."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump({
+                'visited_meals': sorted(self.visited_meals),
+                'visited_ingredients': sorted(self.visited_ingredients),
+                'visited_letters': sorted(self.visited_letters),
+                'item_hashes': self.item_hashes,
+            }, f)
+        os.replace(tmp_path, self.path)
 
 
 class SpiderMeals(scrapy.Spider):
@@ -15,8 +309,48 @@ class SpiderMeals(scrapy.Spider):
     visited_ingredients = set()
     visited_letters = set()
 
+    # Default page budget (CLOSESPIDER_PAGECOUNT), every downloaded page counts
     MAX_PAGES = 2000
-    page_counter = 0
+
+    def __init__(self, state_path=None, *args, **kwargs):
+        """With a state_path the crawl is incremental, see CrawlState."""
+        super().__init__(*args, **kwargs)
+        self.state = CrawlState(state_path) if state_path else None
+        if self.state:
+            self.visited_meals = self.state.visited_meals
+            self.visited_ingredients = self.state.visited_ingredients
+            self.visited_letters = self.state.visited_letters
+
+    async def start(self):
+        """
+        Starts from the first letter page. An incremental crawl also requests
+        every page known from earlier runs right away, so they are revalidated
+        in parallel instead of being rediscovered one level at a time.
+        """
+        for url in self.start_urls:
+            yield scrapy.Request(url, callback=self.parse)
+        if self.state:
+            for link in sorted(self.visited_letters):
+                yield scrapy.Request(self.base_url + link, callback=self.parse)
+            for link in sorted(self.visited_meals):
+                yield scrapy.Request(self.base_url + link, callback=self.parse_meal)
+            for link in sorted(self.visited_ingredients):
+                yield scrapy.Request(self.base_url + link, callback=self.parse_ingre)
+
+    @property
+    def base_url(self):
+        """Scheme and host of the first start URL."""
+        return "/".join(self.start_urls[0].split("/")[:3])
+
+    def changed(self, item, url):
+        """Without a state every item is new, otherwise only changed ones are yielded."""
+        return self.state is None or self.state.is_changed(url, item)
+
+    def closed(self, reason):
+        """Saves the incremental state once the crawl is over."""
+        if self.state:
+            self.state.save()
+            self.logger.info(f"Incremental crawl: {self.state.skipped} unchanged item(s) skipped.")
 
     def safe_link(self, link):
         """Simple and safe check: Accept the link if it exists and starts with '/'."""
@@ -33,10 +367,6 @@ class SpiderMeals(scrapy.Spider):
     def parse(self, response):
         """Parse the main page to get meal links and follow them."""
         try:
-            self.page_counter += 1
-            if self.page_counter > self.MAX_PAGES:
-                return
-
             food_links = response.css('a[href*="/meal/"]::attr(href)').getall()
             for link in food_links:
                 link = self.safe_link(link)
@@ -103,13 +433,15 @@ class SpiderMeals(scrapy.Spider):
         instruction = "".join(clean_instructions)
 
         try:
-            yield {
+            item = {
                 'TYPE': 'MEAL',
                 'Food_Name': food_name,
                 'Ingredients_Used': ingredient_names,
                 'Instructions': instruction,
                 'Meal_URL': response.url,
             }
+            if self.changed(item, response.url):
+                yield item
         except AttributeError as e:
             self.logger.error(f"AttributeError yielding meal in parse_meal(): {e}")
 
@@ -136,27 +468,119 @@ class SpiderMeals(scrapy.Spider):
             ingredient_name = None
 
         try:
-            yield {
+            item = {
                 'TYPE': 'INGREDIENT',
                 'Food_Name': ingredient_name,
             }
+            if self.changed(item, response.url):
+                yield item
         except AttributeError as e:
             self.logger.error(f"AttributeError yielding ingredient in parse_ingre(): {e}")
 
 
-if __name__ == "__main__":
-    process = CrawlerProcess(settings={
-        'FEEDS': {
-            'foods1.json': {
+def next_delta_path(pattern):
+    """The pattern numbered one past the highest delta on disk, so the names sort in crawl order."""
+    prefix, suffix = pattern.split('{:05d}')
+    numbered = re.compile(re.escape(os.path.basename(prefix)) + r"(\d{5})" + re.escape(suffix) + "$")
+    folder = os.path.dirname(prefix) or '.'
+    names = os.listdir(folder) if os.path.isdir(folder) else []
+    numbers = [int(match.group(1)) for match in map(numbered.match, names) if match]
+    return pattern.format(max(numbers, default=0) + 1)
+
+
+def build_settings(args):
+    """Crawler settings for the requested profile and output format."""
+    settings = {
+        'DOWNLOAD_DELAY': 0,
+        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
+        'CLOSESPIDER_PAGECOUNT': args.max_pages,
+        'DOWNLOADER_MIDDLEWARES': {
+            'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+            BackoffRetryMiddleware: 550,
+        },
+        'EXTENSIONS': {CrawlThroughputStats: 500},
+    }
+    settings.update(CRAWL_PROFILES[args.crawl_profile])
+    if args.concurrency:
+        settings['CONCURRENT_REQUESTS_PER_DOMAIN'] = args.concurrency
+        settings['CONCURRENT_REQUESTS'] = max(settings['CONCURRENT_REQUESTS'], args.concurrency)
+    if args.target_concurrency:
+        settings['AUTOTHROTTLE_ENABLED'] = True
+        settings['AUTOTHROTTLE_TARGET_CONCURRENCY'] = args.target_concurrency
+    if args.retries is not None:
+        settings['RETRY_TIMES'] = args.retries
+    if args.format == 'json':
+        settings['FEEDS'] = {
+            args.output: {
                 'format': 'json',
                 'encoding': 'utf-8',
                 'indent': 4,
                 'overwrite': True,
             },
-        },
-        'DOWNLOAD_DELAY': 0,
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36'
-    })
+        }
+    else:
+        settings['ITEM_PIPELINES'] = {ShardedJsonLinesPipeline: 300}
+        settings['SHARD_DIR'] = args.output_dir
+        settings['SHARD_MAX_BYTES'] = int(args.shard_size_mb * 1024 * 1024)
+        settings['SHARD_COMPRESSION'] = args.compress
+    if args.incremental:
+        # On-disk cache revalidated with If-None-Match / If-Modified-Since,
+        # unchanged pages come back as cheap 304 answers (or not requested at all while fresh)
+        settings['HTTPCACHE_ENABLED'] = True
+        settings['HTTPCACHE_DIR'] = os.path.abspath(os.path.join(args.state_dir, 'httpcache'))
+        settings['HTTPCACHE_POLICY'] = 'scrapy.extensions.httpcache.RFC2616Policy'
+        # Keep pages without cache headers too, they still carry validators
+        settings['HTTPCACHE_ALWAYS_STORE'] = True
+    return settings
 
-    process.crawl(SpiderMeals)
-    process.start()
\ No newline at end of file
+
+def main():
+    """Parses the output options and starts the crawl."""
+    parser = argparse.ArgumentParser(description="Scrapes TheMealDB into a feed file.")
+    parser.add_argument('--format', choices=['json', 'jsonl'], default='json',
+                        help="json: one indented array (foods1.json), "
+                             "jsonl: compact JSON Lines shards per item type")
+    parser.add_argument('--output',
+                        help=f"Output file of the json format "
+                             f"(default: {OUTPUT}, {DELTA_OUTPUT.format(1)}, ... with --incremental)")
+    parser.add_argument('--output-dir',
+                        help=f"Shard directory of the jsonl format "
+                             f"(default: {OUTPUT_DIR}, {DELTA_OUTPUT_DIR.format(1)}, ... with --incremental)")
+    parser.add_argument('--compress', choices=list(COMPRESSIONS), default='none',
+                        help="Shard compression of the jsonl format")
+    parser.add_argument('--shard-size-mb', type=float, default=0,
+                        help="Start a new shard after this many MB (default: 0, never)")
+    parser.add_argument('--crawl-profile', choices=list(CRAWL_PROFILES), default='default',
+                        help="Concurrency, AutoThrottle and retry preset (default: default)")
+    parser.add_argument('--concurrency', type=int,
+                        help="Parallel requests per domain, overrides the profile")
+    parser.add_argument('--target-concurrency', type=float,
+                        help="AutoThrottle target concurrency, enables AutoThrottle")
+    parser.add_argument('--retries', type=int,
+                        help="Retries of a failed page, overrides the profile")
+    parser.add_argument('--max-pages', type=int, default=SpiderMeals.MAX_PAGES,
+                        help=f"Page budget of the whole crawl, 0 for none (default: {SpiderMeals.MAX_PAGES})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reuse the HTTP cache and state of earlier runs, only yield changed items")
+    parser.add_argument('--state-dir', default=STATE_DIR,
+                        help=f"Where --incremental keeps its cache and state (default: {STATE_DIR})")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = next_delta_path(DELTA_OUTPUT) if args.incremental else OUTPUT
+    if args.output_dir is None:
+        args.output_dir = next_delta_path(DELTA_OUTPUT_DIR) if args.incremental else OUTPUT_DIR
+
+    if args.compress == 'zstd' and zstandard is None:
+        sys.exit("Critical Error: zstd compression needs 'python -m pip install zstandard'.")
+
+    process = CrawlerProcess(settings=build_settings(args))
+    state_path = os.path.join(args.state_dir, 'state.json') if args.incremental else None
+    process.crawl(SpiderMeals, state_path=state_path)
+    with profiling(args.profile):
+        process.start()
+    report_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
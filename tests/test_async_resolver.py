@@ -0,0 +1,46 @@
+"""The asyncio resolver can run again and again, each time on a new event loop."""
+import asyncio
+
+import pytest
+
+import async_db_util
+import db_util
+from find_recipe import AsyncIngredientResolver
+
+
+class Results:
+    def __init__(self, rows):
+        self.result_set = rows
+
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    """Answers the vocabulary queries after a pause, so the lookups wait on each other."""
+    closed = []
+
+    async def run_query(name, query, params=None):
+        await asyncio.sleep(0.01)
+        if query == db_util.GRAPH_VERSION_QUERY:
+            return Results([["1"]])
+        return Results([["Garlic"], ["Olive Oil"], ["Tomato"]])
+
+    async def aclose():
+        closed.append(asyncio.get_running_loop())
+
+    monkeypatch.setattr(async_db_util, 'run_query', run_query)
+    monkeypatch.setattr(async_db_util.client, 'aclose', aclose)
+    monkeypatch.setattr(db_util.vocabulary, '_lemmatize', lambda word: word)
+    monkeypatch.setattr(db_util, 'lemmatize', lambda word: word)
+    db_util.vocabulary.invalidate()
+    yield closed
+    db_util.vocabulary.invalidate()
+
+
+def test_resolver_runs_on_a_new_loop_every_time(fake_graph):
+    resolver = AsyncIngredientResolver()
+    for _ in range(3):
+        db_util.vocabulary.invalidate()
+        assert resolver.resolve_ingredients(["garlic", "tomato", "olive oil"]) == \
+            ["Garlic", "Tomato", "Olive Oil"]
+    # The connections of every loop were closed before that loop ended
+    assert len(fake_graph) == 3 and len(set(map(id, fake_graph))) == 3
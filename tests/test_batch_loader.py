@@ -0,0 +1,122 @@
+"""Chunking, window accounting and retries of BatchLoader against fake graphs."""
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError, ResponseError
+
+from batch_loader import BatchLoader, params_header
+
+QUERY = "UNWIND $rows AS row MERGE (:Row {id: row})"
+REPLY = [[b"Query internal execution time: 0.5 milliseconds"]]
+
+
+class FakeGraph:
+    """Records every chunk sent and raises the queued errors of a chunk (keyed by its first row)."""
+    name = 'TEST'
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.sent = []
+
+    def query(self, query, params):
+        chunk = params['rows']
+        self.sent.append(chunk)
+        errors = self.failures.get(chunk[0])
+        if errors:
+            raise errors.pop(0)
+
+
+class FakePipeline:
+    def __init__(self, connection):
+        self.connection = connection
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    def execute(self, raise_on_error=True):
+        self.connection.windows.append(self.commands)
+        outcome = self.connection.outcomes.pop(0) if self.connection.outcomes else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [(outcome or {}).get(i, REPLY) for i in range(len(self.commands))]
+
+
+class FakeConnection:
+    """Pipelines whose results follow `outcomes`: per window an exception or {chunk index: result}."""
+
+    def __init__(self, outcomes=None):
+        self.outcomes = list(outcomes or [])
+        self.windows = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def command(chunk):
+    return "GRAPH.QUERY", FakeGraph.name, params_header({'rows': chunk}) + QUERY, "--compact"
+
+
+def test_rows_are_chunked_and_counted_per_window():
+    graph = FakeGraph()
+    loader = BatchLoader(graph, chunk_size=3, pipeline_depth=2, backoff=0)
+    assert loader.window_size == 6
+
+    stats = loader.load(QUERY, 'rows', iter(range(10)), label='rows')
+    assert graph.sent == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert (stats.rows, stats.chunks, stats.retries) == (10, 4, 0)
+
+    loader.load(QUERY, 'rows', range(4), label='rows')
+    total = loader.totals['rows']
+    assert (total.rows, total.chunks, total.retries) == (14, 6, 0)
+
+
+def test_only_the_failed_chunk_is_sent_again():
+    graph = FakeGraph({3: [RedisConnectionError("reset"), RedisConnectionError("reset")]})
+    stats = BatchLoader(graph, chunk_size=3, pipeline_depth=2, backoff=0).load(QUERY, 'rows', range(10))
+    assert graph.sent == [[0, 1, 2], [3, 4, 5], [3, 4, 5], [3, 4, 5], [6, 7, 8], [9]]
+    assert (stats.rows, stats.chunks, stats.retries) == (10, 4, 2)
+
+
+def test_gives_up_after_max_retries():
+    graph = FakeGraph({0: [RedisConnectionError("down")] * 5})
+    loader = BatchLoader(graph, chunk_size=3, max_retries=2, backoff=0)
+    with pytest.raises(RedisConnectionError):
+        loader.load(QUERY, 'rows', range(6))
+    assert graph.sent == [[0, 1, 2]] * 3
+
+
+def test_response_error_is_raised_without_retry():
+    graph = FakeGraph({3: [ResponseError("Invalid input")]})
+    loader = BatchLoader(graph, chunk_size=3, backoff=0)
+    with pytest.raises(ResponseError):
+        loader.load(QUERY, 'rows', range(9))
+    assert graph.sent == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_pipelined_window_resends_only_the_failed_chunk():
+    graph = FakeGraph()
+    connection = FakeConnection([{1: RedisConnectionError("reset")}])
+    loader = BatchLoader(graph, chunk_size=2, pipeline_depth=3, backoff=0, connection=connection)
+    stats = loader.load(QUERY, 'rows', range(8))
+
+    assert connection.windows == [[command([0, 1]), command([2, 3]), command([4, 5])], [command([6, 7])]]
+    assert graph.sent == [[2, 3]]
+    assert (stats.rows, stats.chunks, stats.retries) == (8, 4, 1)
+
+
+def test_pipelined_window_is_resent_when_the_round_trip_fails():
+    graph = FakeGraph()
+    connection = FakeConnection([RedisConnectionError("reset")])
+    stats = BatchLoader(graph, chunk_size=2, pipeline_depth=2, backoff=0,
+                        connection=connection).load(QUERY, 'rows', range(4))
+    assert graph.sent == [[0, 1], [2, 3]]
+    assert (stats.rows, stats.chunks, stats.retries) == (4, 2, 2)
+
+
+def test_pipelined_response_error_is_raised_without_retry():
+    graph = FakeGraph()
+    connection = FakeConnection([{0: ResponseError("Invalid input")}])
+    loader = BatchLoader(graph, chunk_size=2, pipeline_depth=2, backoff=0, connection=connection)
+    with pytest.raises(ResponseError):
+        loader.load(QUERY, 'rows', range(8))
+    assert graph.sent == []
+    assert len(connection.windows) == 1
@@ -0,0 +1,134 @@
+"""Backoff retries, the page budget and the throughput stats of a crawl against a fixture site."""
+import functools
+import http.server
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEALS = 6
+
+PAGES = {
+    'browse/letter/a': "<html><body>" + "".join(
+        f'<a href="/meal/{n}">Meal {n}</a>' for n in range(MEALS)) + "</body></html>",
+    **{f'meal/{n}': f"""<html><body><h1>Meal {n}</h1>
+        <a href="/ingredient/i{n}"><figure><figcaption>1 Item {n}</figcaption></figure></a>
+        <h2>Instructions</h2>Cook.</body></html>""" for n in range(MEALS)},
+    **{f'ingredient/i{n}': f"<html><body><h1>Item {n}</h1></body></html>" for n in range(MEALS)},
+}
+
+# Runs scrap_web.main() against the fixture site and prints the crawl stats as JSON on the last line
+CRAWL_SCRIPT = """
+import json
+import sys
+sys.path.insert(0, {root!r})
+import scrap_web
+
+crawlers = []
+
+
+class RecordingProcess(scrap_web.CrawlerProcess):
+    def create_crawler(self, crawler_or_spidercls):
+        crawler = super().create_crawler(crawler_or_spidercls)
+        crawlers.append(crawler)
+        return crawler
+
+
+scrap_web.CrawlerProcess = RecordingProcess
+scrap_web.CRAWL_PROFILES['default'].update(RETRY_BACKOFF_BASE=0.01, **{profile!r})
+scrap_web.SpiderMeals.start_urls = [{start_url!r}]
+scrap_web.SpiderMeals.allowed_domains = ['127.0.0.1']
+sys.argv = ['scrap_web.py', *{args!r}]
+scrap_web.main()
+print(json.dumps(crawlers[0].stats.get_stats(), default=str))
+"""
+
+
+class FlakyHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the pages as HTML, answers 503 while a page still has failures left."""
+    failures = {}
+    served = []
+
+    def guess_type(self, path):
+        return 'text/html'
+
+    def do_GET(self):
+        page = self.path.strip('/')
+        self.served.append(page)
+        if self.failures.get(page, 0) > 0:
+            self.failures[page] -= 1
+            self.send_error(503)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    for path, html in PAGES.items():
+        page = root / path
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_text(html, encoding='utf-8')
+    FlakyHandler.failures = {}
+    FlakyHandler.served = []
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                             functools.partial(FlakyHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/browse/letter/a"
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(start_url, workdir, *args, **profile):
+    """One `scrap_web.py <args>` run in workdir with profile overrides, returns its crawl stats."""
+    script = CRAWL_SCRIPT.format(root=ROOT, start_url=start_url, args=list(args), profile=profile)
+    result = subprocess.run([sys.executable, '-c', script], cwd=workdir, check=True,
+                            capture_output=True, text=True, timeout=120)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_unavailable_page_is_retried_with_backoff(site, tmp_path):
+    FlakyHandler.failures = {'meal/2': 3}
+    stats = crawl(site, tmp_path, '--retries', '3')
+
+    assert stats['retry/backoff_count'] == 3
+    assert stats['retry/count'] == 3
+    assert FlakyHandler.served.count('meal/2') == 4
+    with open(tmp_path / 'foods1.json', encoding='utf-8') as f:
+        meals = [item['Food_Name'] for item in json.load(f) if item['TYPE'] == 'MEAL']
+    assert sorted(meals) == [f"Meal {n}" for n in range(MEALS)]
+
+
+def test_page_budget_covers_every_callback(site, tmp_path):
+    # One request at a time: the spider closes asynchronously, so at most the one request
+    # already sent when the budget is reached still comes back
+    stats = crawl(site, tmp_path, '--max-pages', '5',
+                  CONCURRENT_REQUESTS=1, CONCURRENT_REQUESTS_PER_DOMAIN=1)
+
+    assert stats['finish_reason'] == 'closespider_pagecount'
+    assert 5 <= stats['response_received_count'] <= 6
+    assert len(FlakyHandler.served) == stats['response_received_count'] < len(PAGES)
+    # Letter, meal and ingredient pages all count against the same budget
+    assert {page.split('/')[0] for page in FlakyHandler.served} == {'browse', 'meal', 'ingredient'}
+
+
+def test_throughput_stats_are_recorded(site, tmp_path):
+    stats = crawl(site, tmp_path)
+
+    throughput = {key.split('/', 1)[1]: value for key, value in stats.items()
+                  if key.startswith('throughput/')}
+    assert set(throughput) == {
+        'pages', 'items', 'elapsed_sec', 'pages_per_sec', 'items_per_sec',
+        'latency_p50_ms', 'latency_p90_ms', 'latency_p99_ms', 'queue_depth_max', 'queue_depth_avg',
+    }
+    assert throughput['pages'] == stats['response_received_count'] == len(PAGES)
+    assert throughput['items'] == stats['item_scraped_count'] == 2 * MEALS
+    assert throughput['latency_p50_ms'] <= throughput['latency_p90_ms'] <= throughput['latency_p99_ms']
@@ -0,0 +1,52 @@
+"""The streaming array parser yields what json.loads does and rejects what it rejects."""
+import io
+import json
+
+import pytest
+
+from feed_reader import iter_json_array
+
+VALID = [
+    '[]',
+    '  [ ]  ',
+    '[1]',
+    '[1, 2, 3]',
+    '[\n  {"TYPE": "MEAL", "Food_Name": "Apple Pie", "Ingredients_Used": ["2 Apples", "200g Flour"]},\n'
+    '  {"TYPE": "INGREDIENT", "Food_Name": "Flour, \\"plain\\""}\n]',
+    '[12345, "a,b]", [1, [2]], {"x": []}, true, null, -0.5e3]',
+]
+
+MALFORMED = [
+    '[1 2]',
+    '[1,,2]',
+    '[,1]',
+    '[1,]',
+    '[1, 2',
+    '[1, 2,',
+    '[{"a": 1}',
+    '[{"a": ',
+    '{"a": 1}',
+    '',
+]
+
+
+def parse(text, buffer_size):
+    return list(iter_json_array(io.StringIO(text), buffer_size=buffer_size))
+
+
+@pytest.mark.parametrize('buffer_size', [1, 2, 3, 7, 1 << 16])
+@pytest.mark.parametrize('text', VALID)
+def test_valid_arrays_match_json_loads(text, buffer_size):
+    assert parse(text, buffer_size) == json.loads(text)
+
+
+@pytest.mark.parametrize('buffer_size', [1, 2, 3, 7, 1 << 16])
+@pytest.mark.parametrize('text', MALFORMED)
+def test_malformed_arrays_are_rejected(text, buffer_size):
+    with pytest.raises(json.JSONDecodeError):
+        parse(text, buffer_size)
+
+
+def test_prefix_already_read_is_parsed_first():
+    fp = io.StringIO(' {"a": 1}, {"b": 2}]')
+    assert list(iter_json_array(fp, buffer_size=4, prefix='[')) == [{'a': 1}, {'b': 2}]
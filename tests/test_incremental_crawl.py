@@ -0,0 +1,115 @@
+"""An incremental recrawl of an unchanged site revalidates every page and yields nothing."""
+import functools
+import http.server
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    'browse/letter/a': """<html><body>
+        <a href="/meal/1">Apple Pie</a> <a href="/meal/2">Arrabiata</a>
+        <a href="/browse/letter/b">B</a></body></html>""",
+    'browse/letter/b': """<html><body><a href="/meal/3">Bean Stew</a></body></html>""",
+    'meal/1': """<html><body><h1>Apple Pie</h1>
+        <a href="/ingredient/apple"><figure><figcaption>2 Apples</figcaption></figure></a>
+        <a href="/ingredient/flour"><figure><figcaption>200g Flour</figcaption></figure></a>
+        <h2>Instructions</h2>Bake it.</body></html>""",
+    'meal/2': """<html><body><h1>Arrabiata</h1>
+        <a href="/ingredient/tomato"><figure><figcaption>1 can Tomato</figcaption></figure></a>
+        <h2>Instructions</h2>Boil the pasta.</body></html>""",
+    'meal/3': """<html><body><h1>Bean Stew</h1>
+        <a href="/ingredient/tomato"><figure><figcaption>2 Tomato</figcaption></figure></a>
+        <h2>Instructions</h2>Simmer.</body></html>""",
+    'ingredient/apple': "<html><body><h1>Apple</h1></body></html>",
+    'ingredient/flour': "<html><body><h1>Flour</h1></body></html>",
+    'ingredient/tomato': "<html><body><h1>Tomato</h1></body></html>",
+}
+
+# Runs scrap_web.main() against the fixture site instead of TheMealDB
+CRAWL_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+import scrap_web
+scrap_web.SpiderMeals.start_urls = [{start_url!r}]
+scrap_web.SpiderMeals.allowed_domains = ['127.0.0.1']
+sys.argv = ['scrap_web.py', '--incremental']
+scrap_web.main()
+"""
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the pages as HTML with Last-Modified, stale right away so caches revalidate."""
+    statuses = []
+
+    def guess_type(self, path):
+        return 'text/html'
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'max-age=0')
+        super().end_headers()
+
+    def send_response(self, code, message=None):
+        self.statuses.append(code)
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site(tmp_path):
+    root = tmp_path / 'site'
+    for path, html in PAGES.items():
+        page = root / path
+        page.parent.mkdir(parents=True, exist_ok=True)
+        page.write_text(html, encoding='utf-8')
+    FixtureHandler.statuses = []
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                             functools.partial(FixtureHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/browse/letter/a"
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(start_url, workdir):
+    """One `scrap_web.py --incremental` run in workdir, returns the items of its delta feed."""
+    script = CRAWL_SCRIPT.format(root=ROOT, start_url=start_url)
+    subprocess.run([sys.executable, '-c', script], cwd=workdir, check=True,
+                   capture_output=True, timeout=120)
+    deltas = sorted(name for name in os.listdir(workdir) if name.startswith('foods1.delta-'))
+    return read_delta(workdir, deltas[-1])
+
+
+def read_delta(workdir, name):
+    with open(os.path.join(workdir, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_second_incremental_crawl_yields_nothing(site, tmp_path):
+    workdir = tmp_path / 'run'
+    workdir.mkdir()
+
+    first = crawl(site, workdir)
+    assert sorted(item['Food_Name'] for item in first if item['TYPE'] == 'MEAL') == \
+        ['Apple Pie', 'Arrabiata', 'Bean Stew']
+    assert sorted(item['Food_Name'] for item in first if item['TYPE'] == 'INGREDIENT') == \
+        ['Apple', 'Flour', 'Tomato']
+    assert 304 not in FixtureHandler.statuses
+
+    FixtureHandler.statuses = []
+    second = crawl(site, workdir)
+    assert second == []
+    assert FixtureHandler.statuses and set(FixtureHandler.statuses) == {304}
+    # Every run has its own delta next to the state, none takes the place of the full feed
+    # or of the first delta that was not loaded yet
+    assert sorted(name for name in os.listdir(workdir) if not name.startswith('.')) == \
+        ['foods1.delta-00001.json', 'foods1.delta-00002.json']
+    assert read_delta(workdir, 'foods1.delta-00001.json') == first
@@ -0,0 +1,46 @@
+"""IngredientMatcher must find the same ingredients as the substring loop it replaced."""
+import random
+import string
+from itertools import islice
+
+import pytest
+
+from generate_feed import generate_feed
+from ingredient_matcher import IngredientMatcher, extract_ingredient_names
+from legacy_matcher import legacy_match, legacy_order
+
+
+@pytest.fixture(scope='module')
+def feed():
+    blocks = list(generate_feed(3000, ingredients=600, seed=7))
+    names = extract_ingredient_names(b for b in blocks if b['TYPE'] == 'INGREDIENT')
+    meals = [b for b in blocks if b['TYPE'] == 'MEAL']
+    sorted_ingredients = legacy_order(names)
+    return IngredientMatcher(names), sorted_ingredients, meals
+
+
+def test_match_agrees_with_legacy_loop_on_generated_portions(feed):
+    matcher, sorted_ingredients, meals = feed
+    portions = [p for meal in meals for p in meal['Ingredients_Used']]
+    mismatches = [p for p in portions if matcher.match(p) != legacy_match(p, sorted_ingredients)]
+    assert portions and not mismatches
+
+
+def test_match_agrees_with_legacy_loop_on_random_strings(feed):
+    matcher, sorted_ingredients, _ = feed
+    rng = random.Random(11)
+    words = [w for name in islice(sorted_ingredients, 200) for w in name.split()]
+    alphabet = string.ascii_letters + string.digits + " ,./-()½"
+    strings = []
+    for _ in range(20000):
+        parts = [rng.choice(words) if rng.random() < 0.5 else
+                 "".join(rng.choices(alphabet, k=rng.randint(1, 8))) for _ in range(rng.randint(1, 5))]
+        strings.append(rng.choice(["", " ", "-"]).join(parts))
+    mismatches = [s for s in strings if matcher.match(s) != legacy_match(s, sorted_ingredients)]
+    assert not mismatches
+
+
+def test_match_portions_skips_non_strings(feed):
+    matcher, _, _ = feed
+    assert matcher.match(None) is None
+    assert matcher.match_portions(["", None, 3, "2 cloves Garlic, minced"]) == {"Garlic"}
@@ -0,0 +1,150 @@
+"""migrate() on an in-process fake of a graph written by the original loader."""
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import migrate_schema as ms
+from database_filler import COUNT_LEGACY_RECIPES, COUNT_RECIPES, checked_manifest, recipe_id
+
+
+class Results:
+    def __init__(self, rows=()):
+        self.result_set = [list(row) for row in rows]
+
+
+class FakeGraph:
+    """
+    Answers the migration queries from plain dicts. Recipes start in the
+    original schema: IngredientP portions, HAS_THE_ITEM names, no id or name_key.
+    """
+
+    def __init__(self, recipes, fail_writes_after=None):
+        self.ingredients = {}
+        self.recipes = {}
+        self.portion_nodes = set()
+        self.fail_writes_after = fail_writes_after
+        self.writes = 0
+        for name, portions, items in recipes:
+            for item in items:
+                if not any(i['name'] == item for i in self.ingredients.values()):
+                    self.ingredients[len(self.ingredients)] = {'name': item, 'name_key': None}
+            self.portion_nodes.update(portions)
+            self.recipes[1000 + len(self.recipes)] = {
+                'id': None, 'name': name, 'name_key': None, 'portion_nodes': list(portions),
+                'items': list(items), 'portions': None, 'made_with': {}}
+
+    def query(self, query, params=None):
+        params = params or {}
+        pending = [node for node, r in self.recipes.items() if r['id'] is None]
+        if query == COUNT_RECIPES:
+            return Results([[len(self.recipes)]])
+        if query == COUNT_LEGACY_RECIPES:
+            return Results([[len(pending)]])
+        if query == ms.COUNT_UNKEYED:
+            return Results([[sum(self.recipes[n]['name_key'] is None for n in pending)]])
+        if query == ms.READ_UNKEYED_INGREDIENTS:
+            rows = [(node, i['name']) for node, i in self.ingredients.items() if i['name_key'] is None]
+            return Results(rows[:params['batch']])
+        if query == ms.WRITE_INGREDIENT_KEYS:
+            for row in params['rows']:
+                self.ingredients[row['Node']]['name_key'] = row['Key']
+            return Results()
+        if query == ms.READ_LEGACY_BATCH:
+            return Results([(node, self.recipes[node]['name'], self.recipes[node]['portion_nodes'],
+                             self.recipes[node]['items']) for node in pending[:params['batch']]])
+        if query == ms.EXISTING_IDS:
+            ids = {r['id'] for r in self.recipes.values()}
+            return Results([[rid] for rid in params['ids'] if rid in ids])
+        if query == ms.DELETE_NODES:
+            for node in params['nodes']:
+                del self.recipes[node]
+            return Results()
+        if query == ms.WRITE_COMPACT_BATCH:
+            self.writes += 1
+            if self.fail_writes_after is not None and self.writes > self.fail_writes_after:
+                raise RedisConnectionError("connection lost")
+            # One query: the old edges are dropped and the new ones written together
+            names = {i['name'] for i in self.ingredients.values()}
+            for row in params['rows']:
+                self.recipes[row['Node']].update(
+                    portion_nodes=[], items=[], id=row['Id'], name_key=row['Name_Key'], portions=row['Portions'],
+                    made_with={l['name']: (l['position'], l['quantity'], l['unit'])
+                               for l in row['Links'] if l['name'] in names})
+            return Results()
+        if query == ms.DELETE_PORTION_NODES:
+            removed = sorted(self.portion_nodes)[:params['batch']]
+            self.portion_nodes.difference_update(removed)
+            return Results([[len(removed)]])
+        # Index creation/removal and the version stamp
+        return Results()
+
+
+class FakeClient:
+    def __init__(self, graph):
+        self.graph = graph
+
+
+RECIPES = [
+    ("Apple Pie", ["2 Apples", "200g Flour"], ["Apple", "Flour"]),
+    ("Bean Stew", ["1 can Beans", "2 Tomato"], ["Beans", "Tomato"]),
+    # Same name_key as the first one, the lookups already treated them as one recipe
+    ("apple  pie", ["3 Apples"], ["Apple"]),
+    ("Tomato Soup", ["4 Tomato", "1 tbsp Olive Oil"], ["Tomato", "Olive Oil"]),
+]
+
+
+def compact_state(graph):
+    return {r['id']: (r['name'], r['name_key'], r['portions'], r['made_with'])
+            for r in graph.recipes.values()}
+
+
+def test_migrates_the_original_schema_and_keeps_one_recipe_per_name_key():
+    graph = FakeGraph(RECIPES)
+    assert ms.graph_schema(graph) == 'baseline'
+    stats = ms.migrate(FakeClient(graph), batch_size=2)
+
+    assert stats == {'ingredient_keys_added': 5, 'migrated': 3, 'duplicates_removed': 1,
+                     'portion_nodes_removed': 7}
+    assert ms.graph_schema(graph) == 'compact'
+    assert {i['name']: i['name_key'] for i in graph.ingredients.values()} == \
+        {'Apple': 'apple', 'Flour': 'flour', 'Beans': 'beans', 'Tomato': 'tomato', 'Olive Oil': 'olive oil'}
+    state = compact_state(graph)
+    assert state[recipe_id("Apple Pie")] == (
+        "Apple Pie", "apple pie", ["2 Apples", "200g Flour"],
+        {'Apple': (0, 2.0, None), 'Flour': (1, 200.0, 'g')})
+    assert sorted(name for name, _, _, _ in state.values()) == ["Apple Pie", "Bean Stew", "Tomato Soup"]
+    assert not graph.portion_nodes
+
+
+def test_an_interrupted_migration_resumes_where_it_stopped():
+    reference = FakeGraph(RECIPES)
+    ms.migrate(FakeClient(reference), batch_size=1)
+
+    graph = FakeGraph(RECIPES, fail_writes_after=1)
+    with pytest.raises(RedisConnectionError):
+        ms.migrate(FakeClient(graph), batch_size=1)
+    assert ms.graph_schema(graph) == 'baseline'
+    graph.fail_writes_after = None
+    stats = ms.migrate(FakeClient(graph), batch_size=1)
+
+    assert stats['ingredient_keys_added'] == 0 and stats['migrated'] == 2
+    assert compact_state(graph) == compact_state(reference)
+
+
+def test_resume_drops_a_legacy_duplicate_of_an_already_migrated_recipe():
+    graph = FakeGraph(RECIPES[:1])
+    ms.migrate(FakeClient(graph), batch_size=10)
+    # A legacy copy with the same name_key is still pending (written by an old loader afterwards)
+    graph.recipes[2000] = {'id': None, 'name': "APPLE PIE", 'name_key': None, 'portion_nodes': ["1 Apple"],
+                           'items': ["Apple"], 'portions': None, 'made_with': {}}
+    stats = ms.migrate(FakeClient(graph), batch_size=10)
+
+    assert stats['migrated'] == 0 and stats['duplicates_removed'] == 1
+    assert list(compact_state(graph)) == [recipe_id("Apple Pie")]
+
+
+def test_incremental_load_refuses_an_unmigrated_graph():
+    graph = FakeGraph(RECIPES)
+    with pytest.raises(SystemExit, match="migrate_schema.py"):
+        checked_manifest(graph, {})
+    ms.migrate(FakeClient(graph), batch_size=10)
+    assert checked_manifest(graph, {'apple pie': 'x'}) == {'apple pie': 'x'}
@@ -0,0 +1,40 @@
+"""Lemma table lookups answer phrases and any casing without loading WordNet."""
+import pytest
+
+import normalization
+from normalization import lemmatize
+
+
+@pytest.fixture
+def table_only(monkeypatch):
+    """A lemma table as the loader writes it, with WordNet made unreachable."""
+    table = {'olive oil': 'olive oil', 'olive': 'olive', 'oil': 'oil',
+             'tomatoes': 'tomato', 'garlic': 'garlic'}
+    monkeypatch.setattr(normalization, '_lemma_table', table)
+
+    def no_wordnet():
+        raise AssertionError("WordNet was loaded")
+
+    monkeypatch.setattr(normalization, '_lemmatizer', no_wordnet)
+    lemmatize.cache_clear()
+    yield
+    lemmatize.cache_clear()
+
+
+def test_phrases_and_capitalized_words_are_table_hits(table_only):
+    assert lemmatize('olive oil') == 'olive oil'
+    assert lemmatize('tomatoes') == 'tomato'
+    # Same as WordNet, which only knows lower case forms
+    assert lemmatize('Garlic') == 'Garlic'
+    assert lemmatize('Tomatoes') == 'Tomatoes'
+
+
+def test_build_lemma_table_keys_full_names_and_words(monkeypatch):
+    class Lemmatizer:
+        def lemmatize(self, word):
+            return word[:-1] if word.endswith('s') else word
+
+    monkeypatch.setattr(normalization, '_lemmatizer', Lemmatizer)
+    table = normalization.build_lemma_table(["Olive  Oil", "Cherry Tomatoes"])
+    assert table == {'cherry': 'cherry', 'cherry tomatoes': 'cherry tomatoe', 'oil': 'oil',
+                     'olive': 'olive', 'olive oil': 'olive oil', 'tomatoes': 'tomatoe'}
@@ -0,0 +1,51 @@
+"""Invalid service requests are answered as bad requests, before any database call."""
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+import recipe_service
+from find_recipe import RecipeServiceClient
+from recipe_service import BadRequest
+
+
+@pytest.mark.parametrize('operation, body', [
+    (recipe_service.search, {'ingredients': ['egg'], 'max_missing': 'x'}),
+    (recipe_service.search, {'ingredients': ['egg'], 'max_missing': 1, 'limit': [20]}),
+    (recipe_service.details, {'id': 'abc'}),
+])
+def test_non_integer_fields_are_bad_requests(operation, body):
+    with pytest.raises(BadRequest):
+        asyncio.run(operation(body))
+
+
+def test_batch_answers_non_object_entries_with_an_error():
+    answer = asyncio.run(recipe_service.batch({'requests': [1, "search", None]}))
+    assert [response['error'] for response in answer['responses']] == \
+        ["Every request must be a JSON object."] * 3
+
+
+class HtmlErrorHandler(http.server.BaseHTTPRequestHandler):
+    """Answers like a proxy in front of a dead service: 502 with an HTML page."""
+
+    def do_POST(self):
+        self.send_response(502, 'Bad Gateway')
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(b"<html><body>502 Bad Gateway</body></html>")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_client_reports_non_json_errors_with_the_reason():
+    server = http.server.HTTPServer(('127.0.0.1', 0), HtmlErrorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = RecipeServiceClient(f"http://127.0.0.1:{server.server_port}")
+        with pytest.raises(SystemExit, match=r"\(502\): Bad Gateway"):
+            client.post('/search', {'ingredients': ['egg']})
+    finally:
+        server.shutdown()
+        server.server_close()
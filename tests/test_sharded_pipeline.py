@@ -0,0 +1,22 @@
+"""A new crawl into a shard directory never leaves shards of an earlier crawl behind."""
+from feed_reader import iter_feed
+from scrap_web import ShardedJsonLinesPipeline
+
+
+def write_crawl(output_dir, items, **options):
+    pipeline = ShardedJsonLinesPipeline(str(output_dir), **options)
+    pipeline.open_spider()
+    for item in items:
+        pipeline.process_item(item)
+    pipeline.close_spider()
+
+
+def test_open_spider_removes_earlier_shards(tmp_path):
+    old = [{'TYPE': 'MEAL', 'Food_Name': f"Old {i}", 'Ingredients_Used': []} for i in range(50)]
+    write_crawl(tmp_path, old, max_bytes=200, compression='gzip')
+    (tmp_path / 'notes.txt').write_text("kept")
+    assert len(list(tmp_path.glob('meal-*.jsonl.gz'))) > 1
+
+    write_crawl(tmp_path, [{'TYPE': 'MEAL', 'Food_Name': "New", 'Ingredients_Used': []}])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['meal-00000.jsonl', 'notes.txt']
+    assert [block['Food_Name'] for block in iter_feed(str(tmp_path))] == ["New"]
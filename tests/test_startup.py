@@ -0,0 +1,14 @@
+"""`import find_recipe` stays light: no database or NLP stack and within the startup budget."""
+from startup_time import BUDGET_MS, HEAVY_MODULES, import_profile
+
+
+def test_find_recipe_import_skips_heavy_modules():
+    profile = import_profile('find_recipe')
+    assert 'find_recipe' in profile
+    assert [name for name in HEAVY_MODULES if name in profile] == []
+
+
+def test_find_recipe_import_within_budget():
+    # Best of three, a single slow run on a busy machine is not a regression
+    timings = [import_profile('find_recipe')['find_recipe'] / 1000 for _ in range(3)]
+    assert min(timings) <= BUDGET_MS